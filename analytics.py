@@ -0,0 +1,83 @@
+"""Headless delivery analytics"""
+from datetime import date, timedelta
+
+DEFAULT_TOP_K = 20
+
+# Lane ordering options; each is an expression over the aggregated columns
+_LANE_ORDER = {
+    'deliveries': 'deliveries',
+    'tonnage': 'tonnage',
+    'completion_rate': 'CAST(completed AS REAL) / deliveries',
+    'cancellation_rate': 'CAST(cancelled AS REAL) / deliveries',
+}
+
+_LANE_SQL = '''
+    SELECT lanes.pickup_location_id, lanes.delivery_location_id,
+           COALESCE(p.name, '(unknown)'), COALESCE(q.name, '(unknown)'),
+           lanes.deliveries, lanes.tonnage, lanes.completed, lanes.cancelled
+    FROM (
+        SELECT pickup_location_id, delivery_location_id,
+               COUNT(*) AS deliveries,
+               COALESCE(SUM(weight), 0) AS tonnage,
+               SUM(status = 'Completed') AS completed,
+               SUM(status = 'Cancelled') AS cancelled
+        FROM deliveries
+        WHERE scheduled_date BETWEEN ? AND ?{depot}
+        GROUP BY pickup_location_id, delivery_location_id
+        ORDER BY {order} DESC, deliveries DESC
+        LIMIT ?
+    ) lanes
+    LEFT JOIN locations p ON p.id = lanes.pickup_location_id
+    LEFT JOIN locations q ON q.id = lanes.delivery_location_id
+    ORDER BY {order} DESC, lanes.deliveries DESC
+'''
+
+
+class LaneStats:
+    """Volume and outcome of one pickup -> delivery lane"""
+    __slots__ = ('pickup_location_id', 'delivery_location_id', 'pickup', 'destination',
+                 'deliveries', 'tonnage', 'completed', 'cancelled')
+
+    def __init__(self, pickup_location_id, delivery_location_id, pickup, destination,
+                 deliveries, tonnage, completed, cancelled):
+        self.pickup_location_id = pickup_location_id
+        self.delivery_location_id = delivery_location_id
+        self.pickup = pickup
+        self.destination = destination
+        self.deliveries = deliveries
+        self.tonnage = tonnage
+        self.completed = completed
+        self.cancelled = cancelled
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        return cls(*row)
+
+    @property
+    def completion_rate(self):
+        return self.completed / self.deliveries if self.deliveries else 0.0
+
+    @property
+    def cancellation_rate(self):
+        return self.cancelled / self.deliveries if self.deliveries else 0.0
+
+
+def lane_report(conn, start_date=None, end_date=None, top_k=DEFAULT_TOP_K, order_by='deliveries',
+                depot_id=None):
+    """Top-K pickup -> delivery lanes scheduled within a date range
+
+    Aggregation, ordering and the top-K cut all run in SQLite over the
+    covering ([depot_id,] scheduled_date, lane, status, weight) indexes, so
+    only K rows reach Python. Dates default to the last 30 days; depot_id
+    None covers every depot.
+    """
+    if order_by not in _LANE_ORDER:
+        raise ValueError(f"Unknown lane ordering: {order_by}")
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=29)
+
+    cursor = conn.cursor()
+    cursor.row_factory = LaneStats.from_row
+    depot = ' AND depot_id = ?' if depot_id is not None else ''
+    params = [str(start_date), str(end_date)] + ([depot_id] if depot_id is not None else []) + [top_k]
+    return cursor.execute(_LANE_SQL.format(order=_LANE_ORDER[order_by], depot=depot), params).fetchall()
@@ -0,0 +1,282 @@
+"""Proof-of-delivery attachments in a content-addressed blob store
+
+Files (signatures, photos, documents) never enter SQLite. Each is stored
+once under the SHA-256 of its content, in a two-level directory fan-out
+(ab/cd/abcd...), so identical uploads share one blob. The attachments
+table only holds metadata rows pointing at a hash, which keeps the
+deliveries table and its scans untouched.
+
+Uploads and downloads are streamed in fixed-size chunks: a file is hashed
+while it is copied to a temporary file in the store, which is then
+renamed into place, so memory use is bounded and a crash never leaves a
+partial blob under a valid name.
+
+A blob is written before its metadata row is committed, so garbage
+collection leaves alone blobs stored within the last GC_GRACE_SECONDS;
+storing content that already exists refreshes its blob's timestamp.
+
+Thumbnails are rendered once per blob and size and cached as PNG under
+thumbs/. Rendering needs Pillow; without it thumbnail() returns None and
+callers can fall back to a toolkit that reads PNG and GIF itself. Write
+functions leave committing to the caller.
+
+    python attachments.py truck_deliveries.db add 42 signature.png --kind signature
+    python attachments.py truck_deliveries.db list 42
+    python attachments.py truck_deliveries.db get 7 copy.png
+    python attachments.py truck_deliveries.db gc    # remove unreferenced blobs
+"""
+import argparse
+import hashlib
+import mimetypes
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+CHUNK_SIZE = 1024 * 1024
+THUMBNAIL_SIZE = 160
+GC_GRACE_SECONDS = 24 * 60 * 60
+KINDS = ('signature', 'photo', 'document')
+STORE_SUFFIX = '.attachments'
+
+_SELECT = '''
+    SELECT id, delivery_id, kind, sha256, size, filename, content_type, created_at
+    FROM attachments
+'''
+
+
+class Attachment:
+    """A row of the attachments table"""
+    __slots__ = ('id', 'delivery_id', 'kind', 'sha256', 'size', 'filename', 'content_type', 'created_at')
+
+    def __init__(self, id, delivery_id, kind, sha256, size, filename, content_type, created_at):
+        self.id = id
+        self.delivery_id = delivery_id
+        self.kind = kind
+        self.sha256 = sha256
+        self.size = size
+        self.filename = filename
+        self.content_type = content_type
+        self.created_at = created_at
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        return cls(*row)
+
+    @property
+    def is_image(self):
+        return (self.content_type or '').startswith('image/')
+
+    def __repr__(self):
+        return f"Attachment({self.id!r}, {self.filename!r}, {self.sha256[:12]!r})"
+
+
+class BlobStore:
+    """Content-addressed files under one directory"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def exists(self, sha256):
+        return os.path.exists(self.path(sha256))
+
+    def put(self, source, chunk_size=CHUNK_SIZE):
+        """Store a file path or binary stream; returns (sha256, size)"""
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, 'rb') as stream:
+                return self.put(stream, chunk_size)
+
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in iter(lambda: source.read(chunk_size), b''):
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            sha256 = digest.hexdigest()
+            final = self.path(sha256)
+            if os.path.exists(final):
+                os.remove(tmp_path)
+                os.utime(final)
+            else:
+                os.makedirs(os.path.dirname(final), exist_ok=True)
+                os.replace(tmp_path, final)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return sha256, size
+
+    def chunks(self, sha256, chunk_size=CHUNK_SIZE):
+        """Yield a blob's content in chunks"""
+        with open(self.path(sha256), 'rb') as stream:
+            yield from iter(lambda: stream.read(chunk_size), b'')
+
+    def export(self, sha256, dest_path, chunk_size=CHUNK_SIZE):
+        """Copy a blob to dest_path in chunks"""
+        with open(self.path(sha256), 'rb') as source, open(dest_path, 'wb') as dest:
+            shutil.copyfileobj(source, dest, chunk_size)
+
+    def remove(self, sha256):
+        for path in [self.path(sha256)] + self._thumbnails(sha256):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def stored_at(self, sha256):
+        """When a blob was last stored, as a timestamp"""
+        return os.path.getmtime(self.path(sha256))
+
+    def blobs(self):
+        """Hashes of every stored blob"""
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [name for name in dirnames if len(name) == 2]
+            for filename in filenames:
+                if len(filename) == 64:
+                    yield filename
+
+    # Thumbnails
+
+    def _thumbnail_path(self, sha256, size):
+        return os.path.join(self.root, 'thumbs', f"{sha256}-{size}.png")
+
+    def _thumbnails(self, sha256):
+        thumbs = os.path.join(self.root, 'thumbs')
+        if not os.path.isdir(thumbs):
+            return []
+        return [os.path.join(thumbs, name) for name in os.listdir(thumbs) if name.startswith(sha256)]
+
+    def thumbnail(self, sha256, size=THUMBNAIL_SIZE):
+        """Path of a cached PNG thumbnail, rendered on first use; None if it cannot be rendered"""
+        path = self._thumbnail_path(sha256, size)
+        if os.path.exists(path):
+            return path
+        try:
+            from PIL import Image
+        except ImportError:
+            return None
+        try:
+            with Image.open(self.path(sha256)) as image:
+                image.thumbnail((size, size))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                partial = path + '.partial'
+                image.save(partial, 'PNG')
+                os.replace(partial, path)
+        except (OSError, ValueError):
+            return None
+        return path
+
+
+def store_for(db_path):
+    """The blob store kept next to a database file, e.g. depot.attachments/ for depot.db"""
+    return BlobStore(os.path.splitext(os.path.abspath(db_path))[0] + STORE_SUFFIX)
+
+
+def attach(conn, store, delivery_id, source, kind='document', filename=None, content_type=None):
+    """Store a file for a delivery and return the new attachment's id
+
+    source is a file path or a binary stream; streams need a filename.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown attachment kind: {kind}")
+    if filename is None:
+        if not isinstance(source, (str, os.PathLike)):
+            raise ValueError("A filename is required when attaching a stream")
+        filename = os.path.basename(source)
+    if content_type is None:
+        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    sha256, size = store.put(source)
+    cursor = conn.execute('''
+        INSERT INTO attachments (delivery_id, kind, sha256, size, filename, content_type, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (delivery_id, kind, sha256, size, filename, content_type, datetime.now()))
+    return cursor.lastrowid
+
+
+def list_attachments(conn, delivery_id):
+    """Attachments of a delivery, oldest first"""
+    cursor = conn.cursor()
+    cursor.row_factory = Attachment.from_row
+    return cursor.execute(_SELECT + ' WHERE delivery_id = ? ORDER BY created_at, id', (delivery_id,)).fetchall()
+
+
+def get_attachment(conn, attachment_id):
+    cursor = conn.cursor()
+    cursor.row_factory = Attachment.from_row
+    return cursor.execute(_SELECT + ' WHERE id = ?', (attachment_id,)).fetchone()
+
+
+def detach(conn, attachment_id):
+    """Delete an attachment's metadata; the blob stays until collect_garbage()"""
+    conn.execute('DELETE FROM attachments WHERE id = ?', (attachment_id,))
+
+
+def collect_garbage(conn, store, grace_seconds=GC_GRACE_SECONDS):
+    """Remove blobs no attachment refers to and return their hashes
+
+    Blobs stored within the last grace_seconds are kept, as their
+    attachment rows may not be committed yet.
+    """
+    cutoff = time.time() - grace_seconds
+    removed = []
+    for sha256 in list(store.blobs()):
+        if conn.execute('SELECT 1 FROM attachments WHERE sha256 = ? LIMIT 1', (sha256,)).fetchone() is None \
+                and store.stored_at(sha256) <= cutoff:
+            store.remove(sha256)
+            removed.append(sha256)
+    return removed
+
+
+def main(argv=None):
+    """Add, list, fetch and clean up attachments from the command line"""
+    parser = argparse.ArgumentParser(description="Manage proof-of-delivery attachments")
+    parser.add_argument('db_path')
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('add', help="attach a file to a delivery")
+    add.add_argument('delivery_id', type=int, help="database id of the delivery")
+    add.add_argument('path')
+    add.add_argument('--kind', choices=KINDS, default='document')
+    listing = commands.add_parser('list', help="list a delivery's attachments")
+    listing.add_argument('delivery_id', type=int)
+    get = commands.add_parser('get', help="copy an attachment out of the store")
+    get.add_argument('attachment_id', type=int)
+    get.add_argument('dest')
+    gc = commands.add_parser('gc', help="remove blobs no attachment refers to")
+    gc.add_argument('--grace', type=float, default=GC_GRACE_SECONDS,
+                    help="seconds a newly stored blob is kept without a reference")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db_path)
+    store = store_for(args.db_path)
+    try:
+        if args.command == 'add':
+            print(attach(conn, store, args.delivery_id, args.path, args.kind))
+            conn.commit()
+        elif args.command == 'list':
+            for item in list_attachments(conn, args.delivery_id):
+                print(f"{item.id}\t{item.kind}\t{item.size}\t{item.sha256[:12]}\t{item.filename}")
+        elif args.command == 'get':
+            item = get_attachment(conn, args.attachment_id)
+            if item is None:
+                raise SystemExit(f"No attachment {args.attachment_id}")
+            store.export(item.sha256, args.dest)
+        else:
+            removed = collect_garbage(conn, store, args.grace)
+            print(f"Removed {len(removed)} unreferenced blob(s)", file=sys.stderr)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""Online backup, snapshots and restore of the fleet database
+
+Backups go through the SQLite online backup API, which copies the
+database page by page while other connections keep reading and writing.
+Pages are copied in small steps with a short pause between them, so a
+multi-GB backup never holds the database for long. Each copy is written
+to a temporary file, verified with PRAGMA integrity_check, and only then
+renamed into place, so a crash never leaves a torn backup behind.
+
+Snapshots are timestamped backups in a directory, pruned by a retention
+policy: the newest keep_last, plus the newest of each day for keep_days.
+
+    python backup.py snapshot truck_deliveries.db backups/ --every 60
+    python backup.py list backups/
+    python backup.py restore backups/ truck_deliveries.db --at "2024-05-31 18:00"
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import time
+import urllib.parse
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+STEP_PAGES = 1024
+STEP_PAUSE = 0.001
+KEEP_LAST = 24
+KEEP_DAYS = 30
+
+SNAPSHOT_FORMAT = '%Y%m%d-%H%M%S'
+
+# Files SQLite keeps next to a database in WAL mode
+SIDECAR_SUFFIXES = ('-wal', '-shm')
+
+
+class BackupError(Exception):
+    """A backup or restore could not be completed safely"""
+
+
+class BackupResult:
+    """Outcome of one backup or restore"""
+    __slots__ = ('path', 'pages', 'bytes', 'seconds')
+
+    def __init__(self, path, pages, bytes, seconds):
+        self.path = path
+        self.pages = pages
+        self.bytes = bytes
+        self.seconds = seconds
+
+    @property
+    def throughput(self):
+        """Megabytes copied per second"""
+        return self.bytes / 1_000_000 / self.seconds if self.seconds else 0.0
+
+
+class Snapshot:
+    """A snapshot file and the time it was taken"""
+    __slots__ = ('path', 'taken_at')
+
+    def __init__(self, path, taken_at):
+        self.path = path
+        self.taken_at = taken_at
+
+    def __repr__(self):
+        return f"Snapshot({self.path!r})"
+
+
+def _remove(path):
+    """Delete a database file and any WAL sidecars it left behind"""
+    for name in [path] + [path + suffix for suffix in SIDECAR_SUFFIXES]:
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def _read_only(path):
+    return sqlite3.connect(f"file:{urllib.parse.quote(os.path.abspath(path))}?mode=ro", uri=True)
+
+
+def integrity_errors(path):
+    """Problems reported by PRAGMA integrity_check; empty when the file is sound"""
+    conn = _read_only(path)
+    try:
+        rows = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+    finally:
+        conn.close()
+    return [] if rows == ['ok'] else rows
+
+
+def _copy(source, target, step_pages, pause, progress):
+    """Copy source into target in steps; returns the page count"""
+    pages = [0]
+
+    def step(status, remaining, total):
+        pages[0] = total
+        if progress:
+            progress(total - remaining, total)
+        # Let writers in between steps
+        if pause:
+            time.sleep(pause)
+
+    source.backup(target, pages=step_pages, progress=step)
+    return pages[0]
+
+
+def backup(db_path, dest_path, step_pages=STEP_PAGES, pause=STEP_PAUSE, progress=None, verify=True):
+    """Copy a live database to dest_path and return a BackupResult
+
+    progress(done_pages, total_pages) is called after every step.
+    """
+    partial = dest_path + '.partial'
+    _remove(partial)
+
+    started = time.perf_counter()
+    source = sqlite3.connect(db_path)
+    target = sqlite3.connect(partial)
+    try:
+        # Pin one read snapshot for the whole copy. In WAL mode writers carry
+        # on regardless, and the backup no longer restarts after each commit.
+        source.execute('BEGIN')
+        source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        pages = _copy(source, target, step_pages, pause, progress)
+        source.rollback()
+        # The copy inherits WAL mode; a standalone file must not grow
+        # -wal/-shm sidecars whenever it is opened
+        target.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        target.close()
+        source.close()
+    seconds = time.perf_counter() - started
+
+    if verify:
+        errors = integrity_errors(partial)
+        if errors:
+            _remove(partial)
+            raise BackupError(f"Backup of {db_path} failed integrity check: {errors[:5]}")
+    for suffix in SIDECAR_SUFFIXES:
+        if os.path.exists(partial + suffix):
+            os.remove(partial + suffix)
+    os.replace(partial, dest_path)
+
+    result = BackupResult(dest_path, pages, os.path.getsize(dest_path), seconds)
+    logger.info("Backed up %s to %s: %d pages, %.1f MB in %.2fs (%.1f MB/s)", db_path, dest_path,
+                pages, result.bytes / 1_000_000, seconds, result.throughput)
+    return result
+
+
+def list_snapshots(directory, name='truck_deliveries'):
+    """Snapshots in a directory, oldest first"""
+    snapshots = []
+    prefix = name + '-'
+    for filename in os.listdir(directory) if os.path.isdir(directory) else []:
+        if not (filename.startswith(prefix) and filename.endswith('.db')):
+            continue
+        try:
+            taken_at = datetime.strptime(filename[len(prefix):-3], SNAPSHOT_FORMAT)
+        except ValueError:
+            continue
+        snapshots.append(Snapshot(os.path.join(directory, filename), taken_at))
+    snapshots.sort(key=lambda snapshot: snapshot.taken_at)
+    return snapshots
+
+
+def prune(directory, keep_last=KEEP_LAST, keep_days=KEEP_DAYS, name='truck_deliveries', now=None):
+    """Delete snapshots outside the retention policy and return them"""
+    snapshots = list_snapshots(directory, name)
+    now = now or datetime.now()
+    keep = set(snapshot.path for snapshot in snapshots[-keep_last:]) if keep_last else set()
+    newest_per_day = {}
+    for snapshot in snapshots:
+        if snapshot.taken_at >= now - timedelta(days=keep_days):
+            newest_per_day[snapshot.taken_at.date()] = snapshot.path
+    keep.update(newest_per_day.values())
+
+    removed = [snapshot for snapshot in snapshots if snapshot.path not in keep]
+    for snapshot in removed:
+        _remove(snapshot.path)
+    return removed
+
+
+def snapshot(db_path, directory, keep_last=KEEP_LAST, keep_days=KEEP_DAYS, **options):
+    """Take a timestamped snapshot into directory, then apply retention"""
+    os.makedirs(directory, exist_ok=True)
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    dest = os.path.join(directory, f"{name}-{datetime.now().strftime(SNAPSHOT_FORMAT)}.db")
+    result = backup(db_path, dest, **options)
+    for removed in prune(directory, keep_last, keep_days, name):
+        logger.info("Pruned snapshot %s", removed.path)
+    return result
+
+
+def snapshot_at(directory, at, name='truck_deliveries'):
+    """Newest snapshot taken at or before a point in time, or None"""
+    candidates = [s for s in list_snapshots(directory, name) if s.taken_at <= at]
+    return candidates[-1] if candidates else None
+
+
+def restore(snapshot_path, db_path, step_pages=STEP_PAGES, progress=None, keep_current=True):
+    """Replace the contents of db_path with a verified snapshot
+
+    The copy goes through the backup API into the live file, so WAL and
+    locking are respected; other connections should still be closed first.
+    With keep_current the database is backed up next to itself beforehand.
+    """
+    errors = integrity_errors(snapshot_path)
+    if errors:
+        raise BackupError(f"Snapshot {snapshot_path} failed integrity check: {errors[:5]}")
+    if keep_current and os.path.exists(db_path):
+        backup(db_path, db_path + '.before-restore', step_pages, pause=0)
+
+    started = time.perf_counter()
+    source = _read_only(snapshot_path)
+    target = sqlite3.connect(db_path)
+    try:
+        pages = _copy(source, target, step_pages, 0, progress)
+    finally:
+        target.close()
+        source.close()
+    seconds = time.perf_counter() - started
+
+    result = BackupResult(db_path, pages, os.path.getsize(db_path), seconds)
+    logger.info("Restored %s from %s in %.2fs (%.1f MB/s)", db_path, snapshot_path,
+                seconds, result.throughput)
+    return result
+
+
+def main(argv=None):
+    """Take snapshots, list them, verify or restore from the command line"""
+    parser = argparse.ArgumentParser(description="Back up and restore the fleet database")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    take = commands.add_parser('snapshot', help="take a snapshot and apply retention")
+    take.add_argument('db_path')
+    take.add_argument('directory')
+    take.add_argument('--every', type=float, help="keep running, one snapshot every N minutes")
+    take.add_argument('--keep-last', type=int, default=KEEP_LAST)
+    take.add_argument('--keep-days', type=int, default=KEEP_DAYS)
+    take.add_argument('--step-pages', type=int, default=STEP_PAGES)
+
+    listing = commands.add_parser('list', help="list snapshots")
+    listing.add_argument('directory')
+    listing.add_argument('--name', default='truck_deliveries')
+
+    check = commands.add_parser('verify', help="run an integrity check on a database or snapshot")
+    check.add_argument('path')
+
+    put_back = commands.add_parser('restore', help="restore a database from a snapshot")
+    put_back.add_argument('source', help="snapshot file, or snapshot directory with --at")
+    put_back.add_argument('db_path')
+    put_back.add_argument('--at', help="restore the newest snapshot at or before 'YYYY-MM-DD HH:MM'")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    if args.command == 'snapshot':
+        while True:
+            result = snapshot(args.db_path, args.directory, args.keep_last, args.keep_days,
+                              step_pages=args.step_pages)
+            print(f"{result.path}: {result.bytes / 1_000_000:.1f} MB in {result.seconds:.2f}s "
+                  f"({result.throughput:.1f} MB/s)")
+            if not args.every:
+                break
+            time.sleep(args.every * 60)
+    elif args.command == 'list':
+        for found in list_snapshots(args.directory, args.name):
+            print(f"{found.taken_at:%Y-%m-%d %H:%M:%S}  {os.path.getsize(found.path) / 1_000_000:10.1f} MB  {found.path}")
+    elif args.command == 'verify':
+        errors = integrity_errors(args.path)
+        print('ok' if not errors else '\n'.join(errors))
+        raise SystemExit(1 if errors else 0)
+    elif args.command == 'restore':
+        source = args.source
+        if args.at:
+            name = os.path.splitext(os.path.basename(args.db_path))[0]
+            found = snapshot_at(source, datetime.strptime(args.at, '%Y-%m-%d %H:%M'), name)
+            if found is None:
+                raise SystemExit(f"No snapshot at or before {args.at}")
+            source = found.path
+        result = restore(source, args.db_path)
+        print(f"Restored {args.db_path} from {source} in {result.seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
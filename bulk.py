@@ -0,0 +1,67 @@
+"""Set-based bulk changes to deliveries
+
+Each operation is a single UPDATE over the affected rows. Id lists are
+passed as one JSON array parameter and expanded with json_each, so any
+number of rows costs one statement. Run them inside a unit of work to make
+a multi-step change atomic. Write functions leave committing to the caller
+and return the number of deliveries changed.
+"""
+import json
+from datetime import date
+
+ACTIVE_STATUSES = ('Scheduled', 'In Progress')
+FINAL_STATUSES = ('Completed', 'Cancelled')
+
+_IDS = 'id IN (SELECT value FROM json_each(?))'
+
+
+def _id_list(delivery_ids):
+    return json.dumps([int(delivery_id) for delivery_id in delivery_ids])
+
+
+def reassign_deliveries(conn, delivery_ids, truck_id=None, driver_id=None):
+    """Move deliveries to another truck and/or driver"""
+    assignments, params = [], []
+    if truck_id is not None:
+        assignments.append('truck_id = ?')
+        params.append(truck_id)
+    if driver_id is not None:
+        assignments.append('driver_id = ?')
+        params.append(driver_id)
+    if not assignments:
+        return 0
+    return conn.execute(f'UPDATE deliveries SET {", ".join(assignments)} WHERE {_IDS}',
+                        (*params, _id_list(delivery_ids))).rowcount
+
+
+def reassign_truck(conn, from_truck_id, to_truck_id, start_date=None):
+    """Move a truck's active deliveries, from start_date on, to another truck"""
+    return conn.execute('''
+        UPDATE deliveries SET truck_id = ?
+        WHERE truck_id = ? AND status IN (?, ?) AND scheduled_date >= ?
+    ''', (to_truck_id, from_truck_id, *ACTIVE_STATUSES, str(start_date or '0000-00-00'))).rowcount
+
+
+def cancel_deliveries(conn, delivery_ids):
+    """Cancel deliveries that are not completed or cancelled already"""
+    return conn.execute(f'''
+        UPDATE deliveries SET status = 'Cancelled'
+        WHERE {_IDS} AND status NOT IN (?, ?)
+    ''', (_id_list(delivery_ids), *FINAL_STATUSES)).rowcount
+
+
+def set_delivery_status(conn, delivery_ids, status):
+    """Set the status of deliveries, stamping or clearing the completion date"""
+    completed_date = date.today() if status == 'Completed' else None
+    return conn.execute(f'''
+        UPDATE deliveries SET status = ?, completed_date = ?
+        WHERE {_IDS} AND status IS NOT ?
+    ''', (status, completed_date, _id_list(delivery_ids), status)).rowcount
+
+
+def shift_dates(conn, delivery_ids, days):
+    """Move deliveries by a number of days, keeping their times"""
+    return conn.execute(f'''
+        UPDATE deliveries SET scheduled_date = date(scheduled_date, ?)
+        WHERE {_IDS} AND scheduled_date IS NOT NULL
+    ''', (f'{int(days):+d} days', _id_list(delivery_ids))).rowcount
@@ -0,0 +1,178 @@
+"""Change data capture feed for trucks, drivers and deliveries
+
+Triggers append one row per insert, update and delete to the changes
+table: (seq, table_name, row_id, op, changed_at), with op one of I, U, D.
+seq is AUTOINCREMENT, so it only ever grows, even after compaction.
+Consumers read changes after a cursor (the last seq they processed) by
+primary-key range and look up current rows themselves, so an integration
+costs work proportional to the number of changes, not the table sizes.
+
+Named consumers keep their cursor in cdc_consumers. compact() deletes
+changes every registered consumer has acknowledged and caps what is left;
+a cursor that points before the oldest retained change raises
+CursorExpired, and that consumer has to resynchronise from the tables.
+
+Write functions leave committing to the caller.
+
+    python cdc.py truck_deliveries.db billing       # print and acknowledge pending changes
+    python cdc.py truck_deliveries.db --compact     # trim the changes table
+"""
+import argparse
+import sqlite3
+import sys
+from datetime import datetime
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_RETAINED = 1_000_000
+
+OPERATIONS = {'I': 'insert', 'U': 'update', 'D': 'delete'}
+
+
+class CursorExpired(Exception):
+    """Changes after a cursor have already been compacted away"""
+
+
+class Change:
+    """A row of the changes table"""
+    __slots__ = ('seq', 'table_name', 'row_id', 'op', 'changed_at')
+
+    def __init__(self, seq, table_name, row_id, op, changed_at):
+        self.seq = seq
+        self.table_name = table_name
+        self.row_id = row_id
+        self.op = op
+        self.changed_at = changed_at
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        return cls(*row)
+
+    def __repr__(self):
+        return f"Change({self.seq!r}, {self.table_name!r}, {self.row_id!r}, {self.op!r})"
+
+
+def head(conn):
+    """Sequence number of the latest change ever recorded"""
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+    return row[0] if row else 0
+
+
+def oldest_available(conn):
+    """Smallest seq a reader can still get; head() + 1 when nothing is retained"""
+    oldest = conn.execute('SELECT MIN(seq) FROM changes').fetchone()[0]
+    return oldest if oldest is not None else head(conn) + 1
+
+
+def changes_after(conn, cursor, batch_size=DEFAULT_BATCH_SIZE, tables=None):
+    """Yield lists of up to batch_size changes with seq > cursor, oldest first
+
+    Reading stops at the head as of each batch, so changes written while
+    iterating are picked up by later batches.
+    """
+    oldest = oldest_available(conn)
+    if cursor + 1 < oldest:
+        raise CursorExpired(f"Changes after {cursor} have been compacted; "
+                            f"oldest retained change is {oldest}")
+    sql = 'SELECT seq, table_name, row_id, op, changed_at FROM changes WHERE seq > ?'
+    params = []
+    if tables:
+        sql += f" AND table_name IN ({', '.join('?' * len(tables))})"
+        params.extend(tables)
+    sql += ' ORDER BY seq LIMIT ?'
+
+    reader = conn.cursor()
+    reader.row_factory = Change.from_row
+    while True:
+        batch = reader.execute(sql, [cursor, *params, batch_size]).fetchall()
+        if not batch:
+            return
+        yield batch
+        cursor = batch[-1].seq
+
+
+def register_consumer(conn, name, from_start=False):
+    """Create a named consumer positioned at the head (or the oldest change)"""
+    cursor = oldest_available(conn) - 1 if from_start else head(conn)
+    conn.execute('''
+        INSERT OR IGNORE INTO cdc_consumers (name, cursor, updated_at) VALUES (?, ?, ?)
+    ''', (name, cursor, datetime.now()))
+
+
+def consumer_cursor(conn, name):
+    row = conn.execute('SELECT cursor FROM cdc_consumers WHERE name = ?', (name,)).fetchone()
+    if row is None:
+        raise KeyError(f"Unknown CDC consumer: {name}")
+    return row[0]
+
+
+def acknowledge(conn, name, seq):
+    """Record that a consumer has processed every change up to seq"""
+    conn.execute('''
+        UPDATE cdc_consumers SET cursor = MAX(cursor, ?), updated_at = ? WHERE name = ?
+    ''', (seq, datetime.now(), name))
+
+
+def unregister_consumer(conn, name):
+    conn.execute('DELETE FROM cdc_consumers WHERE name = ?', (name,))
+
+
+def consume(conn, name, batch_size=DEFAULT_BATCH_SIZE, tables=None):
+    """Yield a named consumer's pending batches, acknowledging each one
+
+    A batch is acknowledged and committed when the next one is requested,
+    i.e. once the caller has finished processing it, so a consumer that
+    crashes mid-batch sees that batch again.
+    """
+    for batch in changes_after(conn, consumer_cursor(conn, name), batch_size, tables):
+        yield batch
+        acknowledge(conn, name, batch[-1].seq)
+        conn.commit()
+
+
+def compact(conn, max_retained=DEFAULT_MAX_RETAINED):
+    """Bound the changes table and return the number of changes deleted
+
+    Changes acknowledged by every registered consumer are always dropped.
+    If more than max_retained remain, the oldest are dropped too, which
+    expires the cursors of consumers that lag that far behind.
+    """
+    consumed = conn.execute('SELECT MIN(cursor) FROM cdc_consumers').fetchone()[0]
+    if consumed is None:
+        consumed = head(conn)
+    deleted = conn.execute('DELETE FROM changes WHERE seq <= ?', (consumed,)).rowcount
+
+    threshold = head(conn) - max_retained
+    if threshold > consumed:
+        deleted += conn.execute('DELETE FROM changes WHERE seq <= ?', (threshold,)).rowcount
+    return deleted
+
+
+def main(argv=None):
+    """Stream a consumer's pending changes, or compact the feed, from the command line"""
+    parser = argparse.ArgumentParser(description="Read the change data capture feed")
+    parser.add_argument('db_path')
+    parser.add_argument('consumer', nargs='?', help="consumer name; registered at the head on first use")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--compact', action='store_true', help="trim acknowledged changes")
+    parser.add_argument('--max-retained', type=int, default=DEFAULT_MAX_RETAINED)
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db_path)
+    try:
+        if args.consumer:
+            register_consumer(conn, args.consumer)
+            conn.commit()
+            for batch in consume(conn, args.consumer, args.batch_size):
+                for change in batch:
+                    sys.stdout.write(f"{change.seq}\t{change.changed_at}\t{OPERATIONS[change.op]}\t"
+                                     f"{change.table_name}\t{change.row_id}\n")
+        if args.compact:
+            deleted = compact(conn, args.max_retained)
+            conn.commit()
+            print(f"Compacted {deleted} change(s)", file=sys.stderr)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""Depot partitioning of the fleet database
+
+The catalog database (truck_deliveries.db) lists depots in the depots
+table. A depot either shares the catalog file, its rows told apart by
+depot_id, or has a database file of its own (db_path), so one busy depot's
+writes never lock another's. Rows are stamped with depot_id in both cases.
+
+DepotRouter hands out the connection holding a depot's partition, and
+fan_out() runs a read-only task against every partition in parallel on
+worker threads (sqlite3 releases the GIL while a statement runs), each
+with its own connection. Fleet-wide reports merge the per-depot results.
+
+    python depots.py truck_deliveries.db list
+    python depots.py truck_deliveries.db add NORTH "North Depot" --file north.db
+    python depots.py truck_deliveries.db summary
+"""
+import argparse
+import os
+import sqlite3
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from migrations import create_base_schema, run_migrations
+
+CATALOG_PATH = 'truck_deliveries.db'
+DEFAULT_DEPOT_ID = 1
+FAN_OUT_WORKERS = 4
+
+
+class Depot:
+    """A row of the depots table"""
+    __slots__ = ('id', 'code', 'name', 'db_path')
+
+    def __init__(self, id, code, name, db_path):
+        self.id = id
+        self.code = code
+        self.name = name
+        self.db_path = db_path
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        return cls(*row)
+
+    def __repr__(self):
+        return f"Depot({self.id!r}, {self.code!r})"
+
+
+class DepotSummary:
+    """Fleet size and delivery totals of one depot, or of the whole fleet"""
+    __slots__ = ('depot', 'trucks', 'drivers', 'deliveries', 'active', 'completed',
+                 'cancelled', 'total_weight')
+
+    def __init__(self, depot, trucks=0, drivers=0, deliveries=0, active=0, completed=0,
+                 cancelled=0, total_weight=0.0):
+        self.depot = depot
+        self.trucks = trucks
+        self.drivers = drivers
+        self.deliveries = deliveries
+        self.active = active
+        self.completed = completed
+        self.cancelled = cancelled
+        self.total_weight = total_weight
+
+    def add(self, other):
+        """Accumulate another summary into this one"""
+        for name in self.__slots__[1:]:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+
+def open_database(path):
+    """Open a fleet database file, creating and migrating its schema as needed"""
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA foreign_keys=ON')
+    create_base_schema(conn)
+    run_migrations(conn)
+    return conn
+
+
+def list_depots(conn):
+    cursor = conn.cursor()
+    cursor.row_factory = Depot.from_row
+    return cursor.execute('SELECT id, code, name, db_path FROM depots ORDER BY code').fetchall()
+
+
+def create_depot(conn, code, name, db_path=None):
+    """Register a depot in the catalog and return its id
+
+    With a db_path the depot's trucks, drivers and deliveries live in that
+    file, which is created on first connection.
+    """
+    cursor = conn.execute('''
+        INSERT INTO depots (code, name, db_path, created_date) VALUES (?, ?, ?, ?)
+    ''', (code, name, db_path, date.today()))
+    return cursor.lastrowid
+
+
+class DepotRouter:
+    """Route each depot's reads and writes to the database holding it"""
+
+    def __init__(self, catalog_path=CATALOG_PATH):
+        self.catalog_path = catalog_path
+        self.catalog = open_database(catalog_path)
+        self._connections = {}
+
+    def depots(self):
+        return list_depots(self.catalog)
+
+    def depot(self, depot=None):
+        """Look a depot up by id or code; None means the default depot"""
+        depot = DEFAULT_DEPOT_ID if depot is None else depot
+        column = 'id' if isinstance(depot, int) else 'code'
+        cursor = self.catalog.cursor()
+        cursor.row_factory = Depot.from_row
+        found = cursor.execute(f'SELECT id, code, name, db_path FROM depots WHERE {column} = ?',
+                               (depot,)).fetchone()
+        if found is None:
+            raise KeyError(f"Unknown depot: {depot}")
+        return found
+
+    def database_path(self, depot):
+        """File holding a depot's partition; relative paths sit beside the catalog"""
+        if not depot.db_path:
+            return self.catalog_path
+        return os.path.join(os.path.dirname(os.path.abspath(self.catalog_path)), depot.db_path)
+
+    def connection(self, depot_id):
+        """Connection for reads and writes of one depot's rows"""
+        depot = self.depot(depot_id)
+        if not depot.db_path:
+            return self.catalog
+        conn = self._connections.get(depot.id)
+        if conn is None:
+            conn = self._connections[depot.id] = open_database(self.database_path(depot))
+            # Rows there are stamped with this depot's id, which their
+            # foreign keys must be able to find
+            conn.execute('''
+                INSERT OR IGNORE INTO depots (id, code, name, created_date) VALUES (?, ?, ?, ?)
+            ''', (depot.id, depot.code, depot.name, date.today()))
+            conn.commit()
+        return conn
+
+    def fan_out(self, task, depots=None, max_workers=FAN_OUT_WORKERS):
+        """Run task(conn, depot) for every depot in parallel
+
+        Each call gets a fresh read-only connection of its own, closed
+        afterwards. Depots whose file has not been created yet hold no rows
+        and are skipped. Returns [(depot, result)] in depot order.
+        """
+        depots = self.depots() if depots is None else depots
+        depots = [depot for depot in depots if os.path.exists(self.database_path(depot))]
+
+        def run(depot):
+            path = urllib.parse.quote(os.path.abspath(self.database_path(depot)))
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                return task(conn, depot)
+            finally:
+                conn.close()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(zip(depots, executor.map(run, depots)))
+
+    def close(self):
+        for conn in self._connections.values():
+            conn.close()
+        self._connections.clear()
+        self.catalog.close()
+
+
+def _depot_summary(conn, depot):
+    trucks = conn.execute('SELECT COUNT(*) FROM trucks WHERE depot_id = ? AND deleted_at IS NULL',
+                          (depot.id,)).fetchone()[0]
+    drivers = conn.execute('SELECT COUNT(*) FROM drivers WHERE depot_id = ? AND deleted_at IS NULL',
+                           (depot.id,)).fetchone()[0]
+    deliveries, active, completed, cancelled, total_weight = conn.execute('''
+        SELECT COUNT(*),
+               COALESCE(SUM(status IN ('Scheduled', 'In Progress')), 0),
+               COALESCE(SUM(status = 'Completed'), 0),
+               COALESCE(SUM(status = 'Cancelled'), 0),
+               COALESCE(SUM(weight), 0)
+        FROM deliveries WHERE depot_id = ?
+    ''', (depot.id,)).fetchone()
+    return DepotSummary(depot, trucks, drivers, deliveries, active, completed, cancelled, total_weight)
+
+
+def fleet_summary(router):
+    """Per-depot summaries plus a fleet-wide total, built in parallel
+
+    Returns (summaries, total); depots without a database file yet count zero.
+    """
+    depots = router.depots()
+    found = {depot.id: summary for depot, summary in router.fan_out(_depot_summary, depots)}
+    summaries = [found.get(depot.id) or DepotSummary(depot) for depot in depots]
+    total = DepotSummary(None)
+    for summary in summaries:
+        total.add(summary)
+    return summaries, total
+
+
+def main(argv=None):
+    """List, add and summarise depots from the command line"""
+    parser = argparse.ArgumentParser(description="Manage depots")
+    parser.add_argument('catalog_path', nargs='?', default=CATALOG_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help="list depots")
+    add = commands.add_parser('add', help="register a depot")
+    add.add_argument('code')
+    add.add_argument('name')
+    add.add_argument('--file', dest='db_path',
+                     help="keep the depot in a database file of its own, relative to the catalog")
+    commands.add_parser('summary', help="fleet size and deliveries per depot")
+    args = parser.parse_args(argv)
+
+    router = DepotRouter(args.catalog_path)
+    try:
+        if args.command == 'add':
+            depot_id = create_depot(router.catalog, args.code, args.name, args.db_path)
+            router.catalog.commit()
+            if args.db_path:
+                router.connection(depot_id)
+            print(depot_id)
+        elif args.command == 'list':
+            for depot in router.depots():
+                print(f"{depot.id}\t{depot.code}\t{depot.name}\t{depot.db_path or '-'}")
+        else:
+            summaries, total = fleet_summary(router)
+            print(f"{'DEPOT':<12} {'Trucks':>7} {'Drivers':>8} {'Deliveries':>11} {'Active':>7} {'Done':>7}")
+            for summary in summaries + [total]:
+                label = summary.depot.code if summary.depot else 'TOTAL'
+                print(f"{label:<12} {summary.trucks:>7} {summary.drivers:>8} {summary.deliveries:>11} "
+                      f"{summary.active:>7} {summary.completed:>7}")
+    except sqlite3.IntegrityError:
+        raise SystemExit(f"Depot code {args.code} already exists")
+    finally:
+        router.close()
+
+
+if __name__ == "__main__":
+    main()
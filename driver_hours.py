@@ -0,0 +1,307 @@
+"""Driver hours of service and shift-aware availability
+
+On-duty intervals are derived from each driver's deliveries (scheduled start
+plus duration) and unavailability from the driver status history. Days are
+loaded into an in-memory index on first use, so answering "who is free at
+time T" is a bisect per driver with no database access.
+"""
+from bisect import bisect_left
+from datetime import date, timedelta
+
+DEFAULT_DELIVERY_MINUTES = 120
+
+# Statuses during which a driver cannot be assigned at all
+UNAVAILABLE_STATUSES = ('On Leave', 'Suspended')
+
+# Deliveries that do not put a driver on duty
+_OFF_DUTY_DELIVERY_STATUS = 'Cancelled'
+
+MINUTES_PER_DAY = 24 * 60
+WEEK_DAYS = 7
+
+
+class HoursLimits:
+    """Configurable hours-of-service limits, in minutes"""
+
+    def __init__(self, daily_minutes=11 * 60, weekly_minutes=60 * 60):
+        self.daily_minutes = daily_minutes
+        self.weekly_minutes = weekly_minutes
+
+
+class DaySchedule:
+    """On-duty intervals of every driver on one day
+
+    ``intervals`` maps driver id to a start-sorted list of
+    (start_minute, end_minute, delivery_db_id); ends past midnight spill
+    into the next day's overlap checks. ``max_ends`` holds the running
+    maximum of the ends, since intervals are not guaranteed to be disjoint.
+    """
+    __slots__ = ('day', 'intervals', 'starts', 'max_ends', 'totals', 'unavailable')
+
+    def __init__(self, day):
+        self.day = day
+        self.intervals = {}
+        self.starts = {}
+        self.max_ends = {}
+        self.totals = {}
+        self.unavailable = set()
+
+    def add(self, driver_id, start, end, delivery_db_id):
+        self.intervals.setdefault(driver_id, []).append((start, end, delivery_db_id))
+        self.totals[driver_id] = self.totals.get(driver_id, 0) + (end - start)
+
+    def seal(self):
+        """Sort intervals and build the start and running max end arrays used for bisecting"""
+        for driver_id, intervals in self.intervals.items():
+            intervals.sort()
+            self.starts[driver_id] = [interval[0] for interval in intervals]
+            max_ends, latest = [], 0
+            for interval in intervals:
+                latest = max(latest, interval[1])
+                max_ends.append(latest)
+            self.max_ends[driver_id] = max_ends
+
+    def without(self, delivery_db_ids):
+        """A sealed copy of the schedule leaving out the given deliveries"""
+        copy = DaySchedule(self.day)
+        copy.unavailable = self.unavailable
+        for driver_id, intervals in self.intervals.items():
+            for start, end, delivery_db_id in intervals:
+                if delivery_db_id not in delivery_db_ids:
+                    copy.add(driver_id, start, end, delivery_db_id)
+        copy.seal()
+        return copy
+
+
+def parse_minutes(value):
+    """'HH:MM' to minutes after midnight"""
+    hours, minutes = str(value).split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+def _to_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+class AvailabilityIndex:
+    """Per-day in-memory index of driver on-duty time"""
+
+    def __init__(self, conn, limits=None, depot_id=None):
+        self.conn = conn
+        self.limits = limits or HoursLimits()
+        self.depot_id = depot_id
+        self._days = {}
+        self._driver_ids = None
+
+    # Loading
+
+    def invalidate(self, day=None):
+        """Forget one cached day (or everything) after deliveries change"""
+        if day is None:
+            self._days.clear()
+            self._driver_ids = None
+        else:
+            self._days.pop(_to_date(day), None)
+
+    def _depot_drivers(self, column):
+        """Condition limiting a driver id column to the index's depot, and its parameters"""
+        if self.depot_id is None:
+            return '', ()
+        return f' AND {column} IN (SELECT id FROM drivers WHERE depot_id = ?)', (self.depot_id,)
+
+    def driver_ids(self):
+        if self._driver_ids is None:
+            depot, params = self._depot_drivers('id')
+            self._driver_ids = [row[0] for row in self.conn.execute(
+                f'SELECT id FROM drivers WHERE deleted_at IS NULL{depot} ORDER BY id', params)]
+        return self._driver_ids
+
+    def _ensure_days(self, first, last):
+        """Load every uncached day in [first, last] with one range query"""
+        missing = [first + timedelta(days=i) for i in range((last - first).days + 1)
+                   if first + timedelta(days=i) not in self._days]
+        if not missing:
+            return
+
+        load_first, load_last = missing[0], missing[-1]
+        schedules = {day: DaySchedule(day) for day in missing}
+
+        # All deliveries of the depot's drivers count, whichever depot they run from
+        depot, depot_params = self._depot_drivers('driver_id')
+        rows = self.conn.execute(f'''
+            SELECT id, driver_id, scheduled_date, scheduled_time, duration_minutes
+            FROM deliveries
+            WHERE scheduled_date BETWEEN ? AND ? AND status != ? AND driver_id IS NOT NULL{depot}
+        ''', (load_first.isoformat(), load_last.isoformat(), _OFF_DUTY_DELIVERY_STATUS, *depot_params))
+        for delivery_db_id, driver_id, scheduled_date, scheduled_time, duration in rows:
+            schedule = schedules.get(_to_date(scheduled_date))
+            if schedule is None or not scheduled_time:
+                continue
+            start = parse_minutes(scheduled_time)
+            schedule.add(driver_id, start, start + (duration or DEFAULT_DELIVERY_MINUTES), delivery_db_id)
+
+        for day, schedule in schedules.items():
+            schedule.unavailable = self._unavailable_drivers(day)
+            schedule.seal()
+            self._days[day] = schedule
+
+    def _unavailable_drivers(self, day):
+        """Drivers whose status as of the end of the day makes them unavailable"""
+        placeholders = ', '.join('?' for _ in UNAVAILABLE_STATUSES)
+        end_of_day = f'{day.isoformat()} 23:59:59'
+        depot, depot_params = self._depot_drivers('h.driver_id')
+        return {row[0] for row in self.conn.execute(f'''
+            SELECT h.driver_id
+            FROM driver_status_history h
+            WHERE h.id = (
+                SELECT MAX(id) FROM driver_status_history
+                WHERE driver_id = h.driver_id AND changed_at <= ?
+            ) AND h.status IN ({placeholders}){depot}
+        ''', (end_of_day, *UNAVAILABLE_STATUSES, *depot_params))}
+
+    def day(self, day):
+        """The cached schedule of a day, loading it if needed"""
+        day = _to_date(day)
+        if day not in self._days:
+            self._ensure_days(day, day)
+        return self._days[day]
+
+    def _week(self, day):
+        """Schedules of the rolling week ending on the given day
+
+        The day before the week and the day after are loaded too, for
+        deliveries running past midnight.
+        """
+        first = day - timedelta(days=WEEK_DAYS - 1)
+        self._ensure_days(first - timedelta(days=1), day + timedelta(days=1))
+        return [self._days[first + timedelta(days=i)] for i in range(WEEK_DAYS)]
+
+    # Queries
+
+    @staticmethod
+    def _overlaps_schedule(schedule, driver_id, start, end, exclude=None):
+        """Whether a driver has an interval of one day's schedule overlapping [start, end)"""
+        intervals = schedule.intervals.get(driver_id)
+        if not intervals:
+            return False
+        # Only intervals starting before `end` can overlap; walking back
+        # from the last of them stops once no earlier interval runs past `start`
+        max_ends = schedule.max_ends[driver_id]
+        index = bisect_left(schedule.starts[driver_id], end) - 1
+        while index >= 0 and max_ends[index] > start:
+            interval_start, interval_end, delivery_db_id = intervals[index]
+            if interval_end > start and delivery_db_id != exclude:
+                return True
+            index -= 1
+        return False
+
+    def _overlaps(self, driver_id, day, start, end, exclude=None):
+        """Whether a driver has on-duty time overlapping [start, end) on a day"""
+        if self._overlaps_schedule(self._days[day], driver_id, start, end, exclude):
+            return True
+
+        # The part of [start, end) running past midnight into the next day
+        following = self._days.get(day + timedelta(days=1))
+        if following and end > MINUTES_PER_DAY and \
+                self._overlaps_schedule(following, driver_id, 0, end - MINUTES_PER_DAY, exclude):
+            return True
+
+        # Deliveries running past midnight the day before
+        previous = self._days.get(day - timedelta(days=1))
+        if previous and start < MINUTES_PER_DAY:
+            for interval_start, interval_end, delivery_db_id in previous.intervals.get(driver_id, ()):
+                if interval_end - MINUTES_PER_DAY > start and delivery_db_id != exclude:
+                    return True
+        return False
+
+    def _minutes(self, schedule, driver_id, exclude=None):
+        total = schedule.totals.get(driver_id, 0)
+        if exclude is not None:
+            for start, end, delivery_db_id in schedule.intervals.get(driver_id, ()):
+                if delivery_db_id == exclude:
+                    total -= end - start
+        return total
+
+    def check_assignment(self, driver_id, day, start_time, duration=DEFAULT_DELIVERY_MINUTES,
+                         exclude_delivery=None):
+        """Reasons a driver cannot take a delivery; an empty list means allowed"""
+        day = _to_date(day)
+        start = parse_minutes(start_time) if isinstance(start_time, str) else start_time
+        end = start + duration
+        week = self._week(day)
+        today = week[-1]
+
+        problems = []
+        if driver_id in today.unavailable:
+            problems.append("driver is on leave or suspended")
+        if self._overlaps(driver_id, day, start, end, exclude_delivery):
+            problems.append("driver already has a delivery at that time")
+
+        daily = self._minutes(today, driver_id, exclude_delivery) + duration
+        if daily > self.limits.daily_minutes:
+            problems.append(f"daily limit of {self.limits.daily_minutes / 60:g}h exceeded "
+                            f"({daily / 60:.1f}h)")
+
+        weekly = sum(self._minutes(schedule, driver_id, exclude_delivery) for schedule in week) + duration
+        if weekly > self.limits.weekly_minutes:
+            problems.append(f"weekly limit of {self.limits.weekly_minutes / 60:g}h exceeded "
+                            f"({weekly / 60:.1f}h)")
+        return problems
+
+    def check_plan(self, plan):
+        """Problems with making several assignments at once, as (delivery_db_id, problem) pairs
+
+        plan lists (delivery_db_id, driver_id, day, start_time, duration)
+        moves. They are checked in order against a scratch copy of the index
+        without the moved deliveries, each move being added to the copy once
+        checked, so moves that overlap each other or together exceed a limit
+        are caught, and none is held against another's old slot.
+        """
+        plan = [(delivery_db_id, driver_id, _to_date(day),
+                 parse_minutes(start_time) if isinstance(start_time, str) else start_time, duration)
+                for delivery_db_id, driver_id, day, start_time, duration in plan]
+        for move in plan:
+            self._week(move[2])
+
+        moved = {move[0] for move in plan}
+        scratch = AvailabilityIndex(self.conn, self.limits, self.depot_id)
+        scratch._days = {day: schedule.without(moved) for day, schedule in self._days.items()}
+
+        problems = []
+        for delivery_db_id, driver_id, day, start, duration in plan:
+            problems.extend((delivery_db_id, problem)
+                            for problem in scratch.check_assignment(driver_id, day, start, duration))
+            schedule = scratch._days[day]
+            schedule.add(driver_id, start, start + duration, delivery_db_id)
+            schedule.seal()
+        return problems
+
+    def free_drivers(self, day, start_time, duration=DEFAULT_DELIVERY_MINUTES):
+        """Ids of drivers who can take a delivery starting at the given time"""
+        day = _to_date(day)
+        start = parse_minutes(start_time) if isinstance(start_time, str) else start_time
+        end = start + duration
+        week = self._week(day)
+        today = week[-1]
+        following = self._days[day + timedelta(days=1)] if end > MINUTES_PER_DAY else None
+        daily_limit = self.limits.daily_minutes - duration
+        weekly_limit = self.limits.weekly_minutes - duration
+
+        free = []
+        for driver_id in self.driver_ids():
+            if driver_id in today.unavailable:
+                continue
+            if today.totals.get(driver_id, 0) > daily_limit:
+                continue
+            if driver_id in today.intervals or driver_id in week[-2].intervals or \
+                    (following and driver_id in following.intervals):
+                if self._overlaps(driver_id, day, start, end):
+                    continue
+            if sum(schedule.totals.get(driver_id, 0) for schedule in week) > weekly_limit:
+                continue
+            free.append(driver_id)
+        return free
+
+    def on_duty_minutes(self, driver_id, day):
+        """Minutes a driver is on duty on a day"""
+        return self.day(day).totals.get(driver_id, 0)
@@ -0,0 +1,191 @@
+"""Demand forecasting over delivery history
+
+Daily delivery counts and tonnage are loaded per lane, truck or driver
+into (series x day) NumPy arrays with one grouped query whose rows are
+streamed straight into the arrays. Models are fitted to all series at
+once; the only Python loop is over days, each step a handful of array
+operations, so a year of history for every lane takes well under a second.
+
+Models:
+    moving average  - mean of the last window days, flat over the horizon
+    seasonal        - exponential smoothing of a level plus an additive
+                      day-of-week component (Holt-Winters without trend)
+
+forecast() picks, per series, whichever model had the lower one-step-ahead
+error over the history. NumPy is only needed when forecasting is used.
+"""
+from datetime import date, timedelta
+
+DEFAULT_HISTORY_DAYS = 365
+DEFAULT_HORIZON_DAYS = 14
+MOVING_AVERAGE_WINDOW = 28
+SEASON_LENGTH = 7
+LEVEL_SMOOTHING = 0.2
+SEASON_SMOOTHING = 0.1
+
+# Grouping expression and label query per dimension
+_DIMENSIONS = {
+    'lane': ('pickup_location_id, delivery_location_id', 'SELECT id, name FROM locations'),
+    'truck': ('truck_id', 'SELECT id, truck_number FROM trucks'),
+    'driver': ('driver_id', 'SELECT id, name FROM drivers'),
+}
+
+METRICS = ('deliveries', 'tonnage')
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Forecasting requires NumPy (pip install numpy)") from None
+    return numpy
+
+
+class DailySeries:
+    """Daily history of one metric for every key of a dimension"""
+    __slots__ = ('dimension', 'keys', 'start', 'values')
+
+    def __init__(self, dimension, keys, start, values):
+        self.dimension = dimension
+        self.keys = keys
+        self.start = start
+        self.values = values
+
+
+class Forecast:
+    """Forecast for one lane, truck or driver"""
+    __slots__ = ('key', 'label', 'method', 'history_daily', 'daily')
+
+    def __init__(self, key, label, method, history_daily, daily):
+        self.key = key
+        self.label = label
+        self.method = method
+        self.history_daily = history_daily
+        self.daily = daily
+
+    @property
+    def total(self):
+        return sum(self.daily)
+
+
+def load_daily_series(conn, dimension='lane', metric='deliveries',
+                      history_days=DEFAULT_HISTORY_DAYS, end=None, depot_id=None):
+    """Load a (keys x days) array of daily counts or tonnage ending at end
+
+    Cancelled deliveries are excluded. Days without deliveries are zero.
+    depot_id limits the history to one depot's deliveries.
+    """
+    np = _numpy()
+    if dimension not in _DIMENSIONS:
+        raise ValueError(f"Unknown forecast dimension: {dimension}")
+    if metric not in METRICS:
+        raise ValueError(f"Unknown forecast metric: {metric}")
+    end = end or date.today() - timedelta(days=1)
+    start = end - timedelta(days=history_days - 1)
+    group = _DIMENSIONS[dimension][0]
+    value = 'COUNT(*)' if metric == 'deliveries' else 'COALESCE(SUM(weight), 0)'
+    depot = ' AND depot_id = ?' if depot_id is not None else ''
+
+    cursor = conn.execute(f'''
+        SELECT {group}, CAST(julianday(scheduled_date) - julianday(?) AS INTEGER), {value}
+        FROM deliveries
+        WHERE scheduled_date BETWEEN ? AND ? AND status != 'Cancelled'{depot}
+        GROUP BY {group}, scheduled_date
+    ''', (start.isoformat(), start.isoformat(), end.isoformat(),
+          *([depot_id] if depot_id is not None else [])))
+
+    key_index = {}
+    rows, days, values = [], [], []
+    width = len(group.split(','))
+    for row in cursor:
+        key = row[0] if width == 1 else row[:width]
+        rows.append(key_index.setdefault(key, len(key_index)))
+        days.append(row[width])
+        values.append(row[width + 1])
+
+    matrix = np.zeros((len(key_index), history_days))
+    # Several scheduled_date spellings can fall on one day, so accumulate
+    np.add.at(matrix, (np.array(rows, dtype=np.intp), np.array(days, dtype=np.intp)),
+              np.array(values, dtype=float))
+    return DailySeries(dimension, list(key_index), start, matrix)
+
+
+def moving_average(values, window=MOVING_AVERAGE_WINDOW):
+    """One-step-ahead moving-average fits and the final level of each series
+
+    Returns (fitted, level): fitted[:, t] predicts values[:, t] from the
+    window days before it.
+    """
+    np = _numpy()
+    days = np.arange(values.shape[1])
+    # cumulative[:, t] is the sum of the first t days
+    cumulative = np.concatenate([np.zeros((values.shape[0], 1)), np.cumsum(values, axis=1)], axis=1)
+    first = np.maximum(days - window, 0)
+    sums = cumulative[:, days] - cumulative[:, first]
+    counts = days - first
+    fitted = np.divide(sums, counts, out=np.zeros_like(values), where=counts > 0)
+    level = values[:, -window:].mean(axis=1)
+    return fitted, level
+
+
+def seasonal_smoothing(values, alpha=LEVEL_SMOOTHING, gamma=SEASON_SMOOTHING, season=SEASON_LENGTH):
+    """One-step-ahead fits, final level and seasonal offsets of each series
+
+    Additive exponential smoothing with a day-of-week component,
+    initialised from the first season of history.
+    """
+    np = _numpy()
+    n_series, n_days = values.shape
+    level = values[:, :season].mean(axis=1)
+    seasonal = values[:, :season] - level[:, None]
+    fitted = np.zeros_like(values)
+    for t in range(n_days):
+        phase = t % season
+        fitted[:, t] = level + seasonal[:, phase]
+        previous = level
+        level = alpha * (values[:, t] - seasonal[:, phase]) + (1 - alpha) * level
+        seasonal[:, phase] = gamma * (values[:, t] - previous) + (1 - gamma) * seasonal[:, phase]
+    return fitted, level, seasonal
+
+
+def _labels(conn, dimension, keys):
+    names = dict(conn.execute(_DIMENSIONS[dimension][1]).fetchall())
+    if dimension == 'lane':
+        return [f"{names.get(pickup, '(unknown)')} -> {names.get(destination, '(unknown)')}"
+                for pickup, destination in keys]
+    return [names.get(key, '(unassigned)') for key in keys]
+
+
+def forecast(conn, dimension='lane', metric='deliveries', history_days=DEFAULT_HISTORY_DAYS,
+             horizon_days=DEFAULT_HORIZON_DAYS, end=None, top=None, depot_id=None):
+    """Forecast daily demand after end for every key, largest forecast first"""
+    np = _numpy()
+    series = load_daily_series(conn, dimension, metric, history_days, end, depot_id)
+    values = series.values
+    if not series.keys:
+        return []
+
+    window = min(MOVING_AVERAGE_WINDOW, history_days)
+    ma_fitted, ma_level = moving_average(values, window)
+    es_fitted, es_level, seasonal = seasonal_smoothing(values)
+
+    # Score both models on the days each has enough history for
+    scored = slice(max(window, SEASON_LENGTH), None) if history_days > max(window, SEASON_LENGTH) else slice(None)
+    ma_error = np.abs(values[:, scored] - ma_fitted[:, scored]).mean(axis=1)
+    es_error = np.abs(values[:, scored] - es_fitted[:, scored]).mean(axis=1)
+    use_seasonal = es_error < ma_error
+
+    phases = (history_days + np.arange(horizon_days)) % SEASON_LENGTH
+    es_forecast = es_level[:, None] + seasonal[:, phases]
+    ma_forecast = np.repeat(ma_level[:, None], horizon_days, axis=1)
+    predicted = np.clip(np.where(use_seasonal[:, None], es_forecast, ma_forecast), 0, None)
+
+    order = np.argsort(-predicted.sum(axis=1), kind='stable')
+    if top is not None:
+        order = order[:top]
+    keys = [series.keys[i] for i in order]
+    labels = _labels(conn, dimension, keys)
+    history_daily = values[order].mean(axis=1)
+    return [Forecast(key, label, 'seasonal' if use_seasonal[i] else 'moving average',
+                     float(history_daily[n]), predicted[i].tolist())
+            for n, (i, key, label) in enumerate(zip(order, keys, labels))]
@@ -0,0 +1,232 @@
+"""Referential integrity: delete policies, orphan checks and repair
+
+Connections opened through depots.open_database enforce foreign keys, so a
+truck or driver that deliveries still point at can no longer disappear
+from under them. delete_truck() and delete_driver() take an explicit
+policy instead:
+
+    block     hard delete, refused while anything references the row
+    soft      set deleted_at, refused while active work references the row;
+              it stays for history but drops out of lists and combos
+    reassign  move active deliveries and templates to another row, then
+              soft delete
+
+Deletes made before enforcement may have left orphans behind. orphans()
+finds them with one grouped, index-backed query per foreign key, and
+repair() fixes them: missing trucks, drivers and depots come back as
+soft-deleted placeholders so history keeps its joins, and other dangling
+references are cleared. Write functions leave committing to the caller.
+
+    python integrity.py truck_deliveries.db             # report orphans
+    python integrity.py truck_deliveries.db --repair
+"""
+import argparse
+import sqlite3
+import sys
+from datetime import datetime
+
+BLOCK = 'block'
+SOFT_DELETE = 'soft'
+REASSIGN = 'reassign'
+POLICIES = (BLOCK, SOFT_DELETE, REASSIGN)
+
+# Rows that reference a truck or driver: (table, column, active condition)
+_REFERENCES = {
+    'trucks': (('deliveries', 'truck_id', "status IN ('Scheduled', 'In Progress')"),
+               ('delivery_templates', 'truck_id', 'active = 1')),
+    'drivers': (('deliveries', 'driver_id', "status IN ('Scheduled', 'In Progress')"),
+                ('delivery_templates', 'driver_id', 'active = 1')),
+}
+
+# History that belongs to a truck or driver and goes with it on a hard delete
+_OWNED = {
+    'trucks': (('maintenance_log', 'truck_id'),),
+    'drivers': (('driver_status_history', 'driver_id'),),
+}
+
+# Soft-deleted stand-ins for parents that orphans still point at
+_PLACEHOLDERS = {
+    'trucks': '''
+        INSERT OR IGNORE INTO trucks (id, truck_number, model, capacity, deleted_at)
+        VALUES (:id, 'DELETED-' || :id, 'Unknown', 0, :now)
+    ''',
+    'drivers': '''
+        INSERT OR IGNORE INTO drivers (id, name, license_number, deleted_at)
+        VALUES (:id, 'Deleted driver ' || :id, 'DELETED-' || :id, :now)
+    ''',
+    'depots': '''
+        INSERT OR IGNORE INTO depots (id, code, name, created_date)
+        VALUES (:id, 'DEPOT-' || :id, 'Unknown depot ' || :id, date(:now))
+    ''',
+}
+
+
+class DeleteBlocked(Exception):
+    """A delete policy refused to remove a row that is still referenced"""
+
+    def __init__(self, message, references):
+        super().__init__(message)
+        self.references = references
+
+
+class References:
+    """Deliveries and templates pointing at one truck or driver"""
+    __slots__ = ('deliveries', 'active_deliveries', 'templates', 'active_templates')
+
+    def __init__(self, deliveries, active_deliveries, templates, active_templates):
+        self.deliveries = deliveries
+        self.active_deliveries = active_deliveries
+        self.templates = templates
+        self.active_templates = active_templates
+
+    @property
+    def total(self):
+        return self.deliveries + self.templates
+
+    @property
+    def active(self):
+        return self.active_deliveries + self.active_templates
+
+    def __str__(self):
+        return (f"{self.deliveries} deliveries ({self.active_deliveries} active) and "
+                f"{self.templates} templates ({self.active_templates} active)")
+
+
+class Orphan:
+    """Rows of a child table pointing at one missing parent row"""
+    __slots__ = ('table', 'column', 'parent', 'parent_id', 'rows')
+
+    def __init__(self, table, column, parent, parent_id, rows):
+        self.table = table
+        self.column = column
+        self.parent = parent
+        self.parent_id = parent_id
+        self.rows = rows
+
+    def __repr__(self):
+        return f"Orphan({self.table}.{self.column} -> {self.parent} {self.parent_id!r}: {self.rows})"
+
+
+def references(conn, table, row_id):
+    """Count what references a row of trucks or drivers"""
+    counts = []
+    for child, column, active in _REFERENCES[table]:
+        counts.extend(conn.execute(f'''
+            SELECT COUNT(*), COALESCE(SUM({active}), 0) FROM {child} WHERE {column} = ?
+        ''', (row_id,)).fetchone())
+    return References(*counts)
+
+
+def _is_live(conn, table, row_id):
+    return conn.execute(f'SELECT 1 FROM {table} WHERE id = ? AND deleted_at IS NULL',
+                        (row_id,)).fetchone() is not None
+
+
+def _delete(conn, table, row_id, policy, reassign_to):
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown delete policy: {policy}")
+    found = references(conn, table, row_id)
+
+    if policy == BLOCK:
+        if found.total:
+            raise DeleteBlocked(f"{table[:-1].capitalize()} {row_id} is referenced by {found}", found)
+        for child, column in _OWNED[table]:
+            conn.execute(f'DELETE FROM {child} WHERE {column} = ?', (row_id,))
+        conn.execute(f'DELETE FROM {table} WHERE id = ?', (row_id,))
+        return found
+
+    if policy == REASSIGN:
+        if reassign_to is None or reassign_to == row_id or not _is_live(conn, table, reassign_to):
+            raise ValueError(f"Cannot reassign to {table[:-1]} {reassign_to}")
+        for child, column, active in _REFERENCES[table]:
+            conn.execute(f'UPDATE {child} SET {column} = ? WHERE {column} = ? AND {active}',
+                         (reassign_to, row_id))
+    elif found.active:
+        raise DeleteBlocked(f"{table[:-1].capitalize()} {row_id} still has {found}", found)
+
+    conn.execute(f'UPDATE {table} SET deleted_at = ? WHERE id = ? AND deleted_at IS NULL',
+                 (datetime.now(), row_id))
+    return found
+
+
+def delete_truck(conn, truck_id, policy=BLOCK, reassign_to=None):
+    """Delete a truck under a policy; returns what referenced it beforehand"""
+    return _delete(conn, 'trucks', truck_id, policy, reassign_to)
+
+
+def delete_driver(conn, driver_id, policy=BLOCK, reassign_to=None):
+    """Delete a driver under a policy; returns what referenced it beforehand"""
+    return _delete(conn, 'drivers', driver_id, policy, reassign_to)
+
+
+def _foreign_keys(conn):
+    """(table, column, parent, parent_column) for every declared foreign key"""
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+    keys = []
+    for table in tables:
+        for row in conn.execute(f'PRAGMA foreign_key_list({table})'):
+            keys.append((table, row[3], row[2], row[4] or 'id'))
+    return keys
+
+
+def orphans(conn):
+    """Every group of child rows whose parent row is missing
+
+    Each foreign key is checked with one query that walks the index on the
+    child column and probes the parent's primary key.
+    """
+    found = []
+    for table, column, parent, key in _foreign_keys(conn):
+        for parent_id, rows in conn.execute(f'''
+            SELECT c.{column}, COUNT(*) FROM {table} c
+            WHERE c.{column} IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM {parent} p WHERE p.{key} = c.{column})
+            GROUP BY c.{column}
+        '''):
+            found.append(Orphan(table, column, parent, parent_id, rows))
+    return found
+
+
+def _not_null(conn, table, column):
+    return any(row[1] == column and row[3] for row in conn.execute(f'PRAGMA table_info({table})'))
+
+
+def repair(conn):
+    """Fix every orphan and return the list of what was repaired"""
+    repaired = orphans(conn)
+    now = datetime.now()
+    for orphan in repaired:
+        if orphan.parent in _PLACEHOLDERS:
+            conn.execute(_PLACEHOLDERS[orphan.parent], {'id': orphan.parent_id, 'now': now})
+        elif _not_null(conn, orphan.table, orphan.column):
+            conn.execute(f'DELETE FROM {orphan.table} WHERE {orphan.column} = ?', (orphan.parent_id,))
+        else:
+            conn.execute(f'UPDATE {orphan.table} SET {orphan.column} = NULL WHERE {orphan.column} = ?',
+                         (orphan.parent_id,))
+    return repaired
+
+
+def main(argv=None):
+    """Report orphaned rows, and optionally repair them, from the command line"""
+    parser = argparse.ArgumentParser(description="Check the fleet database for dangling references")
+    parser.add_argument('db_path')
+    parser.add_argument('--repair', action='store_true', help="fix orphans in one transaction")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db_path)
+    try:
+        found = repair(conn) if args.repair else orphans(conn)
+        for orphan in found:
+            print(f"{orphan.table}.{orphan.column}\t{orphan.parent}\t{orphan.parent_id}\t{orphan.rows}")
+        if args.repair:
+            conn.commit()
+        verb = "Repaired" if args.repair else "Found"
+        print(f"{verb} {sum(orphan.rows for orphan in found)} orphaned row(s)", file=sys.stderr)
+    finally:
+        conn.close()
+    raise SystemExit(1 if found and not args.repair else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Live dispatch KPIs kept in memory
+
+KpiStore holds one depot's dashboard figures: today's deliveries by
+status, deliveries and tonnage in transit, and trucks by status. seed()
+loads them with a single query. After that every write path reports what
+it changed, as the facts (scheduled_date, status, weight) of a delivery
+before and after the write, or a truck's status before and after. Each
+report is applied in O(1), so reading the figures never touches the
+database.
+
+Writes made through other connections are only picked up by the next
+seed(); invalidate() asks for one, e.g. after a rollback, and a new day
+triggers one too.
+"""
+from datetime import date
+
+DELIVERY_STATUSES = ('Scheduled', 'In Progress', 'Completed', 'Cancelled')
+IN_TRANSIT = 'In Progress'
+
+_SEED_SQL = '''
+    SELECT 'today', status, COUNT(*), 0 FROM deliveries
+    WHERE depot_id = :depot AND scheduled_date = :today GROUP BY status
+    UNION ALL
+    SELECT 'transit', NULL, COUNT(*), COALESCE(SUM(weight), 0) FROM deliveries
+    WHERE depot_id = :depot AND status = :transit
+    UNION ALL
+    SELECT 'trucks', status, COUNT(*), 0 FROM trucks
+    WHERE depot_id = :depot AND deleted_at IS NULL GROUP BY status
+'''
+
+
+def delivery_facts(delivery):
+    """(scheduled_date, status, weight) of a Delivery row, as KpiStore expects"""
+    if delivery is None:
+        return None
+    return delivery.scheduled_date, delivery.status, delivery.weight
+
+
+class KpiStore:
+    """In-memory dashboard aggregates for one depot"""
+
+    def __init__(self, conn, depot_id):
+        self.conn = conn
+        self.depot_id = depot_id
+        self.day = None
+        self.today = {}
+        self.in_transit = 0
+        self.tonnage_in_transit = 0.0
+        self.trucks = {}
+        self.stale = True
+        self.seeds = 0
+
+    def seed(self, today=None):
+        """Reload every figure with one query"""
+        self.day = (today or date.today()).isoformat()
+        self.today = dict.fromkeys(DELIVERY_STATUSES, 0)
+        self.in_transit = 0
+        self.tonnage_in_transit = 0.0
+        self.trucks = {}
+        rows = self.conn.execute(_SEED_SQL, {'depot': self.depot_id, 'today': self.day,
+                                             'transit': IN_TRANSIT})
+        for kind, status, count, weight in rows:
+            if kind == 'today':
+                self.today[status] = count
+            elif kind == 'transit':
+                self.in_transit = count
+                self.tonnage_in_transit = weight
+            else:
+                self.trucks[status] = count
+        self.stale = False
+        self.seeds += 1
+
+    def invalidate(self):
+        """Reseed on the next refresh"""
+        self.stale = True
+
+    def refresh(self, today=None):
+        """Reseed if invalidated or the day has changed; True when it did"""
+        if self.stale or self.day != (today or date.today()).isoformat():
+            self.seed(today)
+            return True
+        return False
+
+    def _apply(self, facts, sign):
+        scheduled_date, status, weight = facts
+        if str(scheduled_date)[:10] == self.day:
+            self.today[status] = self.today.get(status, 0) + sign
+        if status == IN_TRANSIT:
+            self.in_transit += sign
+            self.tonnage_in_transit += sign * (weight or 0)
+
+    def delivery_changed(self, before=None, after=None):
+        """Account for a delivery insert (before=None), update, or delete (after=None)"""
+        if before is not None:
+            self._apply(before, -1)
+        if after is not None:
+            self._apply(after, 1)
+
+    def truck_changed(self, before=None, after=None):
+        """Account for a truck's status going from before to after (None: absent)"""
+        if before == after:
+            return
+        if before is not None:
+            self.trucks[before] = self.trucks.get(before, 0) - 1
+        if after is not None:
+            self.trucks[after] = self.trucks.get(after, 0) + 1
@@ -0,0 +1,141 @@
+"""Location dimension: normalized pickup/delivery addresses
+
+Free-text locations are reduced to a normalized key (case, punctuation,
+whitespace and common street abbreviations folded) and stored once in the
+locations table, together with optional coordinates from geocoding.
+Deliveries reference them through pickup_location_id and
+delivery_location_id. Write functions leave committing to the caller.
+"""
+import re
+from datetime import date
+
+_ABBREVIATIONS = {
+    'st': 'street',
+    'rd': 'road',
+    'ave': 'avenue',
+    'av': 'avenue',
+    'blvd': 'boulevard',
+    'hwy': 'highway',
+    'ln': 'lane',
+    'ct': 'court',
+    'pl': 'place',
+    'sq': 'square',
+    'pkwy': 'parkway',
+    'ind': 'industrial',
+    'est': 'estate',
+    'whse': 'warehouse',
+    'wh': 'warehouse',
+    'dept': 'department',
+    'ctr': 'center',
+    'centre': 'center',
+}
+
+_NON_WORD = re.compile(r'[^\w]+')
+
+
+def normalize_location(text):
+    """Normalized key of a free-text location"""
+    words = _NON_WORD.sub(' ', (text or '').lower()).split()
+    return ' '.join(_ABBREVIATIONS.get(word, word) for word in words)
+
+
+class Location:
+    """A row of the locations table"""
+    __slots__ = ('id', 'location_key', 'name', 'latitude', 'longitude')
+
+    def __init__(self, id, location_key, name, latitude, longitude):
+        self.id = id
+        self.location_key = location_key
+        self.name = name
+        self.latitude = latitude
+        self.longitude = longitude
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        return cls(*row)
+
+
+class LocationCache:
+    """In-memory key -> id lookup over the locations table
+
+    The whole table is loaded on first use (it holds one row per distinct
+    place, not per delivery); unknown locations are inserted on demand.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._ids = None
+        self._names = None
+
+    def _load(self):
+        self._ids = {}
+        self._names = {}
+        for location_id, key, name in self.conn.execute('SELECT id, location_key, name FROM locations'):
+            self._ids[key] = location_id
+            self._names[location_id] = name
+
+    def invalidate(self):
+        self._ids = None
+        self._names = None
+
+    def lookup(self, text):
+        """Id of an existing location, or None"""
+        if self._ids is None:
+            self._load()
+        return self._ids.get(normalize_location(text))
+
+    def resolve(self, text):
+        """Id of a location, creating it if it does not exist yet"""
+        if self._ids is None:
+            self._load()
+        key = normalize_location(text)
+        if not key:
+            return None
+        location_id = self._ids.get(key)
+        if location_id is None:
+            self.conn.execute('''
+                INSERT OR IGNORE INTO locations (location_key, name, created_date)
+                VALUES (?, ?, ?)
+            ''', (key, text.strip(), date.today()))
+            location_id = self.conn.execute('SELECT id FROM locations WHERE location_key = ?',
+                                            (key,)).fetchone()[0]
+            self._ids[key] = location_id
+            self._names[location_id] = text.strip()
+        return location_id
+
+    def name(self, location_id):
+        """Display name of a location id"""
+        if self._names is None:
+            self._load()
+        return self._names.get(location_id)
+
+
+def set_coordinates(conn, location_id, latitude, longitude):
+    """Cache geocoded coordinates for a location"""
+    conn.execute('UPDATE locations SET latitude = ?, longitude = ? WHERE id = ?',
+                 (latitude, longitude, location_id))
+
+
+def ungeocoded_locations(conn, limit=100):
+    """Locations still waiting for coordinates"""
+    cursor = conn.cursor()
+    cursor.row_factory = Location.from_row
+    return cursor.execute('''
+        SELECT id, location_key, name, latitude, longitude
+        FROM locations WHERE latitude IS NULL
+        ORDER BY id LIMIT ?
+    ''', (limit,)).fetchall()
+
+
+def backfill_delivery_locations(conn, low_rowid, high_rowid, cache=None):
+    """Set location ids on a rowid range of deliveries that do not have them yet"""
+    cache = cache or LocationCache(conn)
+    rows = conn.execute('''
+        SELECT id, pickup_location, delivery_location
+        FROM deliveries
+        WHERE id >= ? AND id < ? AND (pickup_location_id IS NULL OR delivery_location_id IS NULL)
+    ''', (low_rowid, high_rowid)).fetchall()
+    conn.executemany('''
+        UPDATE deliveries SET pickup_location_id = ?, delivery_location_id = ? WHERE id = ?
+    ''', [(cache.resolve(pickup), cache.resolve(destination), delivery_db_id)
+          for delivery_db_id, pickup, destination in rows])
@@ -0,0 +1,240 @@
+"""Truck maintenance planning
+
+A truck is due for service when any of its intervals is used up: days since
+its last service, deliveries since then, or tonnage carried since then.
+Intervals default to the constants below and can be overridden per truck.
+Write functions leave committing to the caller.
+"""
+from datetime import date, timedelta
+
+SERVICE_INTERVAL_DAYS = 90
+SERVICE_INTERVAL_DELIVERIES = 200
+SERVICE_INTERVAL_TONNAGE = 2000.0
+
+# Share of an interval used up at which a truck is reported
+DUE_SOON_RATIO = 0.9
+DUE_RATIO = 1.0
+OVERDUE_RATIO = 1.1
+
+# Statuses that block new delivery assignments
+BLOCKING_STATUSES = ('Due', 'Overdue')
+
+# Deliveries that count as usage / as load on the schedule
+_USAGE_EXCLUDED_STATUS = 'Cancelled'
+_ACTIVE_STATUSES = ('Scheduled', 'In Progress')
+
+# Days a due truck may wait for a quieter day in the proposed calendar
+DUE_SCHEDULING_WINDOW = 3
+
+_STATUS_SQL = '''
+    SELECT t.id, t.truck_number, t.status,
+           COALESCE(t.last_maintenance, t.registration_date) AS serviced,
+           COALESCE(t.service_interval_days, ?),
+           COALESCE(t.service_interval_deliveries, ?),
+           COALESCE(t.service_interval_tonnage, ?),
+           COUNT(d.id),
+           COALESCE(SUM(d.weight), 0)
+    FROM trucks t
+    LEFT JOIN deliveries d
+        ON d.truck_id = t.id
+        AND d.scheduled_date > COALESCE(t.last_maintenance, t.registration_date, '')
+        AND d.scheduled_date <= ?
+        AND d.status != ?
+'''
+
+
+class MaintenanceStatus:
+    """Service usage of one truck as of a given day"""
+    __slots__ = ('truck_id', 'truck_number', 'truck_status', 'last_service',
+                 'interval_days', 'interval_deliveries', 'interval_tonnage',
+                 'days_since', 'deliveries_since', 'tonnage_since',
+                 'ratio', 'status', 'projected_due')
+
+    def __init__(self, row, today):
+        (self.truck_id, self.truck_number, self.truck_status, self.last_service,
+         self.interval_days, self.interval_deliveries, self.interval_tonnage,
+         self.deliveries_since, self.tonnage_since) = row
+
+        serviced = _parse_date(self.last_service) or today
+        self.days_since = max((today - serviced).days, 0)
+
+        ratios = [
+            self.days_since / self.interval_days if self.interval_days else 0,
+            self.deliveries_since / self.interval_deliveries if self.interval_deliveries else 0,
+            self.tonnage_since / self.interval_tonnage if self.interval_tonnage else 0,
+        ]
+        self.ratio = max(ratios)
+
+        if self.ratio >= OVERDUE_RATIO:
+            self.status = 'Overdue'
+        elif self.ratio >= DUE_RATIO:
+            self.status = 'Due'
+        elif self.ratio >= DUE_SOON_RATIO:
+            self.status = 'Due Soon'
+        else:
+            self.status = 'OK'
+
+        self.projected_due = self._project_due_date(today)
+
+    def _project_due_date(self, today):
+        """Estimate when the first interval runs out at the current usage rate"""
+        if self.ratio >= DUE_RATIO:
+            return today
+
+        days_left = [self.interval_days - self.days_since] if self.interval_days else []
+        elapsed = max(self.days_since, 1)
+        if self.interval_deliveries and self.deliveries_since:
+            rate = self.deliveries_since / elapsed
+            days_left.append((self.interval_deliveries - self.deliveries_since) / rate)
+        if self.interval_tonnage and self.tonnage_since:
+            rate = self.tonnage_since / elapsed
+            days_left.append((self.interval_tonnage - self.tonnage_since) / rate)
+
+        if not days_left:
+            return None
+        return today + timedelta(days=max(int(min(days_left)), 0))
+
+    @property
+    def blocks_assignment(self):
+        return self.status in BLOCKING_STATUSES
+
+
+class MaintenanceSlot:
+    """A proposed service day for one truck"""
+    __slots__ = ('truck_id', 'truck_number', 'service_date', 'status', 'fleet_load')
+
+    def __init__(self, truck_id, truck_number, service_date, status, fleet_load):
+        self.truck_id = truck_id
+        self.truck_number = truck_number
+        self.service_date = service_date
+        self.status = status
+        self.fleet_load = fleet_load
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def _status_params(today):
+    return (SERVICE_INTERVAL_DAYS, SERVICE_INTERVAL_DELIVERIES, SERVICE_INTERVAL_TONNAGE,
+            today.isoformat(), _USAGE_EXCLUDED_STATUS)
+
+
+def maintenance_statuses(conn, today=None, truck_id=None, depot_id=None):
+    """Service usage of every truck of a depot (all depots when None), or of one truck, in a single indexed query"""
+    today = today or date.today()
+    sql = _STATUS_SQL
+    params = list(_status_params(today))
+    if truck_id is not None:
+        sql += ' WHERE t.id = ?'
+        params.append(truck_id)
+    else:
+        sql += ' WHERE t.deleted_at IS NULL'
+        if depot_id is not None:
+            sql += ' AND t.depot_id = ?'
+            params.append(depot_id)
+    sql += ' GROUP BY t.id ORDER BY t.truck_number'
+    return [MaintenanceStatus(row, today) for row in conn.execute(sql, params)]
+
+
+def due_trucks(conn, today=None, include_due_soon=True, depot_id=None):
+    """Trucks that are due soon, due or overdue, most urgent first"""
+    wanted = ('Due Soon', 'Due', 'Overdue') if include_due_soon else BLOCKING_STATUSES
+    statuses = [s for s in maintenance_statuses(conn, today, depot_id=depot_id) if s.status in wanted]
+    statuses.sort(key=lambda s: -s.ratio)
+    return statuses
+
+
+def truck_maintenance_status(conn, truck_id, today=None):
+    """Service usage of one truck, or None if it does not exist"""
+    statuses = maintenance_statuses(conn, today, truck_id)
+    return statuses[0] if statuses else None
+
+
+def record_maintenance(conn, truck_id, service_date=None, notes=''):
+    """Log a completed service and restart the truck's intervals"""
+    service_date = service_date or date.today()
+    conn.execute('''
+        INSERT INTO maintenance_log (truck_id, service_date, notes)
+        VALUES (?, ?, ?)
+    ''', (truck_id, service_date, notes))
+    conn.execute('''
+        UPDATE trucks SET last_maintenance = ?,
+            status = CASE WHEN status = 'Maintenance' THEN 'Available' ELSE status END
+        WHERE id = ?
+    ''', (service_date, truck_id))
+
+
+def propose_calendar(conn, horizon_days=30, today=None, depot_id=None):
+    """Propose a service day for every truck of a depot that falls due within the horizon
+
+    Trucks are placed most urgent first on the day in their window with the
+    fewest active deliveries at the depot, avoiding days the truck itself is
+    booked and spreading services that land on the same day. Due and overdue
+    trucks are kept within DUE_SCHEDULING_WINDOW days.
+    """
+    today = today or date.today()
+    end = today + timedelta(days=horizon_days)
+
+    candidates = [s for s in maintenance_statuses(conn, today, depot_id=depot_id)
+                  if s.projected_due is not None and s.projected_due <= end]
+    if not candidates:
+        return []
+    candidates.sort(key=lambda s: (s.projected_due, -s.ratio))
+
+    placeholders = ', '.join('?' for _ in _ACTIVE_STATUSES)
+    depot = ' AND depot_id = ?' if depot_id is not None else ''
+    fleet_load = dict(conn.execute(f'''
+        SELECT scheduled_date, COUNT(*)
+        FROM deliveries
+        WHERE scheduled_date BETWEEN ? AND ? AND status IN ({placeholders}){depot}
+        GROUP BY scheduled_date
+    ''', (today.isoformat(), end.isoformat(), *_ACTIVE_STATUSES,
+          *([depot_id] if depot_id is not None else []))))
+
+    truck_ids = [s.truck_id for s in candidates]
+    booked = set(conn.execute(f'''
+        SELECT DISTINCT truck_id, scheduled_date
+        FROM deliveries
+        WHERE truck_id IN ({', '.join('?' for _ in truck_ids)})
+            AND scheduled_date BETWEEN ? AND ? AND status IN ({placeholders})
+    ''', (*truck_ids, today.isoformat(), end.isoformat(), *_ACTIVE_STATUSES)))
+
+    services_per_day = {}
+    plan = []
+    for status in candidates:
+        if status.status in BLOCKING_STATUSES:
+            last = today + timedelta(days=DUE_SCHEDULING_WINDOW)
+        else:
+            last = status.projected_due
+        last = min(last, end)
+
+        best = None
+        day = today
+        while day <= last:
+            key = day.isoformat()
+            load = fleet_load.get(key, 0)
+            # Avoid the truck's own booked days first, then busy fleet days;
+            # each truck already down that day weighs as two deliveries
+            score = (1 if (status.truck_id, key) in booked else 0,
+                     load + services_per_day.get(key, 0) * 2,
+                     day)
+            if best is None or score < best[0]:
+                best = (score, day, load)
+            day += timedelta(days=1)
+
+        _, service_day, load = best
+        key = service_day.isoformat()
+        services_per_day[key] = services_per_day.get(key, 0) + 1
+        plan.append(MaintenanceSlot(status.truck_id, status.truck_number,
+                                    service_day, status.status, load))
+
+    plan.sort(key=lambda slot: (slot.service_date, slot.truck_number))
+    return plan
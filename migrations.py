@@ -0,0 +1,665 @@
+"""Versioned schema migrations for the truck deliveries database
+
+The schema version is stored in PRAGMA user_version. Each migration has an
+idempotent schema step, which runs in a single transaction, and optional
+backfills, which run afterwards in bounded rowid chunks that commit one at a
+time so other connections are never locked out for long. The version is only
+bumped once all backfills have finished, so an interrupted upgrade simply
+resumes on the next start.
+
+Migrations that rebuild a table are registered with rebuilds_tables=True and
+run with foreign key enforcement off, as SQLite's rebuild procedure requires.
+"""
+import logging
+import re
+import sqlite3
+import sys
+import time
+
+from locations import LocationCache, backfill_delivery_locations
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+class Migration:
+    """A single schema version step"""
+
+    def __init__(self, version, description, schema, backfills=(), rebuilds_tables=False):
+        self.version = version
+        self.description = description
+        self.schema = schema
+        self.backfills = list(backfills)
+        self.rebuilds_tables = rebuilds_tables
+
+
+class Backfill:
+    """A data backfill over one table, applied in rowid chunks
+
+    ``apply`` is either an SQL statement taking ``(low_rowid, high_rowid)``
+    parameters, or a callable ``apply(conn, low_rowid, high_rowid)``. Either
+    form must only touch rows that still need the backfill so that re-running
+    a partially applied backfill is harmless.
+    """
+
+    def __init__(self, description, table, apply, batch_size=BACKFILL_BATCH_SIZE):
+        self.description = description
+        self.table = table
+        self.apply = apply
+        self.batch_size = batch_size
+
+
+MIGRATIONS = []
+
+
+def migration(version, description, backfills=(), rebuilds_tables=False):
+    """Register the decorated function as the schema step of a migration"""
+    def register(schema):
+        MIGRATIONS.append(Migration(version, description, schema, backfills, rebuilds_tables))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return schema
+    return register
+
+
+def log_progress(description, done, total):
+    """Default progress callback: log backfill progress"""
+    percent = (done / total * 100) if total else 100.0
+    logger.info("%s: %d/%d rows (%.1f%%)", description, done, total, percent)
+
+
+def get_schema_version(conn):
+    """Return the schema version recorded in the database"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def column_exists(conn, table, column):
+    """Check whether a table already has the given column"""
+    return any(row[1] == column for row in conn.execute(f'PRAGMA table_info({table})'))
+
+
+def add_column(conn, table, column, declaration):
+    """ALTER TABLE ADD COLUMN, skipping columns that already exist"""
+    if not column_exists(conn, table, column):
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+
+
+def has_unique_constraint(conn, table, column):
+    """Check whether a column carries a UNIQUE constraint in the table definition"""
+    for _, name, unique, origin, _ in conn.execute(f'PRAGMA index_list({table})'):
+        if unique and origin == 'u':
+            if [row[2] for row in conn.execute(f'PRAGMA index_info({name})')] == [column]:
+                return True
+    return False
+
+
+def rebuild_table(conn, table, edit):
+    """Recreate a table from an edited definition, keeping its rows, ids, indexes and triggers
+
+    ``edit`` maps the table's CREATE TABLE text to the new one. Only for
+    migrations registered with rebuilds_tables=True, since dropping the old
+    table would otherwise trip the foreign keys of rows referring to it.
+    """
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+    dependents = [row[0] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table,))]
+    sequence = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+    columns = ', '.join(row[1] for row in conn.execute(f'PRAGMA table_info({table})'))
+
+    conn.execute(re.sub(r'CREATE TABLE\s+\S+', f'CREATE TABLE {table}_rebuilt', edit(sql), count=1))
+    conn.execute(f'INSERT INTO {table}_rebuilt ({columns}) SELECT {columns} FROM {table}')
+    conn.execute(f'DROP TABLE {table}')
+    conn.execute(f'ALTER TABLE {table}_rebuilt RENAME TO {table}')
+    # Ids of deleted rows are never handed out again
+    if sequence:
+        conn.execute('DELETE FROM sqlite_sequence WHERE name = ?', (table,))
+        conn.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (table, sequence[0]))
+    for statement in dependents:
+        conn.execute(statement)
+
+
+def run_backfill(conn, backfill, progress=None):
+    """Apply a backfill in rowid chunks, committing after every chunk"""
+    low, high = conn.execute(f'SELECT MIN(rowid), MAX(rowid) FROM {backfill.table}').fetchone()
+    if low is None:
+        return
+
+    total = high - low + 1
+    start = low
+    while start <= high:
+        end = min(start + backfill.batch_size, high + 1)
+        if isinstance(backfill.apply, str):
+            conn.execute(backfill.apply, (start, end))
+        else:
+            backfill.apply(conn, start, end)
+        conn.commit()
+        if progress:
+            progress(backfill.description, end - low, total)
+        start = end
+
+
+def run_migrations(conn, progress=log_progress, target=None):
+    """Bring the database schema up to date
+
+    Returns the list of versions that were applied.
+    """
+    current = get_schema_version(conn)
+    applied = []
+
+    for step in MIGRATIONS:
+        if step.version <= current or (target is not None and step.version > target):
+            continue
+
+        started = time.perf_counter()
+        logger.info("Applying migration %d: %s", step.version, step.description)
+
+        # Schema changes are atomic; they must be idempotent because the
+        # version is only recorded after the backfills below complete
+        if conn.in_transaction:
+            conn.commit()
+        # Enforcement cannot change inside a transaction; rebuilds keep every
+        # id, so rows referring to the rebuilt table stay valid
+        foreign_keys = step.rebuilds_tables and conn.execute('PRAGMA foreign_keys').fetchone()[0]
+        if foreign_keys:
+            conn.execute('PRAGMA foreign_keys=OFF')
+        conn.execute('BEGIN')
+        try:
+            step.schema(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if foreign_keys:
+                conn.execute('PRAGMA foreign_keys=ON')
+
+        for backfill in step.backfills:
+            run_backfill(conn, backfill, progress)
+
+        conn.execute(f'PRAGMA user_version = {int(step.version)}')
+        conn.commit()
+        applied.append(step.version)
+        logger.info("Migration %d done in %.2fs", step.version, time.perf_counter() - started)
+
+    return applied
+
+
+def create_base_schema(conn):
+    """Create the original trucks, drivers and deliveries tables if missing
+
+    These predate versioned migrations, which all build on top of them.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS trucks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            truck_number TEXT UNIQUE NOT NULL,
+            model TEXT NOT NULL,
+            capacity REAL NOT NULL,
+            status TEXT DEFAULT 'Available',
+            registration_date DATE,
+            last_maintenance DATE
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS drivers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            license_number TEXT UNIQUE NOT NULL,
+            phone TEXT,
+            email TEXT,
+            hire_date DATE,
+            status TEXT DEFAULT 'Available'
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS deliveries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            delivery_id TEXT UNIQUE NOT NULL,
+            truck_id INTEGER,
+            driver_id INTEGER,
+            pickup_location TEXT NOT NULL,
+            delivery_location TEXT NOT NULL,
+            cargo_description TEXT,
+            weight REAL,
+            scheduled_date DATE,
+            scheduled_time TEXT,
+            status TEXT DEFAULT 'Scheduled',
+            created_date DATE,
+            completed_date DATE,
+            FOREIGN KEY (truck_id) REFERENCES trucks (id),
+            FOREIGN KEY (driver_id) REFERENCES drivers (id)
+        )
+    ''')
+    conn.commit()
+
+
+# Migrations
+
+@migration(1, "Index deliveries by truck, driver, schedule and status")
+def _index_deliveries(conn):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_deliveries_truck ON deliveries (truck_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_deliveries_driver ON deliveries (driver_id)')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_deliveries_schedule
+        ON deliveries (scheduled_date, scheduled_time)
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_deliveries_status ON deliveries (status)')
+
+
+@migration(2, "Composite indexes for sorted and filtered list views")
+def _index_list_views(conn):
+    # Each composite index also serves the single-column lookups of the
+    # migration 1 indexes it replaces
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_deliveries_status_schedule
+        ON deliveries (status, scheduled_date, scheduled_time)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_deliveries_truck_schedule
+        ON deliveries (truck_id, scheduled_date, scheduled_time)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_deliveries_driver_schedule
+        ON deliveries (driver_id, scheduled_date, scheduled_time)
+    ''')
+    conn.execute('DROP INDEX IF EXISTS idx_deliveries_status')
+    conn.execute('DROP INDEX IF EXISTS idx_deliveries_truck')
+    conn.execute('DROP INDEX IF EXISTS idx_deliveries_driver')
+
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_trucks_status ON trucks (status)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_drivers_name ON drivers (name)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_drivers_status ON drivers (status)')
+
+
+@migration(3, "Maintenance intervals, service log and truck usage index")
+def _maintenance(conn):
+    add_column(conn, 'trucks', 'service_interval_days', 'INTEGER')
+    add_column(conn, 'trucks', 'service_interval_deliveries', 'INTEGER')
+    add_column(conn, 'trucks', 'service_interval_tonnage', 'REAL')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            truck_id INTEGER NOT NULL,
+            service_date DATE NOT NULL,
+            notes TEXT,
+            FOREIGN KEY (truck_id) REFERENCES trucks (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_maintenance_log_truck
+        ON maintenance_log (truck_id, service_date)
+    ''')
+
+    # Covers usage-since-service lookups (status, weight) and still serves
+    # the truck-ordered list view
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_deliveries_truck_usage
+        ON deliveries (truck_id, scheduled_date, scheduled_time, status, weight)
+    ''')
+    conn.execute('DROP INDEX IF EXISTS idx_deliveries_truck_schedule')
+
+
+@migration(4, "Delivery durations and driver status history")
+def _driver_hours(conn):
+    add_column(conn, 'deliveries', 'duration_minutes', 'INTEGER')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS driver_status_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            driver_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            changed_at TIMESTAMP NOT NULL,
+            FOREIGN KEY (driver_id) REFERENCES drivers (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_driver_status_history_driver
+        ON driver_status_history (driver_id, changed_at)
+    ''')
+
+    # Existing drivers start their history with their current status
+    conn.execute('''
+        INSERT INTO driver_status_history (driver_id, status, changed_at)
+        SELECT id, COALESCE(status, 'Available'), COALESCE(hire_date, '0001-01-01')
+        FROM drivers
+        WHERE NOT EXISTS (SELECT 1 FROM driver_status_history h WHERE h.driver_id = drivers.id)
+    ''')
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_drivers_status_insert
+        AFTER INSERT ON drivers
+        BEGIN
+            INSERT INTO driver_status_history (driver_id, status, changed_at)
+            VALUES (NEW.id, COALESCE(NEW.status, 'Available'), datetime('now', 'localtime'));
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_drivers_status_update
+        AFTER UPDATE OF status ON drivers
+        WHEN NEW.status IS NOT OLD.status
+        BEGIN
+            INSERT INTO driver_status_history (driver_id, status, changed_at)
+            VALUES (NEW.id, NEW.status, datetime('now', 'localtime'));
+        END
+    ''')
+
+
+@migration(5, "Recurring delivery templates")
+def _delivery_templates(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS delivery_templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            rule TEXT NOT NULL,
+            truck_id INTEGER,
+            driver_id INTEGER,
+            pickup_location TEXT NOT NULL,
+            delivery_location TEXT NOT NULL,
+            cargo_description TEXT,
+            weight REAL,
+            scheduled_time TEXT NOT NULL,
+            duration_minutes INTEGER,
+            start_date DATE NOT NULL,
+            end_date DATE,
+            active INTEGER DEFAULT 1,
+            generated_through DATE,
+            created_date DATE,
+            FOREIGN KEY (truck_id) REFERENCES trucks (id),
+            FOREIGN KEY (driver_id) REFERENCES drivers (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_delivery_templates_active
+        ON delivery_templates (active, start_date)
+    ''')
+    add_column(conn, 'deliveries', 'template_id', 'INTEGER REFERENCES delivery_templates (id)')
+
+
+class _LocationLinker:
+    """Backfill callable that keeps one location cache across chunks"""
+
+    def __init__(self):
+        self.cache = None
+
+    def __call__(self, conn, low_rowid, high_rowid):
+        if self.cache is None or self.cache.conn is not conn:
+            self.cache = LocationCache(conn)
+        backfill_delivery_locations(conn, low_rowid, high_rowid, self.cache)
+
+
+@migration(6, "Locations dimension table referenced by deliveries",
+           backfills=[Backfill("Linking deliveries to locations", 'deliveries', _LocationLinker())])
+def _locations(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS locations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            location_key TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            latitude REAL,
+            longitude REAL,
+            created_date DATE
+        )
+    ''')
+    add_column(conn, 'deliveries', 'pickup_location_id', 'INTEGER REFERENCES locations (id)')
+    add_column(conn, 'deliveries', 'delivery_location_id', 'INTEGER REFERENCES locations (id)')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_deliveries_lane
+        ON deliveries (pickup_location_id, delivery_location_id)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_deliveries_delivery_location
+        ON deliveries (delivery_location_id)
+    ''')
+
+
+@migration(7, "Covering index for lane analytics")
+def _lane_analytics(conn):
+    # Date range scan that covers the lane grouping, status and weight
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_deliveries_date_lane
+        ON deliveries (scheduled_date, pickup_location_id, delivery_location_id, status, weight)
+    ''')
+
+
+@migration(8, "Depots and depot ids on trucks, drivers and deliveries",
+           backfills=[Backfill(f"Assigning {table} to the default depot", table,
+                               f'UPDATE {table} SET depot_id = 1 '
+                               f'WHERE rowid >= ? AND rowid < ? AND depot_id IS NULL')
+                      for table in ('trucks', 'drivers', 'deliveries')])
+def _depots(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS depots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            db_path TEXT,
+            created_date DATE
+        )
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO depots (id, code, name, created_date)
+        VALUES (1, 'MAIN', 'Main Depot', date('now'))
+    ''')
+    for table in ('trucks', 'drivers', 'deliveries'):
+        add_column(conn, table, 'depot_id', 'INTEGER REFERENCES depots (id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_trucks_depot ON trucks (depot_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_drivers_depot ON drivers (depot_id)')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_deliveries_depot_schedule
+        ON deliveries (depot_id, scheduled_date, scheduled_time)
+    ''')
+
+
+@migration(9, "Change data capture for trucks, drivers and deliveries")
+def _change_capture(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TIMESTAMP NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cdc_consumers (
+            name TEXT PRIMARY KEY,
+            cursor INTEGER NOT NULL,
+            updated_at TIMESTAMP
+        )
+    ''')
+
+    # One compact row per mutation; consumers read the current row themselves
+    for table in ('trucks', 'drivers', 'deliveries'):
+        for event, op, row in (('INSERT', 'I', 'NEW'), ('UPDATE', 'U', 'NEW'), ('DELETE', 'D', 'OLD')):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_cdc_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    INSERT INTO changes (table_name, row_id, op, changed_at)
+                    VALUES ('{table}', {row}.id, '{op}', datetime('now', 'localtime'));
+                END
+            ''')
+
+
+@migration(10, "Soft deletes for trucks and drivers, indexes for foreign key checks")
+def _soft_deletes(conn):
+    add_column(conn, 'trucks', 'deleted_at', 'TIMESTAMP')
+    add_column(conn, 'drivers', 'deleted_at', 'TIMESTAMP')
+
+    # Lists and combos only ever show live rows
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_trucks_live
+        ON trucks (depot_id, truck_number) WHERE deleted_at IS NULL
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_drivers_live
+        ON drivers (depot_id, name) WHERE deleted_at IS NULL
+    ''')
+
+    # Child-side indexes, so parent deletes and orphan checks never scan
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_delivery_templates_truck ON delivery_templates (truck_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_delivery_templates_driver ON delivery_templates (driver_id)')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_deliveries_template
+        ON deliveries (template_id) WHERE template_id IS NOT NULL
+    ''')
+
+
+# Columns whose changes start a new version in the history tables
+HISTORY_COLUMNS = {
+    'trucks': ('truck_number', 'model', 'capacity', 'status', 'depot_id', 'deleted_at'),
+    'drivers': ('name', 'license_number', 'phone', 'email', 'status', 'depot_id', 'deleted_at'),
+}
+
+
+@migration(11, "Temporal history of trucks and drivers")
+def _temporal_history(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS trucks_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            truck_id INTEGER NOT NULL,
+            truck_number TEXT,
+            model TEXT,
+            capacity REAL,
+            status TEXT,
+            depot_id INTEGER,
+            deleted_at TIMESTAMP,
+            valid_from TIMESTAMP NOT NULL,
+            valid_to TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS drivers_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            driver_id INTEGER NOT NULL,
+            name TEXT,
+            license_number TEXT,
+            phone TEXT,
+            email TEXT,
+            status TEXT,
+            depot_id INTEGER,
+            deleted_at TIMESTAMP,
+            valid_from TIMESTAMP NOT NULL,
+            valid_to TIMESTAMP
+        )
+    ''')
+
+    # History outlives hard-deleted rows, so it carries no foreign keys. An
+    # as-of lookup is one descent of this index whatever the history length.
+    for table, key in (('trucks', 'truck_id'), ('drivers', 'driver_id')):
+        columns = HISTORY_COLUMNS[table]
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f'NEW.{column}' for column in columns)
+        changed = ' OR '.join(f'NEW.{column} IS NOT OLD.{column}' for column in columns)
+
+        conn.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{table}_history_as_of
+            ON {table}_history ({key}, valid_from)
+        ''')
+
+        # Existing rows start their history with their current values, as
+        # nothing earlier is known
+        conn.execute(f'''
+            INSERT INTO {table}_history ({key}, {column_list}, valid_from)
+            SELECT id, {column_list}, '0001-01-01' FROM {table}
+            WHERE NOT EXISTS (SELECT 1 FROM {table}_history h WHERE h.{key} = {table}.id)
+        ''')
+
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_history_insert
+            AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO {table}_history ({key}, {column_list}, valid_from)
+                VALUES (NEW.id, {new_values}, datetime('now', 'localtime'));
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_history_update
+            AFTER UPDATE ON {table}
+            WHEN {changed}
+            BEGIN
+                UPDATE {table}_history SET valid_to = datetime('now', 'localtime')
+                WHERE {key} = OLD.id AND valid_to IS NULL;
+                INSERT INTO {table}_history ({key}, {column_list}, valid_from)
+                VALUES (NEW.id, {new_values}, datetime('now', 'localtime'));
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_history_delete
+            AFTER DELETE ON {table}
+            BEGIN
+                UPDATE {table}_history SET valid_to = datetime('now', 'localtime')
+                WHERE {key} = OLD.id AND valid_to IS NULL;
+            END
+        ''')
+
+
+@migration(12, "Attachment metadata for the content-addressed blob store")
+def _attachments(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attachments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            delivery_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            sha256 TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            filename TEXT,
+            content_type TEXT,
+            created_at TIMESTAMP NOT NULL,
+            FOREIGN KEY (delivery_id) REFERENCES deliveries (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_attachments_delivery
+        ON attachments (delivery_id, created_at)
+    ''')
+    # Reference checks when collecting unused blobs
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_attachments_sha256 ON attachments (sha256)')
+
+
+
+@migration(13, "Covering index for lane analytics and forecasts within a depot")
+def _depot_lane_analytics(conn):
+    # Same covering scan as idx_deliveries_date_lane, for one depot's date range
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_deliveries_depot_date_lane
+        ON deliveries (depot_id, scheduled_date, pickup_location_id, delivery_location_id, status, weight)
+    ''')
+
+
+@migration(14, "Truck numbers and license numbers unique among live rows only", rebuilds_tables=True)
+def _live_unique_keys(conn):
+    # Archived trucks and drivers keep their number, so it must be free to
+    # reuse; the table-level UNIQUE constraints can only go with a rebuild
+    for table, column, declaration in (('trucks', 'truck_number', 'truck_number TEXT'),
+                                       ('drivers', 'license_number', 'license_number TEXT')):
+        if has_unique_constraint(conn, table, column):
+            rebuild_table(conn, table, lambda sql: sql.replace(f'{declaration} UNIQUE', declaration, 1))
+        conn.execute(f'''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_{column}_live
+            ON {table} ({column}) WHERE deleted_at IS NULL
+        ''')
+
+
+def main(argv=None):
+    """Run pending migrations against a database file from the command line"""
+    argv = sys.argv[1:] if argv is None else argv
+    db_path = argv[0] if argv else 'truck_deliveries.db'
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute('PRAGMA journal_mode=WAL')
+        create_base_schema(conn)
+        applied = run_migrations(conn)
+        print(f"Schema version {get_schema_version(conn)} "
+              f"({len(applied)} migration(s) applied)")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
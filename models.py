@@ -0,0 +1,233 @@
+"""Typed row objects for trucks, drivers, deliveries and reports
+
+Rows are built directly from cursor tuples by a sqlite3 row_factory. Every
+class uses __slots__, so large result sets cost one small object per row
+instead of a tuple plus a dict.
+"""
+
+
+class Truck:
+    """A row of the trucks table"""
+    __slots__ = ('id', 'truck_number', 'model', 'capacity', 'status',
+                 'registration_date', 'last_maintenance')
+
+    def __init__(self, id, truck_number, model, capacity, status,
+                 registration_date, last_maintenance):
+        self.id = id
+        self.truck_number = truck_number
+        self.model = model
+        self.capacity = capacity
+        self.status = status
+        self.registration_date = registration_date
+        self.last_maintenance = last_maintenance
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        return cls(*row)
+
+    def list_values(self):
+        """Values for the truck list Treeview columns"""
+        return (self.id, self.truck_number, self.model, self.capacity,
+                self.status, self.registration_date or '')
+
+    def __repr__(self):
+        return f"Truck({self.id!r}, {self.truck_number!r})"
+
+
+class Driver:
+    """A row of the drivers table"""
+    __slots__ = ('id', 'name', 'license_number', 'phone', 'email', 'hire_date', 'status')
+
+    def __init__(self, id, name, license_number, phone, email, hire_date, status):
+        self.id = id
+        self.name = name
+        self.license_number = license_number
+        self.phone = phone
+        self.email = email
+        self.hire_date = hire_date
+        self.status = status
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        return cls(*row)
+
+    def list_values(self):
+        """Values for the driver list Treeview columns"""
+        return (self.id, self.name, self.license_number, self.phone or '',
+                self.email or '', self.status, self.hire_date or '')
+
+    def __repr__(self):
+        return f"Driver({self.id!r}, {self.name!r})"
+
+
+class Delivery:
+    """A row of the deliveries table with the assigned truck number and driver name"""
+    __slots__ = ('id', 'delivery_id', 'truck_id', 'driver_id', 'pickup_location',
+                 'delivery_location', 'cargo_description', 'weight', 'scheduled_date',
+                 'scheduled_time', 'status', 'created_date', 'completed_date',
+                 'duration_minutes', 'truck_number', 'driver_name')
+
+    def __init__(self, id, delivery_id, truck_id, driver_id, pickup_location,
+                 delivery_location, cargo_description, weight, scheduled_date,
+                 scheduled_time, status, created_date, completed_date,
+                 duration_minutes=None, truck_number=None, driver_name=None):
+        self.id = id
+        self.delivery_id = delivery_id
+        self.truck_id = truck_id
+        self.driver_id = driver_id
+        self.pickup_location = pickup_location
+        self.delivery_location = delivery_location
+        self.cargo_description = cargo_description
+        self.weight = weight
+        self.scheduled_date = scheduled_date
+        self.scheduled_time = scheduled_time
+        self.status = status
+        self.created_date = created_date
+        self.completed_date = completed_date
+        self.duration_minutes = duration_minutes
+        self.truck_number = truck_number
+        self.driver_name = driver_name
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        return cls(*row)
+
+    def list_values(self):
+        """Values for the delivery list Treeview columns"""
+        return (self.id, self.delivery_id, self.truck_number or '', self.driver_name or '',
+                self.pickup_location, self.delivery_location,
+                self.scheduled_date, self.scheduled_time, self.status)
+
+    def __repr__(self):
+        return f"Delivery({self.id!r}, {self.delivery_id!r})"
+
+
+class TruckVersion:
+    """A version of a truck from trucks_history, valid over [valid_from, valid_to)"""
+    __slots__ = ('truck_id', 'truck_number', 'model', 'capacity', 'status', 'depot_id',
+                 'deleted_at', 'valid_from', 'valid_to')
+
+    def __init__(self, truck_id, truck_number, model, capacity, status, depot_id,
+                 deleted_at, valid_from, valid_to):
+        self.truck_id = truck_id
+        self.truck_number = truck_number
+        self.model = model
+        self.capacity = capacity
+        self.status = status
+        self.depot_id = depot_id
+        self.deleted_at = deleted_at
+        self.valid_from = valid_from
+        self.valid_to = valid_to
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        return cls(*row)
+
+    def __repr__(self):
+        return f"TruckVersion({self.truck_id!r}, {self.truck_number!r}, {self.valid_from!r})"
+
+
+class DriverVersion:
+    """A version of a driver from drivers_history, valid over [valid_from, valid_to)"""
+    __slots__ = ('driver_id', 'name', 'license_number', 'phone', 'email', 'status', 'depot_id',
+                 'deleted_at', 'valid_from', 'valid_to')
+
+    def __init__(self, driver_id, name, license_number, phone, email, status, depot_id,
+                 deleted_at, valid_from, valid_to):
+        self.driver_id = driver_id
+        self.name = name
+        self.license_number = license_number
+        self.phone = phone
+        self.email = email
+        self.status = status
+        self.depot_id = depot_id
+        self.deleted_at = deleted_at
+        self.valid_from = valid_from
+        self.valid_to = valid_to
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        return cls(*row)
+
+    def __repr__(self):
+        return f"DriverVersion({self.driver_id!r}, {self.name!r}, {self.valid_from!r})"
+
+
+# Report rows
+
+class TruckUtilization:
+    """Per-truck delivery counts"""
+    __slots__ = ('truck_number', 'model', 'status', 'total', 'completed', 'active')
+
+    def __init__(self, truck_number, model, status, total, completed, active):
+        self.truck_number = truck_number
+        self.model = model
+        self.status = status
+        self.total = total
+        self.completed = completed
+        self.active = active
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        return cls(*row)
+
+
+class DriverPerformance:
+    """Per-driver delivery counts"""
+    __slots__ = ('name', 'license_number', 'status', 'total', 'completed', 'active')
+
+    def __init__(self, name, license_number, status, total, completed, active):
+        self.name = name
+        self.license_number = license_number
+        self.status = status
+        self.total = total
+        self.completed = completed
+        self.active = active
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        return cls(*row)
+
+
+class StatusSummary:
+    """Delivery count and average weight for one status"""
+    __slots__ = ('status', 'count', 'avg_weight')
+
+    def __init__(self, status, count, avg_weight):
+        self.status = status
+        self.count = count
+        self.avg_weight = avg_weight
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        return cls(*row)
+
+
+class DeliveryTotals:
+    """Overall delivery count and weight"""
+    __slots__ = ('total', 'total_weight', 'avg_weight')
+
+    def __init__(self, total, total_weight, avg_weight):
+        self.total = total
+        self.total_weight = total_weight
+        self.avg_weight = avg_weight
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        return cls(*row)
+
+
+class MonthlySummary:
+    """Delivery counts and weight for one month"""
+    __slots__ = ('month', 'total', 'completed', 'cancelled', 'total_weight')
+
+    def __init__(self, month, total, completed, cancelled, total_weight):
+        self.month = month
+        self.total = total
+        self.completed = completed
+        self.cancelled = cancelled
+        self.total_weight = total_weight
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        return cls(*row)
@@ -0,0 +1,192 @@
+"""Server-side sorting, filtering and paging for Treeview lists
+
+A PagedQuery owns the sort, filter and page state of one list view and turns
+it into a single SELECT with WHERE / ORDER BY / LIMIT pushed down to SQLite,
+so only one page of rows ever leaves the database.
+
+Pages are keyset pages: each page query selects the sort key of its rows
+and the next page starts after the last key seen, so page N costs the same
+as page 1 instead of scanning and discarding N pages with OFFSET. The start
+key of every visited page is kept for going back.
+"""
+
+PAGE_SIZE = 200
+
+# Upper bound used to turn a prefix filter into an index-friendly range
+_PREFIX_END = '\U0010ffff'
+
+
+class Column:
+    """How a Treeview column maps onto SQL
+
+    ``expr`` is the expression the column is filtered on, ``sort`` the
+    expression(s) it is ordered by (defaults to ``expr``). ``match`` is one of
+    'prefix' (case-sensitive text prefix, served by an index range scan),
+    'eq' (exact text) or 'number' (exact numeric).
+    """
+
+    def __init__(self, expr, sort=None, match='prefix'):
+        self.expr = expr
+        if sort is None:
+            sort = (expr,)
+        elif isinstance(sort, str):
+            sort = (sort,)
+        self.sort = tuple(sort)
+        self.match = match
+
+
+class PagedQuery:
+    """Sort, filter and page state for one Treeview"""
+
+    def __init__(self, base_sql, columns, default_sort, tiebreak, row_type=None,
+                 page_size=PAGE_SIZE):
+        self.base_sql = base_sql
+        self.columns = columns
+        self.row_type = row_type
+        self.tiebreak = tiebreak
+        self.page_size = page_size
+        self.sort_column, self.sort_desc = default_sort
+        self.filters = {}
+        self.fixed_conditions = []
+        self.page = 0
+        self.has_more = False
+        self._page_keys = [None]
+
+    def _restart(self):
+        """Go back to the first page after the sort or filters change"""
+        self.page = 0
+        self._page_keys = [None]
+
+    def add_condition(self, sql, *params):
+        """Add a condition that applies regardless of the user's filters"""
+        self.fixed_conditions.append((sql, params))
+        self._restart()
+
+    def toggle_sort(self, heading):
+        """Sort by a column, flipping the direction if it is already sorted"""
+        if heading == self.sort_column:
+            self.sort_desc = not self.sort_desc
+        else:
+            self.sort_column = heading
+            self.sort_desc = False
+        self._restart()
+
+    def set_filter(self, heading, value):
+        """Set or clear (with an empty value) the filter on a column"""
+        value = value.strip()
+        if value:
+            if self.columns[heading].match == 'number':
+                float(value)  # Raise ValueError early for bad input
+            self.filters[heading] = value
+        else:
+            self.filters.pop(heading, None)
+        self._restart()
+
+    def clear_filters(self):
+        """Remove all user filters"""
+        self.filters.clear()
+        self._restart()
+
+    def next_page(self):
+        if self.has_more and self.page + 1 < len(self._page_keys):
+            self.page += 1
+
+    def prev_page(self):
+        if self.page > 0:
+            self.page -= 1
+
+    def where_clause(self):
+        """Build the WHERE clause and its parameters"""
+        conditions = []
+        params = []
+
+        for sql, fixed_params in self.fixed_conditions:
+            conditions.append(sql)
+            params.extend(fixed_params)
+
+        for heading, value in self.filters.items():
+            column = self.columns[heading]
+            if column.match == 'prefix':
+                conditions.append(f'{column.expr} >= ? AND {column.expr} < ?')
+                params.extend((value, value + _PREFIX_END))
+            elif column.match == 'number':
+                conditions.append(f'{column.expr} = ?')
+                params.append(float(value))
+            else:
+                conditions.append(f'{column.expr} = ?')
+                params.append(value)
+
+        if not conditions:
+            return '', params
+        return 'WHERE ' + ' AND '.join(f'({c})' for c in conditions), params
+
+    def sort_terms(self):
+        """Expressions the rows are ordered by, ending in the unique tiebreak column"""
+        return self.columns[self.sort_column].sort + (self.tiebreak,)
+
+    def order_clause(self):
+        """Build the ORDER BY clause"""
+        direction = 'DESC' if self.sort_desc else 'ASC'
+        return 'ORDER BY ' + ', '.join(f'{expr} {direction}' for expr in self.sort_terms())
+
+    def _after_key(self, key):
+        """Condition for rows that sort after key, and its parameters
+
+        SQLite sorts NULLs first ascending and last descending, so a plain
+        row-value comparison would drop rows with NULL sort values.
+        """
+        def beyond(expr, value):
+            if self.sort_desc:
+                if value is None:
+                    return '0', []
+                return f'({expr} < ? OR {expr} IS NULL)', [value]
+            if value is None:
+                return f'{expr} IS NOT NULL', []
+            return f'{expr} > ?', [value]
+
+        terms = list(zip(self.sort_terms(), key))
+        condition, params = beyond(*terms[-1])
+        for expr, value in reversed(terms[:-1]):
+            step, step_params = beyond(expr, value)
+            condition = f'{step} OR ({expr} IS ? AND ({condition}))'
+            params = step_params + [value] + params
+
+        # A range on the leading term lets an index seek to the page start
+        expr, value = terms[0]
+        if not self.sort_desc and value is not None:
+            return f'{expr} >= ? AND ({condition})', [value] + params
+        if self.sort_desc and value is None:
+            return f'{expr} IS NULL AND ({condition})', params
+        return condition, params
+
+    def page_sql(self):
+        """SQL and parameters for the current page
+
+        The sort key columns are selected ahead of the row's own columns.
+        One extra row is fetched so callers can tell whether a next page
+        exists without running a COUNT over the whole table.
+        """
+        where, params = self.where_clause()
+        key = self._page_keys[self.page]
+        if key is not None:
+            condition, key_params = self._after_key(key)
+            where = f'{where} AND ({condition})' if where else f'WHERE {condition}'
+            params.extend(key_params)
+        keys = ', '.join(self.sort_terms())
+        select = self.base_sql.replace('SELECT', f'SELECT {keys},', 1)
+        sql = f'{select} {where} {self.order_clause()} LIMIT ?'
+        params.append(self.page_size + 1)
+        return sql, params
+
+    def fetch_page(self, conn):
+        """Run the current page's query and return its rows as row_type objects"""
+        width = len(self.sort_terms())
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        rows = cursor.execute(*self.page_sql()).fetchall()
+        self.has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.has_more:
+            del self._page_keys[self.page + 1:]
+            self._page_keys.append(tuple(rows[-1][:width]))
+        return [self.row_type.from_row(cursor, row[width:]) for row in rows]
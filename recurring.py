@@ -0,0 +1,264 @@
+"""Recurring delivery templates
+
+A template holds everything needed to schedule a regular run plus a rule
+saying on which days it runs. materialize() expands all active templates
+into deliveries rows for a horizon with a single executemany. Generated
+delivery IDs are derived from the template and date, so expanding the same
+day twice is a no-op; runs whose ID is already taken are reported as
+skipped. Deactivated templates stop being expanded, while deliveries they
+already generated stay. Write functions leave committing to the caller,
+which makes a whole expansion one transaction.
+
+Supported rules:
+    daily
+    weekdays
+    weekly:mon,wed,fri
+    monthly:1,15
+    cron "MIN HOUR DOM MON DOW" (e.g. "30 6 * * 1-5"); the minute and hour
+    fields, when fixed, set the scheduled time
+"""
+from datetime import date, timedelta
+
+from locations import LocationCache
+
+DEFAULT_HORIZON_DAYS = 14
+
+# Generated delivery IDs looked up per query when finding taken ones
+_LOOKUP_CHUNK = 500
+
+_WEEKDAYS = {'mon': 0, 'tue': 1, 'wed': 2, 'thu': 3, 'fri': 4, 'sat': 5, 'sun': 6}
+
+
+class Rule:
+    """A parsed recurrence rule"""
+    __slots__ = ('days_of_month', 'months', 'weekdays', 'dom_restricted', 'dow_restricted', 'time')
+
+    def __init__(self, days_of_month=None, months=None, weekdays=None, time=None):
+        self.days_of_month = days_of_month or set(range(1, 32))
+        self.months = months or set(range(1, 13))
+        self.weekdays = weekdays or set(range(7))
+        self.dom_restricted = days_of_month is not None
+        self.dow_restricted = weekdays is not None
+        self.time = time
+
+    def matches(self, day):
+        if day.month not in self.months:
+            return False
+        # As in cron, a rule restricting both fields matches either one
+        if self.dom_restricted and self.dow_restricted:
+            return day.day in self.days_of_month or day.weekday() in self.weekdays
+        return day.day in self.days_of_month and day.weekday() in self.weekdays
+
+
+def _cron_field(field, low, high):
+    """Parse one cron field into a set of values, or None for '*'"""
+    if field == '*':
+        return None
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/')
+            step = int(step)
+        if part == '*':
+            first, last = low, high
+        elif '-' in part:
+            first, last = (int(v) for v in part.split('-'))
+        else:
+            first = last = int(part)
+        if first < low or last > high or first > last or step < 1:
+            raise ValueError(f"Cron field out of range: {field}")
+        values.update(range(first, last + 1, step))
+    return values
+
+
+def parse_rule(rule):
+    """Parse a recurrence rule string, raising ValueError if it is invalid"""
+    text = rule.strip().lower()
+    if text == 'daily':
+        return Rule()
+    if text == 'weekdays':
+        return Rule(weekdays={0, 1, 2, 3, 4})
+    if text.startswith('weekly:'):
+        try:
+            return Rule(weekdays={_WEEKDAYS[d.strip()[:3]] for d in text[7:].split(',')})
+        except KeyError:
+            raise ValueError(f"Unknown weekday in rule: {rule}")
+    if text.startswith('monthly:'):
+        days = {int(d) for d in text[8:].split(',')}
+        if not all(1 <= d <= 31 for d in days):
+            raise ValueError(f"Day of month out of range in rule: {rule}")
+        return Rule(days_of_month=days)
+
+    fields = text.split()
+    if len(fields) != 5:
+        raise ValueError(f"Unrecognised recurrence rule: {rule}")
+    minutes = _cron_field(fields[0], 0, 59)
+    hours = _cron_field(fields[1], 0, 23)
+    days_of_month = _cron_field(fields[2], 1, 31)
+    months = _cron_field(fields[3], 1, 12)
+    # Cron counts Sunday as 0 (and 7); Python's weekday() counts Monday as 0
+    cron_weekdays = _cron_field(fields[4], 0, 7)
+    weekdays = None if cron_weekdays is None else {(d - 1) % 7 for d in cron_weekdays}
+
+    time = None
+    if minutes is not None and hours is not None and len(minutes) == 1 and len(hours) == 1:
+        time = f"{next(iter(hours)):02d}:{next(iter(minutes)):02d}"
+    return Rule(days_of_month, months, weekdays, time)
+
+
+class Template:
+    """A row of the delivery_templates table"""
+    __slots__ = ('id', 'name', 'rule', 'truck_id', 'driver_id', 'pickup_location', 'delivery_location',
+                 'scheduled_time', 'start_date', 'end_date', 'active', 'generated_through')
+
+    def __init__(self, id, name, rule, truck_id, driver_id, pickup_location, delivery_location,
+                 scheduled_time, start_date, end_date, active, generated_through):
+        self.id = id
+        self.name = name
+        self.rule = rule
+        self.truck_id = truck_id
+        self.driver_id = driver_id
+        self.pickup_location = pickup_location
+        self.delivery_location = delivery_location
+        self.scheduled_time = scheduled_time
+        self.start_date = start_date
+        self.end_date = end_date
+        self.active = active
+        self.generated_through = generated_through
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        return cls(*row)
+
+    def __repr__(self):
+        return f"Template({self.id!r}, {self.name!r}, {self.rule!r})"
+
+
+def generated_delivery_id(template_id, day):
+    """Deterministic delivery ID of a template's run on a given day"""
+    return f"TPL{template_id}-{day.strftime('%Y%m%d')}"
+
+
+def create_template(conn, name, rule, truck_id, driver_id, pickup_location, delivery_location,
+                    scheduled_time, start_date, cargo_description='', weight=0,
+                    duration_minutes=None, end_date=None):
+    """Store a new recurring delivery template and return its id"""
+    parse_rule(rule)
+    cursor = conn.execute('''
+        INSERT INTO delivery_templates (name, rule, truck_id, driver_id, pickup_location,
+            delivery_location, cargo_description, weight, scheduled_time, duration_minutes,
+            start_date, end_date, active, created_date)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?)
+    ''', (name, rule, truck_id, driver_id, pickup_location, delivery_location,
+          cargo_description, weight, scheduled_time, duration_minutes,
+          start_date, end_date, date.today()))
+    return cursor.lastrowid
+
+
+def list_templates(conn, depot_id=None, active_only=False):
+    """Templates, active ones first, optionally only those whose truck belongs to a depot"""
+    sql = '''
+        SELECT id, name, rule, truck_id, driver_id, pickup_location, delivery_location,
+               scheduled_time, start_date, end_date, active, generated_through
+        FROM delivery_templates WHERE 1
+    '''
+    params = []
+    if active_only:
+        sql += ' AND active = 1'
+    if depot_id is not None:
+        sql += ' AND truck_id IN (SELECT id FROM trucks WHERE depot_id = ?)'
+        params.append(depot_id)
+    cursor = conn.cursor()
+    cursor.row_factory = Template.from_row
+    return cursor.execute(sql + ' ORDER BY active DESC, name, id', params).fetchall()
+
+
+def deactivate_template(conn, template_id):
+    """Stop expanding a template; returns whether it was active"""
+    return conn.execute('UPDATE delivery_templates SET active = 0 WHERE id = ? AND active = 1',
+                        (template_id,)).rowcount > 0
+
+
+def _taken_delivery_ids(conn, delivery_ids):
+    """The given delivery IDs that already exist"""
+    taken = set()
+    for i in range(0, len(delivery_ids), _LOOKUP_CHUNK):
+        chunk = delivery_ids[i:i + _LOOKUP_CHUNK]
+        taken.update(row[0] for row in conn.execute(
+            f"SELECT delivery_id FROM deliveries WHERE delivery_id IN ({', '.join('?' * len(chunk))})", chunk))
+    return taken
+
+
+def _to_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def materialize(conn, start=None, horizon_days=DEFAULT_HORIZON_DAYS, locations=None, depot_id=None):
+    """Expand active templates into deliveries up to start + horizon_days
+
+    Each template resumes after the last day it was expanded through, and
+    runs whose generated delivery ID already exists are skipped. Generated
+    runs take their truck's depot and are not checked against maintenance or
+    driver hours. depot_id limits the expansion to templates whose truck
+    belongs to that depot. Returns (number of deliveries inserted, sorted
+    delivery IDs of the skipped runs).
+    """
+    start = start or date.today()
+    end = start + timedelta(days=horizon_days - 1)
+    days = [start + timedelta(days=i) for i in range(horizon_days)]
+    today = date.today()
+    locations = locations or LocationCache(conn)
+
+    depot = ' AND truck_id IN (SELECT id FROM trucks WHERE depot_id = ?)' if depot_id is not None else ''
+    templates = conn.execute(f'''
+        SELECT id, rule, truck_id, driver_id, pickup_location, delivery_location,
+               cargo_description, weight, scheduled_time, duration_minutes,
+               start_date, end_date, generated_through
+        FROM delivery_templates
+        WHERE active = 1 AND start_date <= ? AND (end_date IS NULL OR end_date >= ?)
+            AND (generated_through IS NULL OR generated_through < ?){depot}
+    ''', (end.isoformat(), start.isoformat(), end.isoformat(),
+          *([depot_id] if depot_id is not None else []))).fetchall()
+
+    rules = {}
+    rows = []
+    for (template_id, rule_text, truck_id, driver_id, pickup, destination, cargo, weight,
+         scheduled_time, duration, start_date, end_date, generated_through) in templates:
+        rule = rules.get(rule_text)
+        if rule is None:
+            rule = rules[rule_text] = parse_rule(rule_text)
+
+        first = max(start, _to_date(start_date))
+        if generated_through:
+            first = max(first, _to_date(generated_through) + timedelta(days=1))
+        last = min(end, _to_date(end_date)) if end_date else end
+        run_time = rule.time or scheduled_time
+        pickup_id = locations.resolve(pickup)
+        destination_id = locations.resolve(destination)
+
+        for day in days:
+            if day < first or day > last or not rule.matches(day):
+                continue
+            rows.append((generated_delivery_id(template_id, day), truck_id, driver_id, pickup,
+                         destination, cargo, weight, day.isoformat(), run_time, 'Scheduled',
+                         today, duration, template_id, pickup_id, destination_id, truck_id))
+
+    skipped = _taken_delivery_ids(conn, [row[0] for row in rows])
+    rows = [row for row in rows if row[0] not in skipped]
+    cursor = conn.executemany('''
+        INSERT INTO deliveries (delivery_id, truck_id, driver_id, pickup_location,
+            delivery_location, cargo_description, weight, scheduled_date, scheduled_time,
+            status, created_date, duration_minutes, template_id,
+            pickup_location_id, delivery_location_id, depot_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
+                (SELECT depot_id FROM trucks WHERE id = ?))
+    ''', rows)
+    inserted = cursor.rowcount
+
+    conn.executemany('''
+        UPDATE delivery_templates SET generated_through = ? WHERE id = ?
+    ''', [(end.isoformat(), template[0]) for template in templates])
+    return inserted, sorted(skipped)
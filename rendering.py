@@ -0,0 +1,302 @@
+"""Report rendering: one definition, paged plain text, HTML and CSV
+
+A report is a Document: a title and a list of sections. A Table section
+pairs Field definitions with an iterable of typed rows (the slotted row
+objects from models.py, or any object whose attributes the fields name);
+Facts is a short block of label/value lines and Text is free text. A
+Document may also be a section of another one, as in the report pack.
+
+Renderers are generators yielding one page of output at a time, PAGE_ROWS
+table rows per page. Rows are pulled from the iterable as each page is
+rendered, so a report over a cursor renders incrementally and holds one
+page in memory however long it is.
+
+Plain text columns are sized to their content rather than fixed: the first
+page sets the widths, later pages only widen them, and the heading is
+repeated whenever they do. Cells longer than a field's max_width are cut.
+Numbers are right-aligned. CSV cells carry the raw values, unformatted.
+
+    for page in rendering.render(document, 'html'):
+        output.write(page)
+"""
+import csv
+import html
+import io
+import os
+from itertools import islice
+
+PAGE_ROWS = 200
+MAX_WIDTH = 40
+COLUMN_GAP = '  '
+FORMATS = ('text', 'html', 'csv')
+
+# Export file extensions per format
+EXTENSIONS = {'.txt': 'text', '.html': 'html', '.htm': 'html', '.csv': 'csv'}
+
+
+class Field:
+    """One table column: its heading, where its value comes from and how it is shown
+
+    ``value`` is an attribute name or a function of the row. ``fmt`` is a
+    format spec applied to non-empty values in text and HTML; ``blank`` is
+    shown for None. ``align`` is 'left' or 'right'; by default numbers are
+    right-aligned.
+    """
+    __slots__ = ('title', 'value', 'fmt', 'align', 'max_width', 'blank')
+
+    def __init__(self, title, value, fmt='', align=None, max_width=MAX_WIDTH, blank=''):
+        self.title = title
+        self.value = value
+        self.fmt = fmt
+        self.align = align
+        self.max_width = max_width
+        self.blank = blank
+
+    def get(self, row):
+        return self.value(row) if callable(self.value) else getattr(row, self.value)
+
+    def text(self, value):
+        return self.blank if value is None else format(value, self.fmt)
+
+
+class Table:
+    """Rows rendered through a list of fields; rows may be any iterable, read once"""
+    __slots__ = ('title', 'fields', 'rows', 'empty')
+
+    def __init__(self, title, fields, rows, empty="No rows."):
+        self.title = title
+        self.fields = fields
+        self.rows = rows
+        self.empty = empty
+
+
+class Facts:
+    """Label/value lines, e.g. overall totals"""
+    __slots__ = ('title', 'items')
+
+    def __init__(self, title, items):
+        self.title = title
+        self.items = items
+
+
+class Text:
+    """A free-text paragraph"""
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+
+class Document:
+    """A titled report made of sections"""
+    __slots__ = ('title', 'sections')
+
+    def __init__(self, title, sections):
+        self.title = title
+        self.sections = sections
+
+
+def _pages(rows, page_rows):
+    rows = iter(rows)
+    while True:
+        page = list(islice(rows, page_rows))
+        if not page:
+            return
+        yield page
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _alignments(fields, values):
+    """Explicit alignments, else right for fields whose first non-empty value is a number"""
+    aligns = []
+    for i, field in enumerate(fields):
+        align = field.align
+        if align is None:
+            first = next((row[i] for row in values if row[i] is not None), None)
+            align = 'right' if _is_number(first) else 'left'
+        aligns.append(align)
+    return aligns
+
+
+def _clip(text, width):
+    return text if len(text) <= width else text[:max(width - 3, 1)] + '...'
+
+
+# Plain text
+
+def _text_line(cells, widths, aligns):
+    return COLUMN_GAP.join(cell.rjust(width) if align == 'right' else cell.ljust(width)
+                           for cell, width, align in zip(cells, widths, aligns)).rstrip() + '\n'
+
+
+def _rule(widths):
+    return '-' * (sum(widths) + len(COLUMN_GAP) * (len(widths) - 1)) + '\n'
+
+
+def _text_table(table, page_rows):
+    fields = table.fields
+    titles = [field.title for field in fields]
+    widths = [len(title) for title in titles]
+    aligns = None
+    heading = f"{table.title}:\n" if table.title else ''
+
+    for number, page in enumerate(_pages(table.rows, page_rows)):
+        values = [[field.get(row) for field in fields] for row in page]
+        if aligns is None:
+            aligns = _alignments(fields, values)
+        cells = [[_clip(field.text(value), field.max_width) for field, value in zip(fields, row)]
+                 for row in values]
+        grown = [max(width, *(len(row[i]) for row in cells)) for i, width in enumerate(widths)]
+
+        chunk = []
+        if number == 0 or grown != widths:
+            widths = grown
+            chunk.append(heading if number == 0 else '\n')
+            chunk.append(_text_line(titles, widths, aligns))
+            chunk.append(_rule(widths))
+        chunk.extend(_text_line(row, widths, aligns) for row in cells)
+        yield ''.join(chunk)
+
+    if aligns is None:
+        yield heading + _text_line(titles, widths, ['left'] * len(fields)) + _rule(widths) + table.empty + '\n'
+
+
+def _text_sections(sections, page_rows):
+    for index, section in enumerate(sections):
+        if index:
+            yield '\n'
+        if isinstance(section, Table):
+            yield from _text_table(section, page_rows)
+        elif isinstance(section, Facts):
+            lines = [f"{section.title}:\n"] if section.title else []
+            lines.extend(f"{label}: {value}\n" for label, value in section.items)
+            yield ''.join(lines)
+        elif isinstance(section, Text):
+            yield section.text.rstrip('\n') + '\n'
+        else:
+            yield from render_text(section, page_rows)
+
+
+def render_text(document, page_rows=PAGE_ROWS):
+    """Yield a document as plain text, a page at a time"""
+    yield f"{document.title}\n{'=' * max(len(document.title), 40)}\n\n"
+    yield from _text_sections(document.sections, page_rows)
+
+
+# HTML
+
+_STYLE = '''
+body { font-family: sans-serif; margin: 2em; }
+table { border-collapse: collapse; margin-bottom: 1.5em; }
+th, td { border: 1px solid #ccc; padding: 0.2em 0.6em; }
+th { background: #2c3e50; color: white; text-align: left; }
+td.num { text-align: right; }
+'''
+
+
+def _html_table(table, page_rows):
+    fields = table.fields
+    aligns = None
+    for page in _pages(table.rows, page_rows):
+        values = [[field.get(row) for field in fields] for row in page]
+        chunk = []
+        if aligns is None:
+            aligns = _alignments(fields, values)
+            if table.title:
+                chunk.append(f"<h3>{html.escape(table.title)}</h3>\n")
+            chunk.append('<table>\n<thead><tr>')
+            chunk.extend(f"<th>{html.escape(field.title)}</th>" for field in fields)
+            chunk.append('</tr></thead>\n<tbody>\n')
+        for row in values:
+            chunk.append('<tr>')
+            chunk.extend(f'<td class="num">{html.escape(field.text(value))}</td>' if align == 'right'
+                         else f"<td>{html.escape(field.text(value))}</td>"
+                         for field, value, align in zip(fields, row, aligns))
+            chunk.append('</tr>\n')
+        yield ''.join(chunk)
+
+    if aligns is None:
+        title = f"<h3>{html.escape(table.title)}</h3>\n" if table.title else ''
+        yield f"{title}<p>{html.escape(table.empty)}</p>\n"
+    else:
+        yield '</tbody>\n</table>\n'
+
+
+def _html_sections(sections, page_rows, level):
+    for section in sections:
+        if isinstance(section, Table):
+            yield from _html_table(section, page_rows)
+        elif isinstance(section, Facts):
+            title = f"<h3>{html.escape(section.title)}</h3>\n" if section.title else ''
+            rows = ''.join(f"<tr><th>{html.escape(label)}</th><td>{html.escape(str(value))}</td></tr>\n"
+                           for label, value in section.items)
+            yield f"{title}<table>\n{rows}</table>\n"
+        elif isinstance(section, Text):
+            yield f"<p>{html.escape(section.text.strip())}</p>\n"
+        else:
+            yield f"<h{level}>{html.escape(section.title)}</h{level}>\n"
+            yield from _html_sections(section.sections, page_rows, level + 1)
+
+
+def render_html(document, page_rows=PAGE_ROWS):
+    """Yield a document as a standalone HTML page, a page of rows at a time"""
+    title = html.escape(document.title)
+    yield (f"<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n<title>{title}</title>\n"
+           f"<style>{_STYLE}</style>\n</head>\n<body>\n<h1>{title}</h1>\n")
+    yield from _html_sections(document.sections, page_rows, 2)
+    yield '</body>\n</html>\n'
+
+
+# CSV
+
+def _csv_rows(document, page_rows):
+    """Yield lists of CSV records, one list per page"""
+    yield [[document.title]]
+    for section in document.sections:
+        if isinstance(section, Table):
+            header = [[], [section.title]] if section.title else [[]]
+            header.append([field.title for field in section.fields])
+            yield header
+            for page in _pages(section.rows, page_rows):
+                yield [['' if value is None else value for value in (field.get(row) for field in section.fields)]
+                       for row in page]
+        elif isinstance(section, Facts):
+            yield [[]] + ([[section.title]] if section.title else []) + [list(item) for item in section.items]
+        elif isinstance(section, Text):
+            yield [[], [section.text.strip()]]
+        else:
+            yield [[]]
+            yield from _csv_rows(section, page_rows)
+
+
+def render_csv(document, page_rows=PAGE_ROWS):
+    """Yield a document as CSV text, a page at a time; write it to files opened with newline=''"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for records in _csv_rows(document, page_rows):
+        writer.writerows(records)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+RENDERERS = {'text': render_text, 'html': render_html, 'csv': render_csv}
+
+
+def render(document, fmt='text', page_rows=PAGE_ROWS):
+    """Yield a document in one of FORMATS, a page at a time"""
+    return RENDERERS[fmt](document, page_rows)
+
+
+def write(document, output, fmt='text', page_rows=PAGE_ROWS):
+    """Stream a rendered document to a text file object"""
+    for page in render(document, fmt, page_rows):
+        output.write(page)
+
+
+def format_for(path):
+    """The format matching a file name's extension, text when unknown"""
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'text')
@@ -0,0 +1,446 @@
+"""Fleet reports built from mergeable partial aggregates
+
+Each report is one grouped query over a slice of deliveries that yields
+additive partials per key: counts, sums, and non-null counts for
+averages. Partials of several slices are merged by adding them, and
+averages are only derived from the merged sum and count at the end, so a
+report split into date shards matches the single-query result.
+
+The GUI runs each report as one slice on its own connection. run_pack()
+runs every report's date shards on a process pool, each worker with a
+read-only connection, and is also available from the command line:
+
+    python reports.py truck_deliveries.db --month 2024-05 --workers 8
+    python reports.py truck_deliveries.db --output pack.html
+    python reports.py truck_deliveries.db --depot NORTH
+
+The *_document() functions describe each report's layout once, for the
+text, HTML and CSV renderers in rendering.py.
+"""
+import argparse
+import logging
+import os
+import sys
+import sqlite3
+import time
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+import rendering
+import repository
+from depots import DepotRouter
+from rendering import Document, Table, Facts, Text, Field
+from models import TruckUtilization, DriverPerformance, StatusSummary, DeliveryTotals, MonthlySummary
+
+logger = logging.getLogger(__name__)
+
+SHARDS_PER_WORKER = 2
+
+
+class Report:
+    """A report as a partial-aggregate query plus a finishing step
+
+    ``sql`` selects the group key followed by additive columns and has a
+    ``{where}`` placeholder for the slice condition. ``finish(conn, totals,
+    as_of, depot_id)`` turns the merged {key: [values]} into the report's
+    rows, with the depot's live trucks and drivers described as of the given
+    time (current when None; every depot when depot_id is None).
+    """
+
+    def __init__(self, name, title, sql, finish, monthly=False):
+        self.name = name
+        self.title = title
+        self.sql = sql
+        self.finish = finish
+        self.monthly = monthly
+
+
+REPORTS = {}
+
+
+def report(name, title, sql, monthly=False):
+    """Register the decorated function as the finishing step of a report"""
+    def register(finish):
+        REPORTS[name] = Report(name, title, sql, finish, monthly)
+        return finish
+    return register
+
+
+def _finish_counts(conn, totals, sql, params, row_type, sort_key):
+    rows = [row_type(*info, *totals.get(key, (0, 0, 0)))
+            for key, *info in conn.execute(sql, params)]
+    rows.sort(key=sort_key)
+    return rows
+
+
+def _labels(table, key, columns, version_at, as_of, depot_id=None):
+    """Label query over a depot's live rows of a table, current or as of a point in time"""
+    if as_of is None:
+        sql = f"SELECT id, {', '.join(columns)} FROM {table} WHERE deleted_at IS NULL"
+        if depot_id is None:
+            return sql, ()
+        return sql + ' AND depot_id = ?', (depot_id,)
+
+    # Rows without a version at as_of fall back to their current values
+    def version(column):
+        return f'CASE WHEN h.id IS NULL THEN x.{column} ELSE h.{column} END'
+
+    versioned = ', '.join(f'COALESCE(h.{column}, x.{column})' for column in columns)
+    sql = f'''
+        SELECT x.id, {versioned} FROM {table} x
+        LEFT JOIN {table}_history h ON h.id = ({version_at.format(**{key: 'x.id'}, at='?')})
+        WHERE {version('deleted_at')} IS NULL
+    '''
+    params = (repository.as_of_key(as_of),)
+    if depot_id is None:
+        return sql, params
+    return sql + f" AND {version('depot_id')} = ?", params + (depot_id,)
+
+
+@report('truck_utilization', "TRUCK UTILIZATION REPORT", '''
+    SELECT truck_id, COUNT(*), SUM(status = 'Completed'), SUM(status = 'In Progress')
+    FROM deliveries WHERE truck_id IS NOT NULL AND {where}
+    GROUP BY truck_id
+''')
+def _truck_utilization(conn, totals, as_of=None, depot_id=None):
+    sql, params = _labels('trucks', 'truck_id', ('truck_number', 'model', 'status'),
+                          repository.TRUCK_VERSION_AT, as_of, depot_id)
+    return _finish_counts(conn, totals, sql, params, TruckUtilization, lambda row: -row.total)
+
+
+@report('driver_performance', "DRIVER PERFORMANCE REPORT", '''
+    SELECT driver_id, COUNT(*), SUM(status = 'Completed'), SUM(status = 'In Progress')
+    FROM deliveries WHERE driver_id IS NOT NULL AND {where}
+    GROUP BY driver_id
+''')
+def _driver_performance(conn, totals, as_of=None, depot_id=None):
+    sql, params = _labels('drivers', 'driver_id', ('name', 'license_number', 'status'),
+                          repository.DRIVER_VERSION_AT, as_of, depot_id)
+    return _finish_counts(conn, totals, sql, params, DriverPerformance, lambda row: -row.completed)
+
+
+@report('delivery_summary', "DELIVERY SUMMARY REPORT", '''
+    SELECT status, COUNT(*), COALESCE(SUM(weight), 0), COUNT(weight)
+    FROM deliveries WHERE {where}
+    GROUP BY status
+''')
+def _delivery_summary(conn, totals, as_of=None, depot_id=None):
+    """Returns (StatusSummary rows, DeliveryTotals)"""
+    statuses = [StatusSummary(status, count, weight / weighed if weighed else None)
+                for status, (count, weight, weighed) in totals.items()]
+    statuses.sort(key=lambda row: -row.count)
+    count = sum(values[0] for values in totals.values())
+    weight = sum(values[1] for values in totals.values())
+    weighed = sum(values[2] for values in totals.values())
+    return statuses, DeliveryTotals(count, weight if weighed else None,
+                                    weight / weighed if weighed else None)
+
+
+@report('monthly', "MONTHLY REPORT", '''
+    SELECT strftime('%Y-%m', scheduled_date), COUNT(*), SUM(status = 'Completed'),
+           SUM(status = 'Cancelled'), COALESCE(SUM(weight), 0)
+    FROM deliveries WHERE {where}
+    GROUP BY 1
+''', monthly=True)
+def _monthly(conn, totals, as_of=None, depot_id=None):
+    """Returns a MonthlySummary per month, oldest first"""
+    return [MonthlySummary(month, *values) for month, values in sorted(totals.items())]
+
+
+# Partial aggregates
+
+def partial(conn, name, where='1', params=()):
+    """Partial aggregates {key: [values]} of one report over one slice"""
+    return {key: list(values)
+            for key, *values in conn.execute(REPORTS[name].sql.format(where=where), params)}
+
+
+def merge(partials):
+    """Add up partial aggregates of the same report"""
+    merged = {}
+    for part in partials:
+        for key, values in part.items():
+            total = merged.get(key)
+            if total is None:
+                merged[key] = [value or 0 for value in values]
+            else:
+                for i, value in enumerate(values):
+                    total[i] += value or 0
+    return merged
+
+
+def month_range(month):
+    """(first day, first day of next month) of a 'YYYY-MM' month"""
+    first = datetime.strptime(month, '%Y-%m').date()
+    following = (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return first, following
+
+
+def _range_condition(start, end, depot_id=None):
+    conditions, params = [], []
+    if depot_id is not None:
+        conditions.append('depot_id = ?')
+        params.append(depot_id)
+    if start is not None:
+        conditions.append('scheduled_date >= ?')
+        params.append(str(start))
+    if end is not None:
+        conditions.append('scheduled_date < ?')
+        params.append(str(end))
+    return ' AND '.join(conditions) or '1', tuple(params)
+
+
+def run_report(conn, name, start=None, end=None, as_of=None, depot_id=None):
+    """Run one report over [start, end) of a depot (all depots when None) as a single slice"""
+    where, params = _range_condition(start, end, depot_id)
+    return REPORTS[name].finish(conn, partial(conn, name, where, params), as_of, depot_id)
+
+
+def truck_utilization(conn, as_of=None, depot_id=None):
+    return run_report(conn, 'truck_utilization', as_of=as_of, depot_id=depot_id)
+
+
+def driver_performance(conn, as_of=None, depot_id=None):
+    return run_report(conn, 'driver_performance', as_of=as_of, depot_id=depot_id)
+
+
+def delivery_summary(conn, depot_id=None):
+    return run_report(conn, 'delivery_summary', depot_id=depot_id)
+
+
+def monthly_summary(conn, month, depot_id=None):
+    """MonthlySummary of a 'YYYY-MM' month, or None without deliveries"""
+    rows = run_report(conn, 'monthly', *month_range(month), depot_id=depot_id)
+    return rows[0] if rows else None
+
+
+def date_shards(conn, count, start=None, end=None):
+    """Split [start, end) into up to count date slices as (where, params)
+
+    A missing bound is taken from the dates present and the outer slice is
+    left open on that side; without either bound one more slice picks up
+    deliveries without a scheduled date, so the slices cover every row.
+    """
+    open_start, open_end = start is None, end is None
+    shards = [('scheduled_date IS NULL', ())] if open_start and open_end else []
+    if open_start or open_end:
+        low, high = conn.execute('SELECT MIN(scheduled_date), MAX(scheduled_date) FROM deliveries').fetchone()
+        if low is None:
+            return shards or [_range_condition(start, end)]
+        start = start or low[:10]
+        end = end or date.fromisoformat(high[:10]) + timedelta(days=1)
+
+    start, end = date.fromisoformat(str(start)), date.fromisoformat(str(end))
+    days = (end - start).days
+    if days <= 0:
+        return shards + [_range_condition(start, end)]
+    count = max(1, min(count, days))
+    bounds = [start + timedelta(days=days * i // count) for i in range(count + 1)]
+    if open_start:
+        bounds[0] = None
+    if open_end:
+        bounds[-1] = None
+    return shards + [_range_condition(low, high) for low, high in zip(bounds, bounds[1:])]
+
+
+# Parallel runner
+
+def read_only(db_path):
+    """Open a database file read-only"""
+    return sqlite3.connect(f"file:{urllib.parse.quote(os.path.abspath(db_path))}?mode=ro", uri=True)
+
+
+def _run_shard(db_path, name, where, params):
+    conn = read_only(db_path)
+    try:
+        return name, partial(conn, name, where, params)
+    finally:
+        conn.close()
+
+
+def run_pack(db_path, names=None, start=None, end=None, month=None, workers=None, shards=None,
+             as_of=None, depot_id=None):
+    """Run several reports in parallel and return {name: finished result}
+
+    Reports cover [start, end) (everything by default), except the monthly
+    report, which covers month (the current one by default). Every report
+    is split into date shards, all of which are spread over one process pool.
+    Trucks and drivers are described as of as_of (currently by default).
+    depot_id limits every report to one depot.
+    """
+    names = list(REPORTS) if names is None else names
+    workers = workers or os.cpu_count() or 1
+    shards = shards or workers * SHARDS_PER_WORKER
+    month = month or date.today().strftime('%Y-%m')
+
+    conn = read_only(db_path)
+    try:
+        tasks = []
+        for name in names:
+            bounds = month_range(month) if REPORTS[name].monthly else (start, end)
+            for where, params in date_shards(conn, shards, *bounds):
+                if depot_id is not None:
+                    where, params = f'depot_id = ? AND ({where})', (depot_id, *params)
+                tasks.append((name, where, params))
+
+        partials = {name: [] for name in names}
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_run_shard, db_path, *task) for task in tasks]
+            for future in futures:
+                name, part = future.result()
+                partials[name].append(part)
+
+        return {name: REPORTS[name].finish(conn, merge(partials[name]), as_of, depot_id) for name in names}
+    finally:
+        conn.close()
+
+
+# Report documents
+
+TRUCK_UTILIZATION_FIELDS = [
+    Field('Truck Number', 'truck_number'),
+    Field('Model', 'model'),
+    Field('Status', 'status'),
+    Field('Total', 'total'),
+    Field('Completed', 'completed'),
+    Field('Active', 'active'),
+]
+
+DRIVER_PERFORMANCE_FIELDS = [
+    Field('Driver Name', 'name'),
+    Field('License', 'license_number'),
+    Field('Status', 'status'),
+    Field('Total', 'total'),
+    Field('Completed', 'completed'),
+    Field('Active', 'active'),
+]
+
+STATUS_SUMMARY_FIELDS = [
+    Field('Status', 'status'),
+    Field('Count', 'count'),
+    Field('Avg Weight', lambda row: row.avg_weight or 0, '.2f'),
+]
+
+DELIVERY_LISTING_FIELDS = [
+    Field('Delivery ID', 'delivery_id'),
+    Field('Date', lambda row: str(row.scheduled_date)[:10] if row.scheduled_date else None),
+    Field('Time', 'scheduled_time'),
+    Field('Truck', 'truck_number', blank='-'),
+    Field('Driver', 'driver_name', blank='-'),
+    Field('Pickup', 'pickup_location', max_width=30),
+    Field('Destination', 'delivery_location', max_width=30),
+    Field('Weight (t)', 'weight', '.1f'),
+    Field('Status', 'status'),
+]
+
+
+def _as_of_title(title, subject, as_of):
+    return f"{title} - {subject} AS OF {as_of}" if as_of else title
+
+
+def truck_utilization_document(rows, as_of=None):
+    return Document(_as_of_title("TRUCK UTILIZATION REPORT", "TRUCKS", as_of),
+                    [Table(None, TRUCK_UTILIZATION_FIELDS, rows, "No trucks found.")])
+
+
+def driver_performance_document(rows, as_of=None):
+    return Document(_as_of_title("DRIVER PERFORMANCE REPORT", "DRIVERS", as_of),
+                    [Table(None, DRIVER_PERFORMANCE_FIELDS, rows, "No drivers found.")])
+
+
+def delivery_summary_document(result):
+    status_results, summary = result
+    return Document("DELIVERY SUMMARY REPORT", [
+        Facts("OVERALL STATISTICS", [
+            ("Total Deliveries", summary.total),
+            ("Total Weight", f"{summary.total_weight or 0:.2f} tons"),
+            ("Average Weight", f"{summary.avg_weight or 0:.2f} tons"),
+        ]),
+        Table("STATUS BREAKDOWN", STATUS_SUMMARY_FIELDS, status_results, "No deliveries found."),
+    ])
+
+
+def monthly_document(month, monthly_data):
+    if not monthly_data:
+        return Document(f"MONTHLY REPORT - {month}", [Text("No deliveries found for this month.")])
+    return Document(f"MONTHLY REPORT - {month}", [Facts(None, [
+        ("Total Deliveries", monthly_data.total),
+        ("Completed", monthly_data.completed),
+        ("Cancelled", monthly_data.cancelled),
+        ("In Progress", monthly_data.total - monthly_data.completed - monthly_data.cancelled),
+        ("Total Weight", f"{monthly_data.total_weight or 0:.2f} tons"),
+        ("Completion Rate", f"{monthly_data.completed / monthly_data.total * 100:.1f}%"),
+    ])])
+
+
+def pack_document(results, month, as_of=None):
+    """The results of run_pack() as one document"""
+    sections = []
+    for name, result in results.items():
+        if name == 'truck_utilization':
+            sections.append(truck_utilization_document(result, as_of))
+        elif name == 'driver_performance':
+            sections.append(driver_performance_document(result, as_of))
+        elif name == 'delivery_summary':
+            sections.append(delivery_summary_document(result))
+        elif name == 'monthly':
+            sections.append(monthly_document(month, result[0] if result else None))
+    return Document("FLEET REPORT PACK", sections)
+
+
+def delivery_listing_document(conn, start, end, depot_id=None):
+    """Every delivery scheduled from start to end inclusive, streamed from one cursor"""
+    rows = repository.iter_deliveries_as_scheduled(conn, start, end + timedelta(days=1), depot_id)
+    return Document(f"DELIVERY LISTING - {start.isoformat()} to {end.isoformat()}",
+                    [Table(None, DELIVERY_LISTING_FIELDS, rows, "No deliveries scheduled in this date range.")])
+
+
+def main(argv=None):
+    """Produce the full report pack for a database file from the command line"""
+    parser = argparse.ArgumentParser(description="Generate the fleet report pack")
+    parser.add_argument('db_path', nargs='?', default='truck_deliveries.db')
+    parser.add_argument('--month', help="month of the monthly report, YYYY-MM (default: current)")
+    parser.add_argument('--from', dest='start', help="first scheduled date, YYYY-MM-DD")
+    parser.add_argument('--to', dest='end', help="last scheduled date, YYYY-MM-DD")
+    parser.add_argument('--workers', type=int, help="worker processes (default: CPU count)")
+    parser.add_argument('--shards', type=int, help="date shards per report")
+    parser.add_argument('--as-of', help="describe trucks and drivers as of YYYY-MM-DD[ HH:MM] "
+                                        "(default: the --to date, else now)")
+    parser.add_argument('--format', choices=rendering.FORMATS, help="output format "
+                        "(default: from the --output extension, else text)")
+    parser.add_argument('--output', help="write the pack to this file instead of stdout")
+    parser.add_argument('--depot', help="code of the depot to report on (default: the whole file)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    month = args.month or date.today().strftime('%Y-%m')
+    end = date.fromisoformat(args.end) + timedelta(days=1) if args.end else None
+    as_of = args.as_of or (date.fromisoformat(args.end) if args.end else None)
+    db_path, depot_id = args.db_path, None
+    if args.depot:
+        router = DepotRouter(args.db_path)
+        try:
+            depot = router.depot(args.depot)
+            db_path, depot_id = router.database_path(depot), depot.id
+            router.connection(depot.id)
+        except KeyError as e:
+            raise SystemExit(str(e))
+        finally:
+            router.close()
+
+    started = time.perf_counter()
+    results = run_pack(db_path, start=args.start, end=end, month=month,
+                       workers=args.workers, shards=args.shards, as_of=as_of, depot_id=depot_id)
+    logger.info("Report pack generated in %.2fs", time.perf_counter() - started)
+
+    document = pack_document(results, month, as_of)
+    if args.output:
+        with open(args.output, 'w', newline='', encoding='utf-8') as output:
+            rendering.write(document, output, args.format or rendering.format_for(args.output))
+    else:
+        rendering.write(document, sys.stdout, args.format or 'text')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Typed queries over the truck deliveries database
+
+Functions taking ``at`` answer as of that point in time from the trucks and
+drivers history tables. A datetime or 'YYYY-MM-DD HH:MM[:SS]' string is
+taken as is; a plain date means the end of that day.
+"""
+from datetime import date, datetime
+
+from models import Truck, Driver, Delivery, TruckVersion, DriverVersion
+
+TRUCK_SELECT = '''
+    SELECT id, truck_number, model, capacity, status, registration_date, last_maintenance
+    FROM trucks
+'''
+
+DRIVER_SELECT = '''
+    SELECT id, name, license_number, phone, email, hire_date, status
+    FROM drivers
+'''
+
+DELIVERY_SELECT = '''
+    SELECT d.id, d.delivery_id, d.truck_id, d.driver_id, d.pickup_location,
+           d.delivery_location, d.cargo_description, d.weight, d.scheduled_date,
+           d.scheduled_time, d.status, d.created_date, d.completed_date,
+           d.duration_minutes, t.truck_number, dr.name
+    FROM deliveries d
+    LEFT JOIN trucks t ON d.truck_id = t.id
+    LEFT JOIN drivers dr ON d.driver_id = dr.id
+'''
+
+TRUCK_VERSION_SELECT = '''
+    SELECT truck_id, truck_number, model, capacity, status, depot_id, deleted_at,
+           valid_from, valid_to
+    FROM trucks_history
+'''
+
+DRIVER_VERSION_SELECT = '''
+    SELECT driver_id, name, license_number, phone, email, status, depot_id, deleted_at,
+           valid_from, valid_to
+    FROM drivers_history
+'''
+
+# The newest version starting at or before a point in time; each lookup is
+# one descent of the (id, valid_from) history index
+TRUCK_VERSION_AT = '''
+    SELECT h.id FROM trucks_history h
+    WHERE h.truck_id = {truck_id} AND h.valid_from <= {at}
+    ORDER BY h.valid_from DESC, h.id DESC LIMIT 1
+'''
+
+DRIVER_VERSION_AT = '''
+    SELECT h.id FROM drivers_history h
+    WHERE h.driver_id = {driver_id} AND h.valid_from <= {at}
+    ORDER BY h.valid_from DESC, h.id DESC LIMIT 1
+'''
+
+# Deliveries with the truck number and driver name in force at their scheduled time
+_SCHEDULED_AT = "d.scheduled_date || ' ' || COALESCE(d.scheduled_time, '23:59') || ':59'"
+
+DELIVERY_AS_SCHEDULED_SELECT = f'''
+    SELECT d.id, d.delivery_id, d.truck_id, d.driver_id, d.pickup_location,
+           d.delivery_location, d.cargo_description, d.weight, d.scheduled_date,
+           d.scheduled_time, d.status, d.created_date, d.completed_date,
+           d.duration_minutes, th.truck_number, dh.name
+    FROM deliveries d
+    LEFT JOIN trucks_history th
+        ON th.id = ({TRUCK_VERSION_AT.format(truck_id='d.truck_id', at=_SCHEDULED_AT)})
+    LEFT JOIN drivers_history dh
+        ON dh.id = ({DRIVER_VERSION_AT.format(driver_id='d.driver_id', at=_SCHEDULED_AT)})
+'''
+
+
+def as_of_key(at):
+    """Comparable timestamp text for a point in time"""
+    if isinstance(at, datetime):
+        return at.strftime('%Y-%m-%d %H:%M:%S.%f')
+    if isinstance(at, date) or len(str(at)) == 10:
+        return f"{str(at)[:10]} 23:59:59.999999"
+    return str(at)
+
+
+def query(conn, row_type, sql, params=()):
+    """Execute a query on a fresh cursor that yields row_type objects"""
+    cursor = conn.cursor()
+    cursor.row_factory = row_type.from_row
+    return cursor.execute(sql, params)
+
+
+def get_truck(conn, truck_id):
+    return query(conn, Truck, TRUCK_SELECT + ' WHERE id = ?', (truck_id,)).fetchone()
+
+
+def get_driver(conn, driver_id):
+    return query(conn, Driver, DRIVER_SELECT + ' WHERE id = ?', (driver_id,)).fetchone()
+
+
+def get_delivery(conn, delivery_db_id):
+    return query(conn, Delivery, DELIVERY_SELECT + ' WHERE d.id = ?', (delivery_db_id,)).fetchone()
+
+
+def find_delivery(conn, search_term, depot_id=None):
+    """Find the first delivery whose delivery ID contains the search term"""
+    sql = DELIVERY_SELECT + ' WHERE d.delivery_id LIKE ?'
+    params = [f'%{search_term}%']
+    if depot_id is not None:
+        sql += ' AND d.depot_id = ?'
+        params.append(depot_id)
+    return query(conn, Delivery, sql, params).fetchone()
+
+
+def iter_deliveries(conn, status=None, limit=None, depot_id=None):
+    """Iterate deliveries, newest scheduled first, optionally by status and depot"""
+    sql = DELIVERY_SELECT + ' WHERE 1'
+    params = []
+    if status is not None:
+        sql += ' AND d.status = ?'
+        params.append(status)
+    if depot_id is not None:
+        sql += ' AND d.depot_id = ?'
+        params.append(depot_id)
+    sql += ' ORDER BY d.scheduled_date DESC, d.scheduled_time DESC'
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    return query(conn, Delivery, sql, params)
+
+
+def truck_as_of(conn, truck_id, at):
+    """TruckVersion in force at a point in time, or None before the truck existed"""
+    return query(conn, TruckVersion, TRUCK_VERSION_SELECT + ' WHERE id = (' +
+                 TRUCK_VERSION_AT.format(truck_id='?', at='?') + ')',
+                 (truck_id, as_of_key(at))).fetchone()
+
+
+def driver_as_of(conn, driver_id, at):
+    """DriverVersion in force at a point in time, or None before the driver existed"""
+    return query(conn, DriverVersion, DRIVER_VERSION_SELECT + ' WHERE id = (' +
+                 DRIVER_VERSION_AT.format(driver_id='?', at='?') + ')',
+                 (driver_id, as_of_key(at))).fetchone()
+
+
+def truck_history(conn, truck_id):
+    """All versions of a truck, oldest first"""
+    return query(conn, TruckVersion, TRUCK_VERSION_SELECT + ' WHERE truck_id = ? ORDER BY valid_from, id',
+                 (truck_id,)).fetchall()
+
+
+def driver_history(conn, driver_id):
+    """All versions of a driver, oldest first"""
+    return query(conn, DriverVersion, DRIVER_VERSION_SELECT + ' WHERE driver_id = ? ORDER BY valid_from, id',
+                 (driver_id,)).fetchall()
+
+
+def iter_deliveries_as_scheduled(conn, start=None, end=None, depot_id=None):
+    """Deliveries scheduled in [start, end) with truck and driver as they were then"""
+    sql = DELIVERY_AS_SCHEDULED_SELECT + ' WHERE 1'
+    params = []
+    if depot_id is not None:
+        sql += ' AND d.depot_id = ?'
+        params.append(depot_id)
+    if start is not None:
+        sql += ' AND d.scheduled_date >= ?'
+        params.append(str(start))
+    if end is not None:
+        sql += ' AND d.scheduled_date < ?'
+        params.append(str(end))
+    sql += ' ORDER BY d.scheduled_date, d.scheduled_time'
+    return query(conn, Delivery, sql, params)
@@ -0,0 +1,295 @@
+"""Late-delivery detection against configurable SLA deadlines
+
+A delivery still 'Scheduled' is late once its scheduled start plus a
+start grace has passed; one 'In Progress' is late once its start plus
+duration plus a completion grace has passed. SlaPolicy holds the graces.
+
+SlaMonitor keeps a min-heap of (deadline, delivery) for active
+deliveries. It loads them a day window at a time from the (status,
+scheduled_date, scheduled_time) index, starting with any backlog, and
+only looks ahead as far as needed. Deliveries that are added, moved or
+finished by any connection are picked up from the change data capture
+feed, so nothing ever rescans the table. poll() pops the deadlines that
+have passed, confirms each against the current row with one primary-key
+lookup, and returns an SlaAlert per newly late delivery. Alerts raised are
+remembered until their delivery finishes or is rescheduled, even when the
+monitor has to reload after the feed was compacted past its cursor.
+
+late_report() counts overdue and late-completed deliveries per truck and
+driver.
+
+    python sla.py truck_deliveries.db            # late deliveries per truck and driver
+    python sla.py truck_deliveries.db --watch    # print alerts as deadlines pass
+"""
+import argparse
+import heapq
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import cdc
+import repository
+from driver_hours import DEFAULT_DELIVERY_MINUTES
+
+ACTIVE_STATUSES = ('Scheduled', 'In Progress')
+START_GRACE_MINUTES = 15
+COMPLETION_GRACE_MINUTES = 30
+LOOKAHEAD = timedelta(hours=24)
+WATCH_INTERVAL_SECONDS = 30
+
+_ROW_SQL = '''
+    SELECT id, scheduled_date, scheduled_time, status, duration_minutes, depot_id
+    FROM deliveries
+'''
+
+
+class SlaPolicy:
+    """Grace periods that turn a schedule into a deadline"""
+    __slots__ = ('start_grace_minutes', 'completion_grace_minutes', 'default_duration')
+
+    def __init__(self, start_grace_minutes=START_GRACE_MINUTES,
+                 completion_grace_minutes=COMPLETION_GRACE_MINUTES,
+                 default_duration=DEFAULT_DELIVERY_MINUTES):
+        self.start_grace_minutes = start_grace_minutes
+        self.completion_grace_minutes = completion_grace_minutes
+        self.default_duration = default_duration
+
+    def deadline(self, scheduled_date, scheduled_time, status, duration=None):
+        """When a delivery in this status becomes late, or None if it cannot"""
+        if status not in ACTIVE_STATUSES or not scheduled_date:
+            return None
+        try:
+            start = datetime.strptime(f"{str(scheduled_date)[:10]} {scheduled_time or '00:00'}",
+                                      '%Y-%m-%d %H:%M')
+        except ValueError:
+            return None
+        if status == 'Scheduled':
+            return start + timedelta(minutes=self.start_grace_minutes)
+        return start + timedelta(minutes=(duration or self.default_duration) + self.completion_grace_minutes)
+
+    def late_condition(self):
+        """SQL condition, taking a :now parameter, that is true for late active deliveries"""
+        return f'''
+            status IN ('Scheduled', 'In Progress') AND scheduled_date <= date(:now)
+            AND datetime(scheduled_date || ' ' || COALESCE(scheduled_time, '00:00'), '+' || CASE status
+                WHEN 'Scheduled' THEN {int(self.start_grace_minutes)}
+                ELSE COALESCE(duration_minutes, {int(self.default_duration)}) + {int(self.completion_grace_minutes)}
+            END || ' minutes') <= :now
+        '''
+
+
+class SlaAlert:
+    """A delivery that has just missed its deadline"""
+    __slots__ = ('delivery', 'deadline', 'detected_at')
+
+    def __init__(self, delivery, deadline, detected_at):
+        self.delivery = delivery
+        self.deadline = deadline
+        self.detected_at = detected_at
+
+    @property
+    def minutes_late(self):
+        return int((self.detected_at - self.deadline).total_seconds() // 60)
+
+    def __str__(self):
+        delivery = self.delivery
+        return (f"{delivery.delivery_id} {delivery.status.lower()} {self.minutes_late} min past "
+                f"{self.deadline:%Y-%m-%d %H:%M} (truck {delivery.truck_number or '-'}, "
+                f"driver {delivery.driver_name or '-'})")
+
+
+class SlaMonitor:
+    """Min-heap of upcoming deadlines, fed by day windows and the change feed"""
+
+    def __init__(self, conn, policy=None, depot_id=None, lookahead=LOOKAHEAD):
+        self.conn = conn
+        self.policy = policy or SlaPolicy()
+        self.depot_id = depot_id
+        self.lookahead = lookahead
+        self._alerted = {}
+        self.reload()
+
+    def reload(self):
+        """Start over from the backlog, keeping the alerts that still stand"""
+        self._heap = []
+        self._loaded_until = None
+        self._cursor = cdc.head(self.conn)
+        for delivery_db_id in list(self._alerted):
+            self._forget_alert(delivery_db_id, self.conn.execute(_ROW_SQL + ' WHERE id = ?',
+                                                                 (delivery_db_id,)).fetchone())
+
+    def _forget_alert(self, delivery_db_id, row):
+        """Drop the alert of a delivery that is gone, finished or has a new deadline"""
+        if delivery_db_id in self._alerted and (
+                row is None or self.policy.deadline(*row[1:5]) != self._alerted[delivery_db_id]):
+            del self._alerted[delivery_db_id]
+
+    @property
+    def pending(self):
+        """Deadlines waiting in the heap"""
+        return len(self._heap)
+
+    def _push(self, row):
+        delivery_db_id, scheduled_date, scheduled_time, status, duration, depot_id = row
+        if self.depot_id is not None and depot_id != self.depot_id:
+            return
+        deadline = self.policy.deadline(scheduled_date, scheduled_time, status, duration)
+        if deadline is not None:
+            heapq.heappush(self._heap, (deadline, delivery_db_id))
+
+    def _load(self, until):
+        """Load active deliveries scheduled before until, after what is loaded already"""
+        until = until.isoformat()
+        for status in ACTIVE_STATUSES:
+            sql = _ROW_SQL + ' WHERE status = ? AND scheduled_date < ?'
+            params = [status, until]
+            if self._loaded_until is not None:
+                sql += ' AND scheduled_date >= ?'
+                params.append(self._loaded_until)
+            for row in self.conn.execute(sql, params):
+                self._push(row)
+        self._loaded_until = until
+
+    def _follow_changes(self):
+        """Queue deliveries changed since the last poll that fall in the loaded window"""
+        changed = set()
+        try:
+            for batch in cdc.changes_after(self.conn, self._cursor, tables=('deliveries',)):
+                changed.update(change.row_id for change in batch)
+                self._cursor = batch[-1].seq
+        except cdc.CursorExpired:
+            self.reload()
+            return
+        for delivery_db_id in changed:
+            row = self.conn.execute(_ROW_SQL + ' WHERE id = ?', (delivery_db_id,)).fetchone()
+            self._forget_alert(delivery_db_id, row)
+            if row and str(row[1])[:10] < self._loaded_until:
+                self._push(row)
+
+    def poll(self, now=None):
+        """Return an SlaAlert for every delivery that became late by now"""
+        now = now or datetime.now()
+        horizon = (now + self.lookahead).date() + timedelta(days=1)
+        if self._loaded_until is not None:
+            self._follow_changes()
+        if self._loaded_until is None or horizon.isoformat() > self._loaded_until:
+            self._load(horizon)
+
+        alerts = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, delivery_db_id = heapq.heappop(self._heap)
+            row = self.conn.execute(_ROW_SQL + ' WHERE id = ?', (delivery_db_id,)).fetchone()
+            if row is None:
+                continue
+            # Entries go stale when a delivery is moved or moves on; the
+            # change feed has queued its current deadline if it has one
+            if self.policy.deadline(*row[1:5]) != deadline or self._alerted.get(delivery_db_id) == deadline:
+                continue
+            self._alerted[delivery_db_id] = deadline
+            alerts.append(SlaAlert(repository.get_delivery(self.conn, delivery_db_id), deadline, now))
+        return alerts
+
+
+class LateStats:
+    """Late deliveries of one truck or driver"""
+    __slots__ = ('key', 'label', 'overdue', 'completed_late', 'completed')
+
+    def __init__(self, key, label, overdue=0, completed_late=0, completed=0):
+        self.key = key
+        self.label = label
+        self.overdue = overdue
+        self.completed_late = completed_late
+        self.completed = completed
+
+    @property
+    def late_rate(self):
+        """Share of completed deliveries that were completed after their scheduled day"""
+        return self.completed_late / self.completed if self.completed else 0.0
+
+
+def late_report(conn, policy=None, now=None, start=None, end=None, depot_id=None):
+    """Late deliveries per truck and per driver as (by_truck, by_driver)
+
+    overdue counts active deliveries past their deadline at now;
+    completed_late counts deliveries scheduled in [start, end) that were
+    completed on a later day. Both lists are ordered worst first.
+    """
+    policy = policy or SlaPolicy()
+    now = now or datetime.now()
+    depot = ' AND depot_id = :depot' if depot_id is not None else ''
+    dates = ''
+    if start is not None:
+        dates += ' AND scheduled_date >= :start'
+    if end is not None:
+        dates += ' AND scheduled_date < :end'
+    params = {'now': now.strftime('%Y-%m-%d %H:%M:%S'), 'depot': depot_id,
+              'start': str(start) if start else None, 'end': str(end) if end else None}
+
+    # Both halves walk the (status, scheduled_date) index
+    rows = conn.execute(f'''
+        SELECT truck_id, driver_id, COUNT(*), 0, 0 FROM deliveries
+        WHERE {policy.late_condition()}{depot}
+        GROUP BY truck_id, driver_id
+        UNION ALL
+        SELECT truck_id, driver_id, 0, SUM(completed_date > scheduled_date), COUNT(*) FROM deliveries
+        WHERE status = 'Completed'{dates}{depot}
+        GROUP BY truck_id, driver_id
+    ''', params)
+
+    by_truck, by_driver = {}, {}
+    for truck_id, driver_id, overdue, completed_late, completed in rows:
+        for stats, key in ((by_truck, truck_id), (by_driver, driver_id)):
+            entry = stats.get(key)
+            if entry is None:
+                entry = stats[key] = LateStats(key, None)
+            entry.overdue += overdue
+            entry.completed_late += completed_late or 0
+            entry.completed += completed
+
+    labels = (('trucks', 'truck_number', by_truck), ('drivers', 'name', by_driver))
+    for table, column, stats in labels:
+        for key, label in conn.execute(f'SELECT id, {column} FROM {table}'):
+            if key in stats:
+                stats[key].label = label
+
+    def worst_first(stats):
+        rows = [entry for entry in stats.values() if entry.overdue or entry.completed_late]
+        rows.sort(key=lambda entry: (-entry.overdue, -entry.completed_late, str(entry.label)))
+        return rows
+
+    return worst_first(by_truck), worst_first(by_driver)
+
+
+def main(argv=None):
+    """Print late deliveries per truck and driver, or watch for new alerts"""
+    parser = argparse.ArgumentParser(description="Detect late deliveries")
+    parser.add_argument('db_path')
+    parser.add_argument('--start-grace', type=int, default=START_GRACE_MINUTES,
+                        help="minutes a scheduled delivery may start late")
+    parser.add_argument('--completion-grace', type=int, default=COMPLETION_GRACE_MINUTES,
+                        help="minutes an in-progress delivery may run over")
+    parser.add_argument('--watch', action='store_true', help="keep polling and print alerts")
+    parser.add_argument('--interval', type=float, default=WATCH_INTERVAL_SECONDS)
+    args = parser.parse_args(argv)
+
+    policy = SlaPolicy(args.start_grace, args.completion_grace)
+    conn = sqlite3.connect(args.db_path)
+    try:
+        if args.watch:
+            monitor = SlaMonitor(conn, policy)
+            while True:
+                for alert in monitor.poll():
+                    print(f"{alert.detected_at:%Y-%m-%d %H:%M:%S}  LATE  {alert}", flush=True)
+                time.sleep(args.interval)
+        by_truck, by_driver = late_report(conn, policy)
+        for title, rows in (("TRUCK", by_truck), ("DRIVER", by_driver)):
+            print(f"{title:<24} {'Overdue':>8} {'Late done':>10} {'Late %':>7}")
+            for row in rows:
+                print(f"{str(row.label or '-')[:24]:<24} {row.overdue:>8} {row.completed_late:>10} {row.late_rate * 100:>6.1f}%")
+            print()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Driver hours checks for assignments made as a set"""
+import sqlite3
+import unittest
+from datetime import date
+
+from driver_hours import AvailabilityIndex
+from migrations import create_base_schema, run_migrations
+
+DAY = date(2026, 3, 2)
+
+
+class DriverHoursTestCase(unittest.TestCase):
+    """An in-memory database with two drivers and no deliveries"""
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        create_base_schema(self.conn)
+        run_migrations(self.conn, progress=None)
+        self.conn.executemany('INSERT INTO drivers (id, name, license_number, depot_id) VALUES (?, ?, ?, 1)',
+                              [(1, 'First', 'L-1'), (2, 'Second', 'L-2')])
+        self.index = AvailabilityIndex(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def add_delivery(self, db_id, driver_id, day, time, minutes):
+        self.conn.execute('''
+            INSERT INTO deliveries (id, delivery_id, driver_id, pickup_location, delivery_location,
+                                    scheduled_date, scheduled_time, duration_minutes, depot_id)
+            VALUES (?, ?, ?, 'A', 'B', ?, ?, ?, 1)
+        ''', (db_id, f'DEL-{db_id}', driver_id, day.isoformat(), time, minutes))
+
+
+class CheckPlanTest(DriverHoursTestCase):
+
+    def test_overlapping_deliveries_to_one_driver(self):
+        self.add_delivery(1, 2, DAY, '09:00', 120)
+        self.add_delivery(2, 2, DAY, '10:00', 120)
+        # Each fits driver 1's empty day on its own
+        self.assertEqual(self.index.check_assignment(1, DAY, '10:00', 120, exclude_delivery=2), [])
+        problems = self.index.check_plan([(1, 1, DAY, '09:00', 120), (2, 1, DAY, '10:00', 120)])
+        self.assertEqual(problems, [(2, "driver already has a delivery at that time")])
+
+    def test_combined_daily_total(self):
+        for db_id, time in enumerate(('06:00', '10:00', '14:00'), start=1):
+            self.add_delivery(db_id, 2, DAY, time, 240)
+        problems = self.index.check_plan([(db_id, 1, DAY, time, 240)
+                                          for db_id, time in enumerate(('06:00', '10:00', '14:00'), start=1)])
+        self.assertEqual([db_id for db_id, problem in problems], [3])
+        self.assertIn("daily limit", problems[0][1])
+
+    def test_moves_do_not_block_each_other(self):
+        # Shifting both a day later moves the first into the slot the second leaves
+        self.add_delivery(1, 1, DAY, '09:00', 120)
+        self.add_delivery(2, 1, date(2026, 3, 3), '09:00', 120)
+        plan = [(1, 1, date(2026, 3, 3), '09:00', 120), (2, 1, date(2026, 3, 4), '09:00', 120)]
+        self.assertEqual(self.index.check_plan(plan), [])
+        # The index itself is left as it was
+        self.assertEqual(self.index.on_duty_minutes(1, DAY), 120)
+
+
+class MidnightTest(DriverHoursTestCase):
+
+    def test_overnight_delivery_meets_next_morning(self):
+        self.add_delivery(1, 1, date(2026, 3, 3), '00:30', 120)
+        self.assertEqual(self.index.check_assignment(1, DAY, '23:00', 240),
+                         ["driver already has a delivery at that time"])
+        self.assertEqual(self.index.free_drivers(DAY, '23:00', 240), [2])
+        # Ending before the next morning's delivery starts is fine
+        self.assertEqual(self.index.check_assignment(1, DAY, '23:00', 90), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
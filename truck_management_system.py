@@ -1,78 +1,144 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox, simpledialog, filedialog
 import sqlite3
-from datetime import datetime, date
+import sys
+from datetime import datetime, date, timedelta
 import re
+import json
+import logging
+import time
+
+from depots import DepotRouter, CATALOG_PATH, fleet_summary
+from paging import Column, PagedQuery
+from models import Truck, Driver, Delivery
+import repository
+import maintenance
+from driver_hours import AvailabilityIndex, DEFAULT_DELIVERY_MINUTES
+import recurring
+from locations import LocationCache
+import analytics
+import forecasting
+import reports
+import rendering
+from rendering import Document, Table, Field, Text
+from unit_of_work import UnitOfWork
+import bulk
+import integrity
+from kpis import KpiStore, delivery_facts
+import sla
+import attachments
+
+logger = logging.getLogger(__name__)
+
+# List view queries; WHERE / ORDER BY / LIMIT are appended by PagedQuery
+TRUCK_LIST_SQL = repository.TRUCK_SELECT
+TRUCK_LIST_COLUMNS = {
+    'ID': Column('id', match='number'),
+    'Truck Number': Column('truck_number'),
+    'Model': Column('model'),
+    'Capacity': Column('capacity', match='number'),
+    'Status': Column('status', match='eq'),
+    'Registration Date': Column('registration_date'),
+}
+
+DRIVER_LIST_SQL = repository.DRIVER_SELECT
+DRIVER_LIST_COLUMNS = {
+    'ID': Column('id', match='number'),
+    'Name': Column('name'),
+    'License Number': Column('license_number'),
+    'Phone': Column('phone'),
+    'Email': Column('email'),
+    'Status': Column('status', match='eq'),
+    'Hire Date': Column('hire_date'),
+}
+
+DELIVERY_LIST_SQL = repository.DELIVERY_SELECT
+DELIVERY_LIST_COLUMNS = {
+    'ID': Column('d.id', match='number'),
+    'Delivery ID': Column('d.delivery_id'),
+    # Truck and driver sort by the names shown, not by the foreign key ids
+    'Truck': Column('t.truck_number', sort=('t.truck_number', 'd.scheduled_date', 'd.scheduled_time')),
+    'Driver': Column('dr.name', sort=('dr.name', 'd.scheduled_date', 'd.scheduled_time')),
+    'Pickup': Column('d.pickup_location'),
+    'Delivery': Column('d.delivery_location'),
+    'Date': Column('d.scheduled_date', sort=('d.scheduled_date', 'd.scheduled_time')),
+    'Time': Column('d.scheduled_time'),
+    'Status': Column('d.status', sort=('d.status', 'd.scheduled_date', 'd.scheduled_time'), match='eq'),
+}
+
+# Details pane streaming: rows formatted per event loop tick, and rows
+# rendered before the user has to ask for more
+DETAILS_CHUNK_ROWS = 50
+DETAILS_ROW_CAP = 500
+
+# Group-commit window for writes in milliseconds; 0 commits every write at once
+GROUP_COMMIT_MS = 0
+
+# Dashboard refresh interval in milliseconds; figures come from memory
+DASHBOARD_REFRESH_MS = 1000
+
+# How often passed SLA deadlines are checked, and how many alerts are kept
+SLA_POLL_MS = 15000
+SLA_ALERTS_KEPT = 500
+
+# Attachment previews: thumbnail edge in pixels, and rendered images kept in memory
+THUMBNAIL_SIZE = attachments.THUMBNAIL_SIZE
+THUMBNAILS_KEPT = 64
 
 class TruckDeliverySystem:
-    def __init__(self, root):
+    def __init__(self, root, depot_code=None):
+        self.startup_started = time.perf_counter()
+        self.startup_time = None
+        self.depot_code = depot_code
         self.root = root
-        self.root.title("Truck Deliveries Management System")
         self.root.geometry("1200x800")
         self.root.configure(bg='#f0f0f0')
         
         # Initialize database
         self.init_database()
+        self.root.title(f"Truck Deliveries Management System - {self.depot.name}")
         
-        # Create main interface
+        # Create main interface; tab contents are built on first selection
         self.create_main_interface()
         
-        # Load initial data
-        self.refresh_all_data()
+        # Measure time to first paint once the event loop is idle
+        self.root.after_idle(self.record_startup_time)
+        
+        # Watch for late deliveries once the window is up
+        self.root.after(SLA_POLL_MS, self.poll_sla)
     
     def init_database(self):
-        """Initialize SQLite database with required tables"""
-        self.conn = sqlite3.connect('truck_deliveries.db')
+        """Open the selected depot's database, creating and migrating it as needed"""
+        # The catalog database lists depots; a depot may live in its own file
+        self.router = DepotRouter(CATALOG_PATH)
+        self.depot = self.router.depot(self.depot_code)
+        self.conn = self.router.connection(self.depot.id)
         self.cursor = self.conn.cursor()
         
-        # Create trucks table
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS trucks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                truck_number TEXT UNIQUE NOT NULL,
-                model TEXT NOT NULL,
-                capacity REAL NOT NULL,
-                status TEXT DEFAULT 'Available',
-                registration_date DATE,
-                last_maintenance DATE
-            )
-        ''')
-        
-        # Create drivers table
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS drivers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                license_number TEXT UNIQUE NOT NULL,
-                phone TEXT,
-                email TEXT,
-                hire_date DATE,
-                status TEXT DEFAULT 'Available'
-            )
-        ''')
-        
-        # Create deliveries table
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS deliveries (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                delivery_id TEXT UNIQUE NOT NULL,
-                truck_id INTEGER,
-                driver_id INTEGER,
-                pickup_location TEXT NOT NULL,
-                delivery_location TEXT NOT NULL,
-                cargo_description TEXT,
-                weight REAL,
-                scheduled_date DATE,
-                scheduled_time TEXT,
-                status TEXT DEFAULT 'Scheduled',
-                created_date DATE,
-                completed_date DATE,
-                FOREIGN KEY (truck_id) REFERENCES trucks (id),
-                FOREIGN KEY (driver_id) REFERENCES drivers (id)
-            )
-        ''')
-        
-        self.conn.commit()
+        # All writes go through explicit, optionally group-committed transactions
+        self.uow = UnitOfWork(self.conn, GROUP_COMMIT_MS, self.root.after)
+        
+        # Driver on-duty time, loaded per day on demand
+        self.driver_hours = AvailabilityIndex(self.conn, depot_id=self.depot.id)
+        
+        # Normalized location lookup for pickup/delivery addresses
+        self.locations = LocationCache(self.conn)
+        self.uow.on_rollback(self.locations.invalidate)
+        
+        # Dashboard figures, seeded once and then kept current by the write paths
+        self.kpis = KpiStore(self.conn, self.depot.id)
+        self.kpis.seed()
+        self.uow.on_rollback(self.kpis.invalidate)
+        
+        # Deadlines of active deliveries; alerts are kept for the tracking tab
+        self.sla_monitor = sla.SlaMonitor(self.conn, depot_id=self.depot.id)
+        self.sla_alerts = []
+        
+        # Proof-of-delivery files live in a blob store next to the depot's database
+        self.attachment_store = attachments.store_for(self.router.database_path(self.depot))
+        self.attachment_delivery = None
+        self.delivery_attachments = []
+        self.thumbnails = {}
     
     def create_main_interface(self):
         """Create the main user interface"""
@@ -85,22 +151,119 @@ class TruckDeliverySystem:
                               font=('Arial', 18, 'bold'), fg='white', bg='#2c3e50')
         title_label.pack(expand=True)
         
+        # Status bar
+        self.status_var = tk.StringVar(value="Loading...")
+        status_label = tk.Label(self.root, textvariable=self.status_var, anchor='w',
+                                bg='#dfe6e9', font=('Arial', 9))
+        status_label.pack(side='bottom', fill='x')
+        
         # Create notebook for tabs
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill='both', expand=True, padx=10, pady=5)
         
-        # Create tabs
-        self.create_truck_management_tab()
-        self.create_driver_management_tab()
-        self.create_delivery_scheduling_tab()
-        self.create_delivery_tracking_tab()
-        self.create_reports_tab()
+        # Register tabs; widgets and data are only created on first selection
+        self.tabs = {}
+        self.built_tabs = set()
+        self.page_labels = {}
+        self.tree_rows = {}
+        self.add_lazy_tab('dashboard', "📈 Dashboard", self.create_dashboard_tab, self.refresh_dashboard)
+        self.add_lazy_tab('trucks', "🚚 Truck Management",
+                          self.create_truck_management_tab, self.refresh_truck_data)
+        self.add_lazy_tab('drivers', "👨‍💼 Driver Management",
+                          self.create_driver_management_tab, self.refresh_driver_data)
+        self.add_lazy_tab('deliveries', "📅 Delivery Scheduling",
+                          self.create_delivery_scheduling_tab, self.load_delivery_scheduling_data)
+        self.add_lazy_tab('tracking', "📍 Delivery Tracking",
+                          self.create_delivery_tracking_tab, self.refresh_delivery_tracking)
+        self.add_lazy_tab('reports', "📊 Reports", self.create_reports_tab, None)
+        
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+        self.root.after_idle(self.on_tab_changed)
     
-    def create_truck_management_tab(self):
-        """Create truck management interface"""
-        truck_frame = ttk.Frame(self.notebook)
-        self.notebook.add(truck_frame, text="🚚 Truck Management")
+    def add_lazy_tab(self, name, text, builder, loader):
+        """Add an empty notebook tab whose contents are built on first use"""
+        frame = ttk.Frame(self.notebook)
+        self.notebook.add(frame, text=text)
+        self.tabs[str(frame)] = (name, frame, builder, loader)
+    
+    def on_tab_changed(self, event=None):
+        """Build the selected tab's widgets and load its data on first selection"""
+        selected = self.notebook.select()
+        if selected not in self.tabs:
+            return
+        
+        name, frame, builder, loader = self.tabs[selected]
+        if name in self.built_tabs:
+            return
         
+        builder(frame)
+        self.built_tabs.add(name)
+        
+        # Let the empty widgets paint before running the data queries
+        if loader:
+            self.root.after_idle(loader)
+    
+    def tab_built(self, name):
+        """Check whether a lazily created tab has been built yet"""
+        return name in self.built_tabs
+    
+    def record_startup_time(self):
+        """Record the time from construction to first paint"""
+        if self.startup_time is not None:
+            return
+        self.root.update_idletasks()
+        self.startup_time = time.perf_counter() - self.startup_started
+        logger.info("Startup to first paint: %.3fs", self.startup_time)
+        self.status_var.set(f"Ready (started in {self.startup_time * 1000:.0f} ms)")
+    
+    def create_dashboard_tab(self, dashboard_frame):
+        """Create the live dispatch dashboard"""
+        self.kpi_vars = {}
+        
+        today_frame = ttk.LabelFrame(dashboard_frame, text="Today's Deliveries", padding=10)
+        today_frame.pack(fill='x', padx=10, pady=5)
+        for column, status in enumerate(('Scheduled', 'In Progress', 'Completed', 'Cancelled')):
+            self.add_kpi(today_frame, status, status, column)
+        
+        transit_frame = ttk.LabelFrame(dashboard_frame, text="In Transit", padding=10)
+        transit_frame.pack(fill='x', padx=10, pady=5)
+        self.add_kpi(transit_frame, 'in_transit', "Deliveries", 0)
+        self.add_kpi(transit_frame, 'tonnage', "Tonnage", 1)
+        
+        trucks_frame = ttk.LabelFrame(dashboard_frame, text="Trucks by Status", padding=10)
+        trucks_frame.pack(fill='x', padx=10, pady=5)
+        for column, status in enumerate(('Available', 'In Transit', 'Maintenance', 'Out of Service')):
+            self.add_kpi(trucks_frame, f'trucks:{status}', status, column)
+        
+        self.dashboard_updated_label = ttk.Label(dashboard_frame, text="")
+        self.dashboard_updated_label.pack(anchor='w', padx=10, pady=5)
+        ttk.Button(dashboard_frame, text="Resync", command=self.kpis.invalidate).pack(anchor='w', padx=10)
+    
+    def add_kpi(self, parent, key, caption, column):
+        """Add a captioned figure to a dashboard frame"""
+        self.kpi_vars[key] = tk.StringVar(value="0")
+        tk.Label(parent, textvariable=self.kpi_vars[key], font=('Arial', 24, 'bold')).grid(row=0, column=column, padx=25)
+        ttk.Label(parent, text=caption).grid(row=1, column=column, padx=25)
+    
+    def refresh_dashboard(self):
+        """Show the in-memory KPIs, then schedule the next refresh"""
+        try:
+            self.kpis.refresh()
+            for status, count in self.kpis.today.items():
+                if status in self.kpi_vars:
+                    self.kpi_vars[status].set(str(count))
+            self.kpi_vars['in_transit'].set(str(self.kpis.in_transit))
+            self.kpi_vars['tonnage'].set(f"{self.kpis.tonnage_in_transit:.1f} t")
+            for key, var in self.kpi_vars.items():
+                if key.startswith('trucks:'):
+                    var.set(str(self.kpis.trucks.get(key[len('trucks:'):], 0)))
+            self.dashboard_updated_label.config(text=f"Updated {datetime.now():%H:%M:%S}")
+        except Exception as e:
+            logger.warning("Dashboard refresh failed: %s", e)
+        self.root.after(DASHBOARD_REFRESH_MS, self.refresh_dashboard)
+    
+    def create_truck_management_tab(self, truck_frame):
+        """Create truck management interface"""
         # Control panel
         control_frame = ttk.LabelFrame(truck_frame, text="Truck Controls", padding=10)
         control_frame.pack(fill='x', padx=10, pady=5)
@@ -138,6 +301,9 @@ class TruckDeliverySystem:
         ttk.Button(button_frame, text="Update Truck", command=self.update_truck).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Delete Truck", command=self.delete_truck).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Clear Fields", command=self.clear_truck_fields).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Record Maintenance", command=self.record_truck_maintenance).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Reassign Deliveries", command=self.reassign_truck_deliveries).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="History", command=self.show_truck_history).pack(side='left', padx=5)
         
         # Truck list
         list_frame = ttk.LabelFrame(truck_frame, text="Truck List", padding=10)
@@ -148,9 +314,16 @@ class TruckDeliverySystem:
         self.truck_tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=15)
         
         for col in columns:
-            self.truck_tree.heading(col, text=col)
             self.truck_tree.column(col, width=120)
         
+        # Sorting, filtering and paging happen in SQL
+        self.truck_query = PagedQuery(TRUCK_LIST_SQL, TRUCK_LIST_COLUMNS,
+                                      default_sort=('Truck Number', False), tiebreak='id',
+                                      row_type=Truck)
+        self.truck_query.add_condition('depot_id = ?', self.depot.id)
+        self.truck_query.add_condition('deleted_at IS NULL')
+        self.add_tree_controls(list_frame, self.truck_tree, self.truck_query, self.refresh_truck_data)
+        
         # Scrollbar
         truck_scrollbar = ttk.Scrollbar(list_frame, orient='vertical', command=self.truck_tree.yview)
         self.truck_tree.configure(yscrollcommand=truck_scrollbar.set)
@@ -161,11 +334,8 @@ class TruckDeliverySystem:
         # Bind selection event
         self.truck_tree.bind('<<TreeviewSelect>>', self.on_truck_select)
     
-    def create_driver_management_tab(self):
+    def create_driver_management_tab(self, driver_frame):
         """Create driver management interface"""
-        driver_frame = ttk.Frame(self.notebook)
-        self.notebook.add(driver_frame, text="👨‍💼 Driver Management")
-        
         # Control panel
         control_frame = ttk.LabelFrame(driver_frame, text="Driver Controls", padding=10)
         control_frame.pack(fill='x', padx=10, pady=5)
@@ -208,6 +378,7 @@ class TruckDeliverySystem:
         ttk.Button(button_frame, text="Update Driver", command=self.update_driver).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Delete Driver", command=self.delete_driver).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Clear Fields", command=self.clear_driver_fields).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="History", command=self.show_driver_history).pack(side='left', padx=5)
         
         # Driver list
         list_frame = ttk.LabelFrame(driver_frame, text="Driver List", padding=10)
@@ -218,9 +389,16 @@ class TruckDeliverySystem:
         self.driver_tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=15)
         
         for col in columns:
-            self.driver_tree.heading(col, text=col)
             self.driver_tree.column(col, width=120)
         
+        # Sorting, filtering and paging happen in SQL
+        self.driver_query = PagedQuery(DRIVER_LIST_SQL, DRIVER_LIST_COLUMNS,
+                                       default_sort=('Name', False), tiebreak='id',
+                                       row_type=Driver)
+        self.driver_query.add_condition('depot_id = ?', self.depot.id)
+        self.driver_query.add_condition('deleted_at IS NULL')
+        self.add_tree_controls(list_frame, self.driver_tree, self.driver_query, self.refresh_driver_data)
+        
         # Scrollbar
         driver_scrollbar = ttk.Scrollbar(list_frame, orient='vertical', command=self.driver_tree.yview)
         self.driver_tree.configure(yscrollcommand=driver_scrollbar.set)
@@ -231,11 +409,8 @@ class TruckDeliverySystem:
         # Bind selection event
         self.driver_tree.bind('<<TreeviewSelect>>', self.on_driver_select)
     
-    def create_delivery_scheduling_tab(self):
+    def create_delivery_scheduling_tab(self, delivery_frame):
         """Create delivery scheduling interface"""
-        delivery_frame = ttk.Frame(self.notebook)
-        self.notebook.add(delivery_frame, text="📅 Delivery Scheduling")
-        
         # Control panel
         control_frame = ttk.LabelFrame(delivery_frame, text="Schedule Delivery", padding=10)
         control_frame.pack(fill='x', padx=10, pady=5)
@@ -297,6 +472,12 @@ class TruckDeliverySystem:
         self.delivery_status_combo.grid(row=3, column=5, padx=5, pady=5)
         self.delivery_status_combo.set('Scheduled')
         
+        # Duration
+        ttk.Label(fields_frame, text="Duration (min):").grid(row=4, column=0, sticky='w', padx=5, pady=5)
+        self.duration_entry = ttk.Entry(fields_frame, width=15)
+        self.duration_entry.grid(row=4, column=1, padx=5, pady=5)
+        self.duration_entry.insert(0, str(DEFAULT_DELIVERY_MINUTES))
+        
         # Buttons
         button_frame = ttk.Frame(control_frame)
         button_frame.pack(fill='x', pady=10)
@@ -306,6 +487,25 @@ class TruckDeliverySystem:
         ttk.Button(button_frame, text="Cancel Delivery", command=self.cancel_delivery).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Clear Fields", command=self.clear_delivery_fields).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Generate ID", command=self.generate_delivery_id).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Free Drivers", command=self.show_free_drivers).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Save as Template", command=self.save_delivery_template).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Generate Recurring", command=self.generate_recurring_deliveries).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Templates", command=self.manage_delivery_templates).pack(side='left', padx=5)
+        
+        # Bulk actions on every selected delivery
+        bulk_frame = ttk.Frame(control_frame)
+        bulk_frame.pack(fill='x')
+        
+        ttk.Label(bulk_frame, text="Selected:").pack(side='left', padx=5)
+        ttk.Button(bulk_frame, text="Cancel", command=self.bulk_cancel_deliveries).pack(side='left', padx=5)
+        ttk.Button(bulk_frame, text="Assign Truck", command=self.bulk_assign_truck).pack(side='left', padx=5)
+        ttk.Button(bulk_frame, text="Assign Driver", command=self.bulk_assign_driver).pack(side='left', padx=5)
+        ttk.Button(bulk_frame, text="Shift Date", command=self.bulk_shift_dates).pack(side='left', padx=5)
+        self.bulk_status_combo = ttk.Combobox(bulk_frame, values=['Scheduled', 'In Progress', 'Completed', 'Cancelled'],
+                                              state='readonly', width=12)
+        self.bulk_status_combo.set('Completed')
+        self.bulk_status_combo.pack(side='left', padx=5)
+        ttk.Button(bulk_frame, text="Set Status", command=self.bulk_set_status).pack(side='left', padx=5)
         
         # Delivery list
         list_frame = ttk.LabelFrame(delivery_frame, text="Scheduled Deliveries", padding=10)
@@ -316,9 +516,15 @@ class TruckDeliverySystem:
         self.delivery_tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=12)
         
         for col in columns:
-            self.delivery_tree.heading(col, text=col)
             self.delivery_tree.column(col, width=100)
         
+        # Sorting, filtering and paging happen in SQL
+        self.delivery_query = PagedQuery(DELIVERY_LIST_SQL, DELIVERY_LIST_COLUMNS,
+                                         default_sort=('Date', True), tiebreak='d.id',
+                                         row_type=Delivery)
+        self.delivery_query.add_condition('d.depot_id = ?', self.depot.id)
+        self.add_tree_controls(list_frame, self.delivery_tree, self.delivery_query, self.refresh_delivery_data)
+        
         # Scrollbar
         delivery_scrollbar = ttk.Scrollbar(list_frame, orient='vertical', command=self.delivery_tree.yview)
         self.delivery_tree.configure(yscrollcommand=delivery_scrollbar.set)
@@ -329,11 +535,8 @@ class TruckDeliverySystem:
         # Bind selection event
         self.delivery_tree.bind('<<TreeviewSelect>>', self.on_delivery_select)
     
-    def create_delivery_tracking_tab(self):
+    def create_delivery_tracking_tab(self, tracking_frame):
         """Create delivery tracking interface"""
-        tracking_frame = ttk.Frame(self.notebook)
-        self.notebook.add(tracking_frame, text="📍 Delivery Tracking")
-        
         # Search panel
         search_frame = ttk.LabelFrame(tracking_frame, text="Track Delivery", padding=10)
         search_frame.pack(fill='x', padx=10, pady=5)
@@ -355,6 +558,20 @@ class TruckDeliverySystem:
         details_frame = ttk.LabelFrame(tracking_frame, text="Delivery Details", padding=10)
         details_frame.pack(fill='both', expand=True, padx=10, pady=5)
         
+        # Long result lists are streamed in; "Load More" continues past the cap
+        more_frame = ttk.Frame(details_frame)
+        more_frame.pack(side='bottom', fill='x', pady=(5, 0))
+        self.details_count_label = ttk.Label(more_frame)
+        self.details_count_label.pack(side='left', padx=5)
+        self.load_more_button = ttk.Button(more_frame, text="Load More", command=self.load_more_details, state='disabled')
+        self.load_more_button.pack(side='left', padx=5)
+        
+        self.details_stream_id = 0
+        self.details_chunks = None
+        self.details_pending = None
+        self.details_shown = 0
+        self.details_streaming = False
+        
         # Create text widget for details
         self.delivery_details_text = tk.Text(details_frame, height=10, wrap='word')
         details_scrollbar = ttk.Scrollbar(details_frame, orient='vertical', command=self.delivery_details_text.yview)
@@ -372,12 +589,40 @@ class TruckDeliverySystem:
         self.update_status_combo.pack(side='left', padx=5)
         ttk.Button(update_frame, text="Update Status", command=self.update_delivery_status).pack(side='left', padx=5)
         ttk.Button(update_frame, text="Mark Completed", command=self.mark_completed).pack(side='left', padx=5)
+        
+        # Late deliveries, newest first
+        alerts_frame = ttk.LabelFrame(tracking_frame, text="SLA Alerts", padding=10)
+        alerts_frame.pack(fill='x', padx=10, pady=5)
+        
+        self.sla_alerts_list = tk.Listbox(alerts_frame, height=6)
+        alerts_scrollbar = ttk.Scrollbar(alerts_frame, orient='vertical', command=self.sla_alerts_list.yview)
+        self.sla_alerts_list.configure(yscrollcommand=alerts_scrollbar.set)
+        self.sla_alerts_list.pack(side='left', fill='x', expand=True)
+        alerts_scrollbar.pack(side='right', fill='y')
+        self.sla_alerts_list.bind('<Double-1>', self.on_sla_alert_open)
+        for alert in self.sla_alerts:
+            self.sla_alerts_list.insert(tk.END, str(alert))
+        
+        # Signatures and photos of the delivery shown above
+        attachments_frame = ttk.LabelFrame(tracking_frame, text="Proof of Delivery", padding=10)
+        attachments_frame.pack(fill='x', padx=10, pady=5)
+        
+        attachment_buttons = ttk.Frame(attachments_frame)
+        attachment_buttons.pack(side='right', fill='y', padx=(5, 0))
+        self.attachment_kind_combo = ttk.Combobox(attachment_buttons, values=list(attachments.KINDS), state='readonly', width=12)
+        self.attachment_kind_combo.set('signature')
+        self.attachment_kind_combo.pack(fill='x', pady=2)
+        ttk.Button(attachment_buttons, text="Attach File...", command=self.attach_file).pack(fill='x', pady=2)
+        ttk.Button(attachment_buttons, text="Preview", command=self.preview_attachment).pack(fill='x', pady=2)
+        ttk.Button(attachment_buttons, text="Save As...", command=self.save_attachment).pack(fill='x', pady=2)
+        ttk.Button(attachment_buttons, text="Remove", command=self.remove_attachment).pack(fill='x', pady=2)
+        
+        self.attachments_list = tk.Listbox(attachments_frame, height=5)
+        self.attachments_list.pack(side='left', fill='x', expand=True)
+        self.attachments_list.bind('<Double-1>', lambda event: self.preview_attachment())
     
-    def create_reports_tab(self):
+    def create_reports_tab(self, reports_frame):
         """Create reports interface"""
-        reports_frame = ttk.Frame(self.notebook)
-        self.notebook.add(reports_frame, text="📊 Reports")
-        
         # Reports control panel
         control_frame = ttk.LabelFrame(reports_frame, text="Generate Reports", padding=10)
         control_frame.pack(fill='x', padx=10, pady=5)
@@ -387,17 +632,193 @@ class TruckDeliverySystem:
         ttk.Button(control_frame, text="Delivery Summary Report", command=self.delivery_summary_report).pack(side='left', padx=5)
         ttk.Button(control_frame, text="Monthly Report", command=self.monthly_report).pack(side='left', padx=5)
         
+        self.report_as_of_entry = ttk.Entry(control_frame, width=17)
+        self.report_as_of_entry.pack(side='right', padx=5)
+        ttk.Label(control_frame, text="Trucks/Drivers As Of:").pack(side='right', padx=5)
+        
+        # Planning reports
+        planning_frame = ttk.LabelFrame(reports_frame, text="Fleet Planning", padding=10)
+        planning_frame.pack(fill='x', padx=10, pady=5)
+        
+        ttk.Button(planning_frame, text="Maintenance Plan", command=self.maintenance_plan_report).pack(side='left', padx=5)
+        ttk.Button(planning_frame, text="Fleet-Wide Summary", command=self.fleet_summary_report).pack(side='left', padx=5)
+        ttk.Button(planning_frame, text="Late Deliveries", command=self.late_deliveries_report).pack(side='left', padx=5)
+        
+        # Lane analytics over a date range
+        analytics_frame = ttk.LabelFrame(reports_frame, text="Lane Analytics", padding=10)
+        analytics_frame.pack(fill='x', padx=10, pady=5)
+        
+        today = date.today()
+        ttk.Label(analytics_frame, text="From:").pack(side='left', padx=5)
+        self.analytics_from_entry = ttk.Entry(analytics_frame, width=12)
+        self.analytics_from_entry.insert(0, (today - timedelta(days=29)).isoformat())
+        self.analytics_from_entry.pack(side='left', padx=5)
+        
+        ttk.Label(analytics_frame, text="To:").pack(side='left', padx=5)
+        self.analytics_to_entry = ttk.Entry(analytics_frame, width=12)
+        self.analytics_to_entry.insert(0, today.isoformat())
+        self.analytics_to_entry.pack(side='left', padx=5)
+        
+        ttk.Label(analytics_frame, text="Order By:").pack(side='left', padx=5)
+        self.lane_order_combo = ttk.Combobox(analytics_frame, values=['deliveries', 'tonnage', 'completion_rate', 'cancellation_rate'],
+                                             state='readonly', width=18)
+        self.lane_order_combo.set('deliveries')
+        self.lane_order_combo.pack(side='left', padx=5)
+        
+        ttk.Button(analytics_frame, text="Top Lanes", command=self.lane_analytics_report).pack(side='left', padx=5)
+        ttk.Button(analytics_frame, text="Delivery Listing", command=self.delivery_listing_report).pack(side='left', padx=5)
+        
+        # Demand forecasting
+        forecast_frame = ttk.LabelFrame(reports_frame, text="Demand Forecast", padding=10)
+        forecast_frame.pack(fill='x', padx=10, pady=5)
+        
+        ttk.Label(forecast_frame, text="Per:").pack(side='left', padx=5)
+        self.forecast_dimension_combo = ttk.Combobox(forecast_frame, values=['lane', 'truck', 'driver'],
+                                                     state='readonly', width=10)
+        self.forecast_dimension_combo.set('lane')
+        self.forecast_dimension_combo.pack(side='left', padx=5)
+        
+        ttk.Label(forecast_frame, text="Metric:").pack(side='left', padx=5)
+        self.forecast_metric_combo = ttk.Combobox(forecast_frame, values=list(forecasting.METRICS),
+                                                  state='readonly', width=12)
+        self.forecast_metric_combo.set('deliveries')
+        self.forecast_metric_combo.pack(side='left', padx=5)
+        
+        ttk.Button(forecast_frame, text="Forecast", command=self.demand_forecast_report).pack(side='left', padx=5)
+        
         # Reports display
         reports_display_frame = ttk.LabelFrame(reports_frame, text="Report Results", padding=10)
         reports_display_frame.pack(fill='both', expand=True, padx=10, pady=5)
         
-        self.reports_text = tk.Text(reports_display_frame, wrap='word')
+        # The shown report can be exported as text, HTML or CSV
+        export_frame = ttk.Frame(reports_display_frame)
+        export_frame.pack(side='bottom', fill='x', pady=(5, 0))
+        self.export_report_button = ttk.Button(export_frame, text="Export...", command=self.export_report, state='disabled')
+        self.export_report_button.pack(side='right', padx=5)
+        self.report_pages_label = ttk.Label(export_frame)
+        self.report_pages_label.pack(side='left', padx=5)
+        
+        self.report_build = None
+        self.report_stream_id = 0
+        
+        self.reports_text = tk.Text(reports_display_frame, wrap='none')
         reports_scrollbar = ttk.Scrollbar(reports_display_frame, orient='vertical', command=self.reports_text.yview)
-        self.reports_text.configure(yscrollcommand=reports_scrollbar.set)
+        reports_xscrollbar = ttk.Scrollbar(reports_display_frame, orient='horizontal', command=self.reports_text.xview)
+        self.reports_text.configure(yscrollcommand=reports_scrollbar.set, xscrollcommand=reports_xscrollbar.set)
+        reports_xscrollbar.pack(side='bottom', fill='x')
         
         self.reports_text.pack(side='left', fill='both', expand=True)
         reports_scrollbar.pack(side='right', fill='y')
     
+    # List View Methods
+    def add_tree_controls(self, parent, tree, query, refresh):
+        """Add sortable headings, per-column filter boxes and pager buttons to a treeview"""
+        # Filter boxes, one per column and aligned with it
+        filter_frame = ttk.Frame(parent)
+        filter_frame.pack(side='top', fill='x', pady=(0, 5))
+        
+        for col in tree['columns']:
+            cell = ttk.Frame(filter_frame, width=tree.column(col, 'width'), height=24)
+            cell.pack_propagate(False)
+            cell.pack(side='left')
+            entry = ttk.Entry(cell)
+            entry.pack(fill='x')
+            entry.bind('<Return>', lambda event, c=col, e=entry: self.apply_tree_filter(query, c, e.get(), refresh))
+            tree.heading(col, text=col, command=lambda c=col: self.sort_tree(tree, query, c, refresh))
+        
+        ttk.Button(filter_frame, text="Clear Filters",
+                   command=lambda: self.clear_tree_filters(filter_frame, query, refresh)).pack(side='left', padx=5)
+        
+        # Pager
+        pager_frame = ttk.Frame(parent)
+        pager_frame.pack(side='bottom', fill='x', pady=(5, 0))
+        
+        page_label = ttk.Label(pager_frame)
+        ttk.Button(pager_frame, text="◀ Prev", command=lambda: (query.prev_page(), refresh())).pack(side='left', padx=5)
+        page_label.pack(side='left', padx=5)
+        ttk.Button(pager_frame, text="Next ▶", command=lambda: (query.next_page(), refresh())).pack(side='left', padx=5)
+        
+        self.page_labels[str(tree)] = page_label
+        self.update_sort_headings(tree, query)
+    
+    def sort_tree(self, tree, query, column, refresh):
+        """Sort a treeview by a column heading"""
+        query.toggle_sort(column)
+        self.update_sort_headings(tree, query)
+        refresh()
+    
+    def update_sort_headings(self, tree, query):
+        """Show the sort direction on the sorted column heading"""
+        for col in tree['columns']:
+            text = col
+            if col == query.sort_column:
+                text += ' ▼' if query.sort_desc else ' ▲'
+            tree.heading(col, text=text)
+    
+    def apply_tree_filter(self, query, column, value, refresh):
+        """Filter a treeview on one column"""
+        try:
+            query.set_filter(column, value)
+        except ValueError:
+            messagebox.showerror("Error", f"Please enter a number to filter '{column}'!")
+            return
+        refresh()
+    
+    def clear_tree_filters(self, filter_frame, query, refresh):
+        """Clear all filters of a treeview"""
+        for cell in filter_frame.winfo_children():
+            for entry in cell.winfo_children():
+                entry.delete(0, tk.END)
+        query.clear_filters()
+        refresh()
+    
+    def load_tree_page(self, tree, query):
+        """Fetch the current page of a paged query into a treeview"""
+        rows = query.fetch_page(self.conn)
+        
+        # Keep the typed rows of the page so selection handlers read fields by name
+        tree.delete(*tree.get_children())
+        page_rows = self.tree_rows[str(tree)] = {}
+        for row in rows:
+            iid = str(row.id)
+            page_rows[iid] = row
+            tree.insert('', 'end', iid=iid, values=row.list_values())
+        
+        # A delivery that left the list with the selection takes its attachments with it
+        shown = self.attachment_delivery
+        if tree is getattr(self, 'delivery_tree', None) and shown is not None and str(shown.id) not in page_rows:
+            self.clear_attachments()
+        
+        first = query.page * query.page_size
+        self.page_labels[str(tree)].config(text=f"Page {query.page + 1} (rows {first + 1 if rows else 0}-{first + len(rows)})")
+    
+    def refresh_tree_rows(self, tree, query, ids):
+        """Re-read only the given rows of a treeview's current page"""
+        rows = repository.query(self.conn, query.row_type,
+                                query.base_sql + f' WHERE {query.tiebreak} IN (SELECT value FROM json_each(?))',
+                                (json.dumps([int(i) for i in ids]),))
+        page_rows = self.tree_rows.get(str(tree), {})
+        refreshed = []
+        for row in rows:
+            iid = str(row.id)
+            if tree.exists(iid):
+                page_rows[iid] = row
+                tree.item(iid, values=row.list_values())
+            refreshed.append(row)
+        return refreshed
+    
+    def selected_rows(self, tree):
+        """Return the typed rows of all selected treeview items"""
+        page_rows = self.tree_rows.get(str(tree), {})
+        return [page_rows[iid] for iid in tree.selection() if iid in page_rows]
+    
+    def selected_row(self, tree):
+        """Return the typed row of the first selected treeview item, or None"""
+        selected = tree.selection()
+        if not selected:
+            return None
+        return self.tree_rows.get(str(tree), {}).get(selected[0])
+    
     # Truck Management Methods
     def add_truck(self):
         """Add a new truck to the database"""
@@ -411,12 +832,12 @@ class TruckDeliverySystem:
                 messagebox.showerror("Error", "Truck number and model are required!")
                 return
             
-            self.cursor.execute('''
-                INSERT INTO trucks (truck_number, model, capacity, status, registration_date)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (truck_number, model, capacity, status, date.today()))
-            
-            self.conn.commit()
+            with self.uow.transaction():
+                self.cursor.execute('''
+                    INSERT INTO trucks (truck_number, model, capacity, status, registration_date, depot_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (truck_number, model, capacity, status, date.today(), self.depot.id))
+            self.kpis.truck_changed(None, status)
             messagebox.showinfo("Success", "Truck added successfully!")
             self.clear_truck_fields()
             self.refresh_truck_data()
@@ -436,7 +857,7 @@ class TruckDeliverySystem:
             return
         
         try:
-            truck_id = self.truck_tree.item(selected[0])['values'][0]
+            truck_id = int(selected[0])
             truck_number = self.truck_number_entry.get().strip()
             model = self.truck_model_entry.get().strip()
             capacity = float(self.truck_capacity_entry.get().strip())
@@ -446,12 +867,20 @@ class TruckDeliverySystem:
                 messagebox.showerror("Error", "Truck number and model are required!")
                 return
             
-            self.cursor.execute('''
-                UPDATE trucks SET truck_number=?, model=?, capacity=?, status=?
-                WHERE id=?
-            ''', (truck_number, model, capacity, status, truck_id))
+            previous = self.selected_row(self.truck_tree)
+            
+            with self.uow.transaction():
+                self.cursor.execute('''
+                    UPDATE trucks SET truck_number=?, model=?, capacity=?, status=?
+                    WHERE id=?
+                ''', (truck_number, model, capacity, status, truck_id))
+            
+                # Bringing a truck back from maintenance counts as a completed service
+                if previous and previous.status == 'Maintenance' and status == 'Available':
+                    maintenance.record_maintenance(self.conn, truck_id, date.today(), "Returned from maintenance")
             
-            self.conn.commit()
+            if previous:
+                self.kpis.truck_changed(previous.status, status)
             messagebox.showinfo("Success", "Truck updated successfully!")
             self.clear_truck_fields()
             self.refresh_truck_data()
@@ -462,21 +891,113 @@ class TruckDeliverySystem:
             messagebox.showerror("Error", f"Failed to update truck: {str(e)}")
     
     def delete_truck(self):
-        """Delete selected truck"""
-        selected = self.truck_tree.selection()
-        if not selected:
+        """Delete selected truck, archiving it or moving its work if deliveries refer to it"""
+        truck = self.selected_row(self.truck_tree)
+        if not truck:
             messagebox.showwarning("Warning", "Please select a truck to delete!")
             return
         
-        if messagebox.askyesno("Confirm", "Are you sure you want to delete this truck?"):
-            try:
-                truck_id = self.truck_tree.item(selected[0])['values'][0]
-                self.cursor.execute('DELETE FROM trucks WHERE id=?', (truck_id,))
-                self.conn.commit()
-                messagebox.showinfo("Success", "Truck deleted successfully!")
-                self.refresh_truck_data()
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to delete truck: {str(e)}")
+        try:
+            found = integrity.references(self.conn, 'trucks', truck.id)
+            reassign_to = None
+            if found.active:
+                target_number = simpledialog.askstring("Delete Truck",
+                                                       f"{truck.truck_number} has {found}.\n"
+                                                       f"Move its active work to truck number:", parent=self.root)
+                if not target_number:
+                    return
+                reassign_to = self.depot_truck_id(target_number)
+                if reassign_to is None or reassign_to == truck.id:
+                    messagebox.showerror("Error", f"No other truck numbered {target_number} in this depot!")
+                    return
+                if not self.check_truck_serviceable(reassign_to):
+                    return
+                policy = integrity.REASSIGN
+            elif found.total:
+                if not messagebox.askyesno("Confirm", f"{truck.truck_number} has {found}.\nIt will be archived: "
+                                                      f"hidden from lists but kept in delivery history. Continue?"):
+                    return
+                policy = integrity.SOFT_DELETE
+            elif messagebox.askyesno("Confirm", "Are you sure you want to delete this truck?"):
+                policy = integrity.BLOCK
+            else:
+                return
+            
+            with self.uow.transaction():
+                integrity.delete_truck(self.conn, truck.id, policy, reassign_to)
+            self.kpis.truck_changed(truck.status, None)
+            messagebox.showinfo("Success", "Truck deleted successfully!")
+            self.refresh_truck_data()
+            self.update_combos()
+            if reassign_to is not None:
+                self.refresh_delivery_data()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to delete truck: {str(e)}")
+    
+    def depot_truck_id(self, truck_number):
+        """Id of the live truck with this number in the current depot, or None"""
+        row = self.cursor.execute('SELECT id FROM trucks WHERE truck_number = ? AND depot_id = ? AND deleted_at IS NULL',
+                                  (truck_number.strip(), self.depot.id)).fetchone()
+        return row[0] if row else None
+    
+    def record_truck_maintenance(self):
+        """Record a completed service for the selected truck"""
+        truck = self.selected_row(self.truck_tree)
+        if not truck:
+            messagebox.showwarning("Warning", "Please select a truck to record maintenance for!")
+            return
+        
+        notes = simpledialog.askstring("Record Maintenance", f"Service notes for {truck.truck_number}:", parent=self.root)
+        if notes is None:
+            return
+        
+        try:
+            with self.uow.transaction():
+                maintenance.record_maintenance(self.conn, truck.id, date.today(), notes)
+            # A completed service returns a truck in maintenance to service
+            if truck.status == 'Maintenance':
+                self.kpis.truck_changed('Maintenance', 'Available')
+            messagebox.showinfo("Success", f"Maintenance recorded for {truck.truck_number}!")
+            self.refresh_truck_data()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to record maintenance: {str(e)}")
+    
+    def reassign_truck_deliveries(self):
+        """Move all upcoming deliveries of the selected truck to another truck"""
+        truck = self.selected_row(self.truck_tree)
+        if not truck:
+            messagebox.showwarning("Warning", "Please select the truck to take deliveries from!")
+            return
+        
+        target_number = simpledialog.askstring("Reassign Deliveries",
+                                               f"Move {truck.truck_number}'s scheduled and in-progress deliveries "
+                                               f"from today on to truck number:", parent=self.root)
+        if not target_number:
+            return
+        
+        try:
+            target = self.depot_truck_id(target_number)
+            if target is None or target == truck.id:
+                messagebox.showerror("Error", f"No other truck numbered {target_number} in this depot!")
+                return
+            if not self.check_truck_serviceable(target):
+                return
+            
+            with self.uow.transaction():
+                moved = bulk.reassign_truck(self.conn, truck.id, target, date.today())
+            messagebox.showinfo("Success", f"{moved} deliveries moved to {target_number}!")
+            self.refresh_delivery_data()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to reassign deliveries: {str(e)}")
+    
+    def check_truck_serviceable(self, truck_id):
+        """Show an error and return False if a truck is due for maintenance"""
+        status = maintenance.truck_maintenance_status(self.conn, truck_id)
+        if status and status.blocks_assignment:
+            messagebox.showerror("Error", f"Truck {status.truck_number} is {status.status.lower()} for maintenance "
+                                          f"and cannot be assigned new deliveries!")
+            return False
+        return True
     
     def clear_truck_fields(self):
         """Clear truck input fields"""
@@ -487,16 +1008,15 @@ class TruckDeliverySystem:
     
     def on_truck_select(self, event):
         """Handle truck selection"""
-        selected = self.truck_tree.selection()
-        if selected:
-            values = self.truck_tree.item(selected[0])['values']
+        truck = self.selected_row(self.truck_tree)
+        if truck:
             self.truck_number_entry.delete(0, tk.END)
-            self.truck_number_entry.insert(0, values[1])
+            self.truck_number_entry.insert(0, truck.truck_number)
             self.truck_model_entry.delete(0, tk.END)
-            self.truck_model_entry.insert(0, values[2])
+            self.truck_model_entry.insert(0, truck.model)
             self.truck_capacity_entry.delete(0, tk.END)
-            self.truck_capacity_entry.insert(0, values[3])
-            self.truck_status_combo.set(values[4])
+            self.truck_capacity_entry.insert(0, truck.capacity)
+            self.truck_status_combo.set(truck.status)
     
     # Driver Management Methods
     def add_driver(self):
@@ -517,12 +1037,12 @@ class TruckDeliverySystem:
                 messagebox.showerror("Error", "Please enter a valid email address!")
                 return
             
-            self.cursor.execute('''
-                INSERT INTO drivers (name, license_number, phone, email, status, hire_date)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (name, license_number, phone, email, status, date.today()))
-            
-            self.conn.commit()
+            with self.uow.transaction():
+                self.cursor.execute('''
+                    INSERT INTO drivers (name, license_number, phone, email, status, hire_date, depot_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (name, license_number, phone, email, status, date.today(), self.depot.id))
+            self.driver_hours.invalidate()
             messagebox.showinfo("Success", "Driver added successfully!")
             self.clear_driver_fields()
             self.refresh_driver_data()
@@ -540,7 +1060,7 @@ class TruckDeliverySystem:
             return
         
         try:
-            driver_id = self.driver_tree.item(selected[0])['values'][0]
+            driver_id = int(selected[0])
             name = self.driver_name_entry.get().strip()
             license_number = self.driver_license_entry.get().strip()
             phone = self.driver_phone_entry.get().strip()
@@ -556,12 +1076,12 @@ class TruckDeliverySystem:
                 messagebox.showerror("Error", "Please enter a valid email address!")
                 return
             
-            self.cursor.execute('''
-                UPDATE drivers SET name=?, license_number=?, phone=?, email=?, status=?
-                WHERE id=?
-            ''', (name, license_number, phone, email, status, driver_id))
-            
-            self.conn.commit()
+            with self.uow.transaction():
+                self.cursor.execute('''
+                    UPDATE drivers SET name=?, license_number=?, phone=?, email=?, status=?
+                    WHERE id=?
+                ''', (name, license_number, phone, email, status, driver_id))
+            self.driver_hours.invalidate()
             messagebox.showinfo("Success", "Driver updated successfully!")
             self.clear_driver_fields()
             self.refresh_driver_data()
@@ -570,21 +1090,84 @@ class TruckDeliverySystem:
             messagebox.showerror("Error", f"Failed to update driver: {str(e)}")
     
     def delete_driver(self):
-        """Delete selected driver"""
-        selected = self.driver_tree.selection()
-        if not selected:
+        """Delete selected driver, archiving them or moving their work if deliveries refer to them"""
+        driver = self.selected_row(self.driver_tree)
+        if not driver:
             messagebox.showwarning("Warning", "Please select a driver to delete!")
             return
         
-        if messagebox.askyesno("Confirm", "Are you sure you want to delete this driver?"):
-            try:
-                driver_id = self.driver_tree.item(selected[0])['values'][0]
-                self.cursor.execute('DELETE FROM drivers WHERE id=?', (driver_id,))
-                self.conn.commit()
-                messagebox.showinfo("Success", "Driver deleted successfully!")
-                self.refresh_driver_data()
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to delete driver: {str(e)}")
+        try:
+            found = integrity.references(self.conn, 'drivers', driver.id)
+            reassign_to = None
+            if found.active:
+                license_number = simpledialog.askstring("Delete Driver",
+                                                        f"{driver.name} has {found}.\n"
+                                                        f"Move their active work to the driver with license number:",
+                                                        parent=self.root)
+                if not license_number:
+                    return
+                row = self.cursor.execute('SELECT id FROM drivers WHERE license_number = ? AND depot_id = ? '
+                                          'AND deleted_at IS NULL', (license_number.strip(), self.depot.id)).fetchone()
+                if not row or row[0] == driver.id:
+                    messagebox.showerror("Error", f"No other driver with license {license_number} in this depot!")
+                    return
+                reassign_to = row[0]
+                active = list(repository.query(self.conn, Delivery, repository.DELIVERY_SELECT +
+                                               " WHERE d.driver_id = ? AND d.status IN ('Scheduled', 'In Progress')",
+                                               (driver.id,)))
+                if not self.check_bulk_driver_hours(active, driver_id=reassign_to):
+                    return
+                policy = integrity.REASSIGN
+            elif found.total:
+                if not messagebox.askyesno("Confirm", f"{driver.name} has {found}.\nThe driver will be archived: "
+                                                      f"hidden from lists but kept in delivery history. Continue?"):
+                    return
+                policy = integrity.SOFT_DELETE
+            elif messagebox.askyesno("Confirm", "Are you sure you want to delete this driver?"):
+                policy = integrity.BLOCK
+            else:
+                return
+            
+            with self.uow.transaction():
+                integrity.delete_driver(self.conn, driver.id, policy, reassign_to)
+            self.driver_hours.invalidate()
+            messagebox.showinfo("Success", "Driver deleted successfully!")
+            self.refresh_driver_data()
+            self.update_combos()
+            if reassign_to is not None:
+                self.refresh_delivery_data()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to delete driver: {str(e)}")
+    
+    def show_truck_history(self):
+        """Show every recorded version of the selected truck"""
+        truck = self.selected_row(self.truck_tree)
+        if not truck:
+            messagebox.showwarning("Warning", "Please select a truck to show the history of!")
+            return
+        
+        try:
+            lines = [f"{version.valid_from[:16]}  {version.truck_number}  {version.model}  "
+                     f"{version.capacity}t  {version.status}{'  (deleted)' if version.deleted_at else ''}"
+                     for version in repository.truck_history(self.conn, truck.id)]
+            messagebox.showinfo(f"History of {truck.truck_number}", "\n".join(lines[-30:]) or "No history recorded")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load truck history: {str(e)}")
+    
+    def show_driver_history(self):
+        """Show every recorded version of the selected driver"""
+        driver = self.selected_row(self.driver_tree)
+        if not driver:
+            messagebox.showwarning("Warning", "Please select a driver to show the history of!")
+            return
+        
+        try:
+            lines = [f"{version.valid_from[:16]}  {version.name}  {version.license_number}  "
+                     f"{version.status}{'  (deleted)' if version.deleted_at else ''}"
+                     for version in repository.driver_history(self.conn, driver.id)]
+            messagebox.showinfo(f"History of {driver.name}", "\n".join(lines[-30:]) or "No history recorded")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load driver history: {str(e)}")
     
     def clear_driver_fields(self):
         """Clear driver input fields"""
@@ -596,18 +1179,17 @@ class TruckDeliverySystem:
     
     def on_driver_select(self, event):
         """Handle driver selection"""
-        selected = self.driver_tree.selection()
-        if selected:
-            values = self.driver_tree.item(selected[0])['values']
+        driver = self.selected_row(self.driver_tree)
+        if driver:
             self.driver_name_entry.delete(0, tk.END)
-            self.driver_name_entry.insert(0, values[1])
+            self.driver_name_entry.insert(0, driver.name)
             self.driver_license_entry.delete(0, tk.END)
-            self.driver_license_entry.insert(0, values[2])
+            self.driver_license_entry.insert(0, driver.license_number)
             self.driver_phone_entry.delete(0, tk.END)
-            self.driver_phone_entry.insert(0, values[3] if values[3] else "")
+            self.driver_phone_entry.insert(0, driver.phone or "")
             self.driver_email_entry.delete(0, tk.END)
-            self.driver_email_entry.insert(0, values[4] if values[4] else "")
-            self.driver_status_combo.set(values[5])
+            self.driver_email_entry.insert(0, driver.email or "")
+            self.driver_status_combo.set(driver.status)
     
     # Delivery Scheduling Methods
     def schedule_delivery(self):
@@ -646,15 +1228,28 @@ class TruckDeliverySystem:
             truck_id = truck.split(' - ')[0]
             driver_id = driver.split(' - ')[0]
             
-            self.cursor.execute('''
-                INSERT INTO deliveries (delivery_id, truck_id, driver_id, pickup_location, 
-                delivery_location, cargo_description, weight, scheduled_date, scheduled_time, 
-                status, created_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (delivery_id, truck_id, driver_id, pickup_location, delivery_location, 
-                  cargo_description, weight, scheduled_date, scheduled_time, status, date.today()))
+            duration = self.read_duration()
+            if duration is None:
+                return
+            
+            if not self.check_truck_serviceable(truck_id):
+                return
             
-            self.conn.commit()
+            if not self.check_driver_hours(int(driver_id), scheduled_date, scheduled_time, duration, status):
+                return
+            
+            with self.uow.transaction():
+                self.cursor.execute('''
+                    INSERT INTO deliveries (delivery_id, truck_id, driver_id, pickup_location, 
+                    delivery_location, cargo_description, weight, scheduled_date, scheduled_time, 
+                    status, created_date, duration_minutes, pickup_location_id, delivery_location_id, depot_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (delivery_id, truck_id, driver_id, pickup_location, delivery_location, 
+                      cargo_description, weight, scheduled_date, scheduled_time, status, date.today(),
+                      duration, self.locations.resolve(pickup_location), self.locations.resolve(delivery_location),
+                      self.depot.id))
+            self.driver_hours.invalidate(scheduled_date)
+            self.kpis.delivery_changed(None, (scheduled_date, status, weight))
             messagebox.showinfo("Success", "Delivery scheduled successfully!")
             self.clear_delivery_fields()
             self.refresh_delivery_data()
@@ -674,7 +1269,7 @@ class TruckDeliverySystem:
             return
         
         try:
-            delivery_db_id = self.delivery_tree.item(selected[0])['values'][0]
+            delivery_db_id = int(selected[0])
             delivery_id = self.delivery_id_entry.get().strip()
             truck = self.delivery_truck_combo.get()
             driver = self.delivery_driver_combo.get()
@@ -690,18 +1285,51 @@ class TruckDeliverySystem:
                 messagebox.showerror("Error", "Please fill in all required fields!")
                 return
             
+            # Validate date format
+            try:
+                datetime.strptime(scheduled_date, '%Y-%m-%d')
+            except ValueError:
+                messagebox.showerror("Error", "Please enter date in YYYY-MM-DD format!")
+                return
+            
+            # Validate time format
+            try:
+                datetime.strptime(scheduled_time, '%H:%M')
+            except ValueError:
+                messagebox.showerror("Error", "Please enter time in HH:MM format!")
+                return
+            
             # Get truck and driver IDs
             truck_id = truck.split(' - ')[0]
             driver_id = driver.split(' - ')[0]
             
-            self.cursor.execute('''
-                UPDATE deliveries SET delivery_id=?, truck_id=?, driver_id=?, pickup_location=?, 
-                delivery_location=?, cargo_description=?, weight=?, scheduled_date=?, 
-                scheduled_time=?, status=? WHERE id=?
-            ''', (delivery_id, truck_id, driver_id, pickup_location, delivery_location, 
-                  cargo_description, weight, scheduled_date, scheduled_time, status, delivery_db_id))
+            # Moving a delivery onto another truck is a new assignment
+            previous = self.selected_row(self.delivery_tree)
+            if previous and str(previous.truck_id) != truck_id and not self.check_truck_serviceable(truck_id):
+                return
             
-            self.conn.commit()
+            duration = self.read_duration()
+            if duration is None:
+                return
+            
+            if not self.check_driver_hours(int(driver_id), scheduled_date, scheduled_time, duration, status,
+                                           exclude_delivery=delivery_db_id):
+                return
+            
+            with self.uow.transaction():
+                self.cursor.execute('''
+                    UPDATE deliveries SET delivery_id=?, truck_id=?, driver_id=?, pickup_location=?, 
+                    delivery_location=?, cargo_description=?, weight=?, scheduled_date=?, 
+                    scheduled_time=?, status=?, duration_minutes=?, pickup_location_id=?,
+                    delivery_location_id=? WHERE id=?
+                ''', (delivery_id, truck_id, driver_id, pickup_location, delivery_location, 
+                      cargo_description, weight, scheduled_date, scheduled_time, status, duration,
+                      self.locations.resolve(pickup_location), self.locations.resolve(delivery_location),
+                      delivery_db_id))
+            self.driver_hours.invalidate(scheduled_date)
+            if previous:
+                self.driver_hours.invalidate(previous.scheduled_date)
+                self.kpis.delivery_changed(delivery_facts(previous), (scheduled_date, status, weight))
             messagebox.showinfo("Success", "Delivery updated successfully!")
             self.clear_delivery_fields()
             self.refresh_delivery_data()
@@ -720,9 +1348,14 @@ class TruckDeliverySystem:
         
         if messagebox.askyesno("Confirm", "Are you sure you want to cancel this delivery?"):
             try:
-                delivery_id = self.delivery_tree.item(selected[0])['values'][0]
-                self.cursor.execute('UPDATE deliveries SET status="Cancelled" WHERE id=?', (delivery_id,))
-                self.conn.commit()
+                delivery_id = int(selected[0])
+                previous = self.selected_row(self.delivery_tree)
+                with self.uow.transaction():
+                    self.cursor.execute('UPDATE deliveries SET status="Cancelled" WHERE id=?', (delivery_id,))
+                self.driver_hours.invalidate()
+                if previous:
+                    self.kpis.delivery_changed(delivery_facts(previous),
+                                               (previous.scheduled_date, 'Cancelled', previous.weight))
                 messagebox.showinfo("Success", "Delivery cancelled successfully!")
                 self.refresh_delivery_data()
             except Exception as e:
@@ -740,6 +1373,312 @@ class TruckDeliverySystem:
         self.scheduled_time_entry.delete(0, tk.END)
         self.scheduled_time_entry.insert(0, '09:00')
         self.delivery_status_combo.set('Scheduled')
+        self.duration_entry.delete(0, tk.END)
+        self.duration_entry.insert(0, str(DEFAULT_DELIVERY_MINUTES))
+        self.update_combos()
+    
+    def read_duration(self):
+        """Read the delivery duration in minutes, or show an error and return None"""
+        value = self.duration_entry.get().strip()
+        if not value:
+            return DEFAULT_DELIVERY_MINUTES
+        try:
+            duration = int(value)
+            if duration <= 0:
+                raise ValueError
+            return duration
+        except ValueError:
+            messagebox.showerror("Error", "Please enter the duration as a positive number of minutes!")
+            return None
+    
+    def check_driver_hours(self, driver_id, scheduled_date, scheduled_time, duration, status, exclude_delivery=None):
+        """Show an error and return False if the driver cannot take the delivery"""
+        if status not in ('Scheduled', 'In Progress'):
+            return True
+        
+        problems = self.driver_hours.check_assignment(driver_id, scheduled_date, scheduled_time, duration,
+                                                      exclude_delivery=exclude_delivery)
+        if problems:
+            messagebox.showerror("Error", "Driver cannot be assigned: " + "; ".join(problems) + "!")
+            return False
+        return True
+    
+    def show_free_drivers(self):
+        """Limit the driver combo to drivers free at the entered date, time and duration"""
+        scheduled_date = self.scheduled_date_entry.get().strip()
+        scheduled_time = self.scheduled_time_entry.get().strip()
+        try:
+            datetime.strptime(scheduled_date, '%Y-%m-%d')
+            datetime.strptime(scheduled_time, '%H:%M')
+        except ValueError:
+            messagebox.showerror("Error", "Please enter date as YYYY-MM-DD and time as HH:MM!")
+            return
+        
+        duration = self.read_duration()
+        if duration is None:
+            return
+        
+        try:
+            started = time.perf_counter()
+            free = set(self.driver_hours.free_drivers(scheduled_date, scheduled_time, duration))
+            elapsed = time.perf_counter() - started
+            
+            self.update_combos()
+            free_values = [value for value in self.delivery_driver_combo['values']
+                           if int(value.split(' - ')[0]) in free]
+            self.delivery_driver_combo['values'] = free_values
+            self.delivery_driver_combo.set('')
+            self.status_var.set(f"{len(free_values)} driver(s) free on {scheduled_date} at {scheduled_time} "
+                                f"for {duration} min ({elapsed * 1000:.2f} ms)")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to find free drivers: {str(e)}")
+    
+    def save_delivery_template(self):
+        """Save the current delivery form as a recurring delivery template"""
+        truck = self.delivery_truck_combo.get()
+        driver = self.delivery_driver_combo.get()
+        pickup_location = self.pickup_location_entry.get().strip()
+        delivery_location = self.delivery_location_entry.get().strip()
+        scheduled_date = self.scheduled_date_entry.get().strip()
+        scheduled_time = self.scheduled_time_entry.get().strip()
+        
+        if not all([truck, driver, pickup_location, delivery_location]):
+            messagebox.showerror("Error", "Please fill in truck, driver and locations!")
+            return
+        
+        try:
+            datetime.strptime(scheduled_date, '%Y-%m-%d')
+            datetime.strptime(scheduled_time, '%H:%M')
+        except ValueError:
+            messagebox.showerror("Error", "Please enter date as YYYY-MM-DD and time as HH:MM!")
+            return
+        
+        duration = self.read_duration()
+        if duration is None:
+            return
+        
+        name = simpledialog.askstring("Save Template", "Template name:", parent=self.root)
+        if not name:
+            return
+        rule = simpledialog.askstring("Save Template",
+                                      "Recurrence (daily, weekdays, weekly:mon,wed, monthly:1,15\n"
+                                      "or cron 'MIN HOUR DOM MON DOW'):",
+                                      initialvalue='weekdays', parent=self.root)
+        if not rule:
+            return
+        
+        try:
+            weight = float(self.cargo_weight_entry.get().strip() or 0)
+            with self.uow.transaction():
+                recurring.create_template(self.conn, name, rule, truck.split(' - ')[0], driver.split(' - ')[0],
+                                          pickup_location, delivery_location, scheduled_time, scheduled_date,
+                                          cargo_description=self.cargo_description_entry.get().strip(),
+                                          weight=weight, duration_minutes=duration)
+            messagebox.showinfo("Success", f"Template '{name}' saved, starting {scheduled_date}!")
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid template: {str(e)}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save template: {str(e)}")
+    
+    def generate_recurring_deliveries(self):
+        """Materialize recurring delivery templates for the coming days"""
+        horizon = simpledialog.askinteger("Generate Recurring", "Generate deliveries for how many days ahead?",
+                                          initialvalue=recurring.DEFAULT_HORIZON_DAYS, minvalue=1, maxvalue=366,
+                                          parent=self.root)
+        if not horizon:
+            return
+        
+        try:
+            with self.uow.transaction():
+                inserted, skipped = recurring.materialize(self.conn, date.today(), horizon, self.locations,
+                                                          self.depot.id)
+            self.driver_hours.invalidate()
+            self.kpis.invalidate()
+            if skipped:
+                more = f" and {len(skipped) - 10} more" if len(skipped) > 10 else ""
+                messagebox.showwarning("Generate Recurring",
+                                       f"{inserted} recurring deliveries generated.\n{len(skipped)} skipped because "
+                                       f"their delivery ID is already taken: {', '.join(skipped[:10])}{more}")
+            else:
+                messagebox.showinfo("Success", f"{inserted} recurring deliveries generated!")
+            self.refresh_delivery_data()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to generate recurring deliveries: {str(e)}")
+    
+    def manage_delivery_templates(self):
+        """List this depot's recurring delivery templates and deactivate the selected ones"""
+        window = tk.Toplevel(self.root)
+        window.title("Recurring Delivery Templates")
+        
+        columns = ('Name', 'Rule', 'Time', 'From', 'Until', 'Generated Through', 'Active')
+        tree = ttk.Treeview(window, columns=columns, show='headings', height=12)
+        for column in columns:
+            tree.heading(column, text=column)
+            tree.column(column, width=90 if column != 'Name' else 180)
+        tree.pack(fill='both', expand=True, padx=10, pady=10)
+        
+        def load():
+            tree.delete(*tree.get_children())
+            for template in recurring.list_templates(self.conn, self.depot.id):
+                tree.insert('', 'end', iid=str(template.id), values=(
+                    template.name, template.rule, template.scheduled_time, template.start_date,
+                    template.end_date or '', template.generated_through or '',
+                    'Yes' if template.active else 'No'))
+        
+        def deactivate():
+            selected = tree.selection()
+            if not selected:
+                messagebox.showwarning("Warning", "Please select the templates to deactivate!", parent=window)
+                return
+            if not messagebox.askyesno("Confirm", f"Stop generating deliveries from {len(selected)} template(s)? "
+                                                  f"Deliveries already generated are kept.", parent=window):
+                return
+            try:
+                with self.uow.transaction():
+                    for iid in selected:
+                        recurring.deactivate_template(self.conn, int(iid))
+                load()
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to deactivate templates: {str(e)}", parent=window)
+        
+        buttons = ttk.Frame(window)
+        buttons.pack(fill='x', padx=10, pady=(0, 10))
+        ttk.Button(buttons, text="Deactivate", command=deactivate).pack(side='left', padx=5)
+        ttk.Button(buttons, text="Close", command=window.destroy).pack(side='right', padx=5)
+        
+        try:
+            load()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load templates: {str(e)}", parent=window)
+    
+    # Bulk Delivery Methods
+    def selected_deliveries(self, action):
+        """Selected delivery rows, or None after warning that nothing is selected"""
+        deliveries = self.selected_rows(self.delivery_tree)
+        if not deliveries:
+            messagebox.showwarning("Warning", f"Please select the deliveries to {action}!")
+            return None
+        return deliveries
+    
+    def apply_bulk(self, deliveries, operation, *args):
+        """Run one bulk statement in a transaction, then refresh just the affected rows"""
+        ids = [delivery.id for delivery in deliveries]
+        with self.uow.transaction():
+            changed = operation(self.conn, ids, *args)
+        self.driver_hours.invalidate()
+        before = {delivery.id: delivery for delivery in deliveries}
+        for row in self.refresh_tree_rows(self.delivery_tree, self.delivery_query, ids):
+            self.kpis.delivery_changed(delivery_facts(before.get(row.id)), delivery_facts(row))
+        self.status_var.set(f"{changed} of {len(ids)} selected deliveries updated")
+        return changed
+    
+    def check_bulk_driver_hours(self, deliveries, driver_id=None, days=0, status=None):
+        """Show an error and return False if the active deliveries together would break driver hours
+        
+        The deliveries are checked as one set, against each other as well as
+        the rest of the schedule. status is the one they are about to get,
+        their current one by default.
+        """
+        plan = []
+        for delivery in deliveries:
+            assigned = driver_id if driver_id is not None else delivery.driver_id
+            if (status or delivery.status) not in ('Scheduled', 'In Progress') or not assigned \
+                    or not delivery.scheduled_date or not delivery.scheduled_time:
+                continue
+            day = date.fromisoformat(str(delivery.scheduled_date)[:10]) + timedelta(days=days)
+            plan.append((delivery.id, assigned, day, delivery.scheduled_time,
+                         delivery.duration_minutes or DEFAULT_DELIVERY_MINUTES))
+        labels = {delivery.id: delivery.delivery_id for delivery in deliveries}
+        problems = [f"{labels[delivery_db_id]}: {problem}"
+                    for delivery_db_id, problem in self.driver_hours.check_plan(plan)]
+        if problems:
+            more = f"\n... and {len(problems) - 10} more" if len(problems) > 10 else ""
+            messagebox.showerror("Error", "Driver hours would be violated:\n" + "\n".join(problems[:10]) + more)
+            return False
+        return True
+    
+    def bulk_cancel_deliveries(self):
+        """Cancel all selected deliveries"""
+        deliveries = self.selected_deliveries("cancel")
+        if not deliveries:
+            return
+        if not messagebox.askyesno("Confirm", f"Cancel {len(deliveries)} selected deliveries?"):
+            return
+        try:
+            self.apply_bulk(deliveries, bulk.cancel_deliveries)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to cancel deliveries: {str(e)}")
+    
+    def bulk_assign_truck(self):
+        """Assign the truck chosen in the form to all selected deliveries"""
+        deliveries = self.selected_deliveries("reassign")
+        if not deliveries:
+            return
+        truck = self.delivery_truck_combo.get()
+        if not truck:
+            messagebox.showwarning("Warning", "Please choose the truck in the Truck field!")
+            return
+        truck_id = int(truck.split(' - ')[0])
+        if not self.check_truck_serviceable(truck_id):
+            return
+        if not messagebox.askyesno("Confirm", f"Assign truck {truck} to {len(deliveries)} selected deliveries?"):
+            return
+        try:
+            self.apply_bulk(deliveries, bulk.reassign_deliveries, truck_id)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to reassign deliveries: {str(e)}")
+    
+    def bulk_assign_driver(self):
+        """Assign the driver chosen in the form to all selected deliveries"""
+        deliveries = self.selected_deliveries("reassign")
+        if not deliveries:
+            return
+        driver = self.delivery_driver_combo.get()
+        if not driver:
+            messagebox.showwarning("Warning", "Please choose the driver in the Driver field!")
+            return
+        driver_id = int(driver.split(' - ')[0])
+        if not self.check_bulk_driver_hours(deliveries, driver_id=driver_id):
+            return
+        if not messagebox.askyesno("Confirm", f"Assign driver {driver} to {len(deliveries)} selected deliveries?"):
+            return
+        try:
+            self.apply_bulk(deliveries, bulk.reassign_deliveries, None, driver_id)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to reassign deliveries: {str(e)}")
+    
+    def bulk_shift_dates(self):
+        """Move all selected deliveries by a number of days"""
+        deliveries = self.selected_deliveries("reschedule")
+        if not deliveries:
+            return
+        days = simpledialog.askinteger("Shift Date", f"Move {len(deliveries)} selected deliveries by how many days?\n"
+                                                     f"(negative moves them earlier)", parent=self.root)
+        if not days:
+            return
+        if not self.check_bulk_driver_hours(deliveries, days=days):
+            return
+        try:
+            self.apply_bulk(deliveries, bulk.shift_dates, days)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to shift deliveries: {str(e)}")
+    
+    def bulk_set_status(self):
+        """Set the chosen status on all selected deliveries"""
+        deliveries = self.selected_deliveries("update")
+        if not deliveries:
+            return
+        status = self.bulk_status_combo.get()
+        # Cancelled deliveries hold no on-duty time until they are reactivated
+        if status in ('Scheduled', 'In Progress') and not self.check_bulk_driver_hours(
+                [delivery for delivery in deliveries if delivery.status == 'Cancelled'], status=status):
+            return
+        if not messagebox.askyesno("Confirm", f"Set {len(deliveries)} selected deliveries to {status}?"):
+            return
+        try:
+            self.apply_bulk(deliveries, bulk.set_delivery_status, status)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to update deliveries: {str(e)}")
     
     def generate_delivery_id(self):
         """Generate a unique delivery ID"""
@@ -749,57 +1688,42 @@ class TruckDeliverySystem:
     
     def on_delivery_select(self, event):
         """Handle delivery selection"""
-        selected = self.delivery_tree.selection()
-        if selected:
-            values = self.delivery_tree.item(selected[0])['values']
-            
-            # Get the actual delivery data from database to get truck_id and driver_id
+        delivery = self.selected_row(self.delivery_tree)
+        if delivery:
             try:
-                delivery_db_id = values[0]
-                self.cursor.execute('''
-                    SELECT d.*, t.truck_number, dr.name as driver_name
-                    FROM deliveries d
-                    LEFT JOIN trucks t ON d.truck_id = t.id
-                    LEFT JOIN drivers dr ON d.driver_id = dr.id
-                    WHERE d.id = ?
-                ''', (delivery_db_id,))
+                # Fill delivery fields
+                self.delivery_id_entry.delete(0, tk.END)
+                self.delivery_id_entry.insert(0, delivery.delivery_id)
+                
+                # Set truck combo - find the option that starts with the truck_id
+                for i, truck_option in enumerate(self.delivery_truck_combo['values']):
+                    if truck_option.startswith(f"{delivery.truck_id} - "):
+                        self.delivery_truck_combo.current(i)
+                        break
+                
+                # Set driver combo - find the option that starts with the driver_id
+                for i, driver_option in enumerate(self.delivery_driver_combo['values']):
+                    if driver_option.startswith(f"{delivery.driver_id} - "):
+                        self.delivery_driver_combo.current(i)
+                        break
                 
-                delivery_data = self.cursor.fetchone()
+                # Fill other fields
+                self.pickup_location_entry.delete(0, tk.END)
+                self.pickup_location_entry.insert(0, delivery.pickup_location)
+                self.delivery_location_entry.delete(0, tk.END)
+                self.delivery_location_entry.insert(0, delivery.delivery_location)
+                self.cargo_description_entry.delete(0, tk.END)
+                self.cargo_description_entry.insert(0, delivery.cargo_description or "")
+                self.cargo_weight_entry.delete(0, tk.END)
+                self.cargo_weight_entry.insert(0, str(delivery.weight) if delivery.weight else "")
+                self.scheduled_date_entry.delete(0, tk.END)
+                self.scheduled_date_entry.insert(0, delivery.scheduled_date)
+                self.scheduled_time_entry.delete(0, tk.END)
+                self.scheduled_time_entry.insert(0, delivery.scheduled_time)
+                self.delivery_status_combo.set(delivery.status)
+                self.duration_entry.delete(0, tk.END)
+                self.duration_entry.insert(0, str(delivery.duration_minutes or DEFAULT_DELIVERY_MINUTES))
                 
-                if delivery_data:
-                    # Fill delivery fields
-                    self.delivery_id_entry.delete(0, tk.END)
-                    self.delivery_id_entry.insert(0, delivery_data[1])  # delivery_id
-                    
-                    # Set truck combo - find the option that starts with the truck_id
-                    truck_id = delivery_data[2]  # truck_id
-                    for i, truck_option in enumerate(self.delivery_truck_combo['values']):
-                        if truck_option.startswith(f"{truck_id} - "):
-                            self.delivery_truck_combo.current(i)
-                            break
-                    
-                    # Set driver combo - find the option that starts with the driver_id
-                    driver_id = delivery_data[3]  # driver_id
-                    for i, driver_option in enumerate(self.delivery_driver_combo['values']):
-                        if driver_option.startswith(f"{driver_id} - "):
-                            self.delivery_driver_combo.current(i)
-                            break
-                    
-                    # Fill other fields
-                    self.pickup_location_entry.delete(0, tk.END)
-                    self.pickup_location_entry.insert(0, delivery_data[4])  # pickup_location
-                    self.delivery_location_entry.delete(0, tk.END)
-                    self.delivery_location_entry.insert(0, delivery_data[5])  # delivery_location
-                    self.cargo_description_entry.delete(0, tk.END)
-                    self.cargo_description_entry.insert(0, delivery_data[6] if delivery_data[6] else "")  # cargo_description
-                    self.cargo_weight_entry.delete(0, tk.END)
-                    self.cargo_weight_entry.insert(0, str(delivery_data[7]) if delivery_data[7] else "")  # weight
-                    self.scheduled_date_entry.delete(0, tk.END)
-                    self.scheduled_date_entry.insert(0, delivery_data[8])  # scheduled_date
-                    self.scheduled_time_entry.delete(0, tk.END)
-                    self.scheduled_time_entry.insert(0, delivery_data[9])  # scheduled_time
-                    self.delivery_status_combo.set(delivery_data[10])  # status
-                    
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to load delivery details: {str(e)}")
     
@@ -812,15 +1736,7 @@ class TruckDeliverySystem:
             return
         
         try:
-            self.cursor.execute('''
-                SELECT d.*, t.truck_number, dr.name as driver_name
-                FROM deliveries d
-                LEFT JOIN trucks t ON d.truck_id = t.id
-                LEFT JOIN drivers dr ON d.driver_id = dr.id
-                WHERE d.delivery_id LIKE ?
-            ''', (f'%{search_term}%',))
-            
-            result = self.cursor.fetchone()
+            result = repository.find_delivery(self.conn, search_term, self.depot.id)
             if result:
                 self.display_delivery_details(result)
             else:
@@ -838,62 +1754,111 @@ class TruckDeliverySystem:
         status_filter = self.status_filter_combo.get()
         
         try:
-            if status_filter == 'All':
-                query = '''
-                    SELECT d.*, t.truck_number, dr.name as driver_name
-                    FROM deliveries d
-                    LEFT JOIN trucks t ON d.truck_id = t.id
-                    LEFT JOIN drivers dr ON d.driver_id = dr.id
-                    ORDER BY d.scheduled_date DESC, d.scheduled_time DESC
-                '''
-                self.cursor.execute(query)
-            else:
-                query = '''
-                    SELECT d.*, t.truck_number, dr.name as driver_name
-                    FROM deliveries d
-                    LEFT JOIN trucks t ON d.truck_id = t.id
-                    LEFT JOIN drivers dr ON d.driver_id = dr.id
-                    WHERE d.status = ?
-                    ORDER BY d.scheduled_date DESC, d.scheduled_time DESC
-                '''
-                self.cursor.execute(query, (status_filter,))
-            
-            results = self.cursor.fetchall()
-            
-            if results:
-                details_text = f"Found {len(results)} deliveries with status '{status_filter}':\n\n"
-                for result in results:
-                    details_text += self.format_delivery_details(result) + "\n" + "="*50 + "\n\n"
-                self.delivery_details_text.delete(1.0, tk.END)
-                self.delivery_details_text.insert(1.0, details_text)
-            else:
-                self.delivery_details_text.delete(1.0, tk.END)
-                self.delivery_details_text.insert(1.0, f"No deliveries found with status '{status_filter}'")
-                
+            status = None if status_filter == 'All' else status_filter
+            self.stream_delivery_details(f"Deliveries with status '{status_filter}':\n\n",
+                                         repository.iter_deliveries(self.conn, status, depot_id=self.depot.id),
+                                         f"No deliveries found with status '{status_filter}'")
         except Exception as e:
             messagebox.showerror("Error", f"Filter failed: {str(e)}")
     
-    def display_delivery_details(self, delivery_data):
+    def display_delivery_details(self, delivery):
         """Display detailed information about a delivery"""
-        details = self.format_delivery_details(delivery_data)
+        self.stop_details_stream()
+        details = self.format_delivery_details(delivery)
         self.delivery_details_text.delete(1.0, tk.END)
         self.delivery_details_text.insert(1.0, details)
+        self.attachment_delivery = delivery
+        self.refresh_attachments()
+    
+    def iter_detail_chunks(self, deliveries):
+        """Yield (row_count, text) chunks of formatted delivery details"""
+        separator = "\n" + "=" * 50 + "\n\n"
+        chunk = []
+        for delivery in deliveries:
+            chunk.append(self.format_delivery_details(delivery) + separator)
+            if len(chunk) == DETAILS_CHUNK_ROWS:
+                yield len(chunk), ''.join(chunk)
+                chunk = []
+        if chunk:
+            yield len(chunk), ''.join(chunk)
+    
+    def stream_delivery_details(self, header, deliveries, empty_message):
+        """Render deliveries into the details pane one chunk per event loop tick"""
+        self.stop_details_stream()
+        self.clear_attachments()
+        self.details_chunks = self.iter_detail_chunks(deliveries)
+        self.details_pending = next(self.details_chunks, None)
+        
+        self.delivery_details_text.delete(1.0, tk.END)
+        if self.details_pending is None:
+            self.delivery_details_text.insert(1.0, empty_message)
+        else:
+            self.delivery_details_text.insert(1.0, header)
+            self.details_streaming = True
+            self.render_details_chunk(self.details_stream_id, DETAILS_ROW_CAP)
+        self.update_load_more()
+    
+    def render_details_chunk(self, stream_id, budget):
+        """Append the pending chunk and schedule the next one until the cap is reached"""
+        if stream_id != self.details_stream_id or self.details_pending is None:
+            return
+        
+        count, text = self.details_pending
+        self.delivery_details_text.insert(tk.END, text)
+        self.details_shown += count
+        budget -= count
+        
+        try:
+            self.details_pending = next(self.details_chunks, None)
+        except Exception as e:
+            self.details_pending = None
+            messagebox.showerror("Error", f"Failed to load deliveries: {str(e)}")
+        
+        if self.details_pending is not None and budget > 0:
+            self.root.after(1, self.render_details_chunk, stream_id, budget)
+        else:
+            self.details_streaming = False
+        self.update_load_more()
     
-    def format_delivery_details(self, delivery_data):
+    def load_more_details(self):
+        """Continue a capped details stream"""
+        if self.details_pending is not None and not self.details_streaming:
+            self.details_streaming = True
+            self.render_details_chunk(self.details_stream_id, DETAILS_ROW_CAP)
+    
+    def stop_details_stream(self):
+        """Abandon any running details stream"""
+        self.details_stream_id += 1
+        self.details_chunks = None
+        self.details_pending = None
+        self.details_shown = 0
+        self.details_streaming = False
+        self.update_load_more()
+    
+    def update_load_more(self):
+        """Show the streamed row count and enable "Load More" when rows remain"""
+        more = self.details_pending is not None
+        if self.details_shown:
+            self.details_count_label.config(text=f"Showing {self.details_shown} deliveries" + (" (more available)" if more else ""))
+        else:
+            self.details_count_label.config(text="")
+        self.load_more_button.config(state='normal' if more and not self.details_streaming else 'disabled')
+    
+    def format_delivery_details(self, delivery):
         """Format delivery data for display"""
         return f"""
-Delivery ID: {delivery_data[1]}
-Truck: {delivery_data[12]} (ID: {delivery_data[2]})
-Driver: {delivery_data[13]} (ID: {delivery_data[3]})
-Pickup Location: {delivery_data[4]}
-Delivery Location: {delivery_data[5]}
-Cargo Description: {delivery_data[6] or 'N/A'}
-Weight: {delivery_data[7]} tons
-Scheduled Date: {delivery_data[8]}
-Scheduled Time: {delivery_data[9]}
-Status: {delivery_data[10]}
-Created Date: {delivery_data[11]}
-Completed Date: {delivery_data[14] or 'Not completed'}
+Delivery ID: {delivery.delivery_id}
+Truck: {delivery.truck_number} (ID: {delivery.truck_id})
+Driver: {delivery.driver_name} (ID: {delivery.driver_id})
+Pickup Location: {delivery.pickup_location}
+Delivery Location: {delivery.delivery_location}
+Cargo Description: {delivery.cargo_description or 'N/A'}
+Weight: {delivery.weight} tons
+Scheduled Date: {delivery.scheduled_date}
+Scheduled Time: {delivery.scheduled_time}
+Status: {delivery.status}
+Created Date: {delivery.created_date}
+Completed Date: {delivery.completed_date or 'Not completed'}
         """
     
     def update_delivery_status(self):
@@ -908,13 +1873,27 @@ Completed Date: {delivery_data[14] or 'Not completed'}
         try:
             completed_date = date.today() if new_status == 'Completed' else None
             
-            self.cursor.execute('''
-                UPDATE deliveries SET status=?, completed_date=?
-                WHERE delivery_id=?
-            ''', (new_status, completed_date, search_term))
+            # Reactivating a cancelled delivery puts its driver back on duty
+            if new_status in ('Scheduled', 'In Progress'):
+                current = repository.query(self.conn, Delivery, repository.DELIVERY_SELECT +
+                                           ' WHERE d.delivery_id = ? AND d.depot_id = ?',
+                                           (search_term, self.depot.id)).fetchone()
+                if current and current.status == 'Cancelled' and \
+                        not self.check_bulk_driver_hours([current], status=new_status):
+                    return
+            
+            with self.uow.transaction():
+                previous = self.cursor.execute('''
+                    SELECT scheduled_date, status, weight FROM deliveries WHERE delivery_id=? AND depot_id=?
+                ''', (search_term, self.depot.id)).fetchone()
+                self.cursor.execute('''
+                    UPDATE deliveries SET status=?, completed_date=?
+                    WHERE delivery_id=? AND depot_id=?
+                ''', (new_status, completed_date, search_term, self.depot.id))
             
             if self.cursor.rowcount > 0:
-                self.conn.commit()
+                self.driver_hours.invalidate()
+                self.kpis.delivery_changed(previous, (previous[0], new_status, previous[2]))
                 messagebox.showinfo("Success", "Delivery status updated successfully!")
                 self.search_delivery()  # Refresh the display
             else:
@@ -924,40 +1903,162 @@ Completed Date: {delivery_data[14] or 'Not completed'}
             messagebox.showerror("Error", f"Failed to update status: {str(e)}")
     
     def mark_completed(self):
-        """Mark delivery as completed"""
+        """Mark delivery as completed and offer to attach proof of delivery"""
         self.update_status_combo.set('Completed')
         self.update_delivery_status()
+        
+        delivery = self.attachment_delivery
+        if (delivery and delivery.status == 'Completed' and not self.delivery_attachments
+                and delivery.delivery_id == self.search_delivery_entry.get().strip()
+                and messagebox.askyesno("Proof of Delivery", "Attach a signature or photo now?")):
+            self.attach_file()
+    
+    # Proof-of-delivery attachments
+    def refresh_attachments(self):
+        """List the attachments of the delivery shown in the tracking tab"""
+        self.attachments_list.delete(0, tk.END)
+        self.delivery_attachments = []
+        if self.attachment_delivery is None:
+            return
+        self.delivery_attachments = attachments.list_attachments(self.conn, self.attachment_delivery.id)
+        for item in self.delivery_attachments:
+            self.attachments_list.insert(tk.END, f"{item.kind:<10} {item.filename}  ({item.size / 1024:.0f} KB, {str(item.created_at)[:16]})")
+    
+    def clear_attachments(self):
+        """Empty the attachments panel when no single delivery is shown"""
+        self.attachment_delivery = None
+        self.refresh_attachments()
+    
+    def selected_attachment(self):
+        """The attachment selected in the list, or None after warning"""
+        selection = self.attachments_list.curselection()
+        if not selection or selection[0] >= len(self.delivery_attachments):
+            messagebox.showwarning("Warning", "Please select an attachment!")
+            return None
+        return self.delivery_attachments[selection[0]]
+    
+    def attach_file(self):
+        """Store a file as proof of delivery for the delivery shown"""
+        delivery = self.attachment_delivery
+        if delivery is None:
+            messagebox.showwarning("Warning", "Please search for a delivery first!")
+            return
+        path = filedialog.askopenfilename(title=f"Attach to {delivery.delivery_id}",
+                                          filetypes=[("Images", "*.png *.gif *.jpg *.jpeg"), ("All files", "*.*")])
+        if not path:
+            return
+        
+        try:
+            with self.uow.transaction():
+                attachments.attach(self.conn, self.attachment_store, delivery.id, path, self.attachment_kind_combo.get())
+            self.refresh_attachments()
+            self.status_var.set(f"Attached {path} to {delivery.delivery_id}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to attach file: {str(e)}")
+    
+    def save_attachment(self):
+        """Copy the selected attachment out of the store"""
+        item = self.selected_attachment()
+        if item is None:
+            return
+        path = filedialog.asksaveasfilename(initialfile=item.filename)
+        if not path:
+            return
+        
+        try:
+            self.attachment_store.export(item.sha256, path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save attachment: {str(e)}")
+    
+    def remove_attachment(self):
+        """Detach the selected attachment from its delivery"""
+        item = self.selected_attachment()
+        if item is None or not messagebox.askyesno("Confirm", f"Remove {item.filename}?"):
+            return
+        
+        try:
+            with self.uow.transaction():
+                attachments.detach(self.conn, item.id)
+            self.refresh_attachments()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to remove attachment: {str(e)}")
+    
+    def attachment_thumbnail(self, item):
+        """A PhotoImage thumbnail of an image attachment, rendered once and cached; None if unsupported"""
+        image = self.thumbnails.pop(item.sha256, None)
+        if image is None:
+            path = self.attachment_store.thumbnail(item.sha256, THUMBNAIL_SIZE)
+            if path is not None:
+                image = tk.PhotoImage(file=path)
+            elif item.content_type in ('image/png', 'image/gif'):
+                # Without Pillow, Tk reads PNG and GIF itself and can shrink them
+                image = tk.PhotoImage(file=self.attachment_store.path(item.sha256))
+                factor = -(-max(image.width(), image.height()) // THUMBNAIL_SIZE)
+                if factor > 1:
+                    image = image.subsample(factor)
+            else:
+                return None
+        # Most recently used last; the oldest renders are dropped first
+        self.thumbnails[item.sha256] = image
+        while len(self.thumbnails) > THUMBNAILS_KEPT:
+            del self.thumbnails[next(iter(self.thumbnails))]
+        return image
+    
+    def preview_attachment(self):
+        """Show a thumbnail of the selected attachment"""
+        item = self.selected_attachment()
+        if item is None:
+            return
+        
+        try:
+            image = self.attachment_thumbnail(item) if item.is_image else None
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to render preview: {str(e)}")
+            return
+        if image is None:
+            messagebox.showinfo("Preview", f"No preview available for {item.filename} ({item.content_type}).")
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title(item.filename)
+        tk.Label(window, image=image).pack(padx=10, pady=10)
+        ttk.Label(window, text=f"{item.kind} - {item.size / 1024:.0f} KB - {str(item.created_at)[:16]}").pack(pady=(0, 10))
+    
+    def poll_sla(self):
+        """Collect deliveries that became late since the last poll, then schedule the next poll"""
+        try:
+            alerts = self.sla_monitor.poll()
+            if alerts:
+                alerts.reverse()
+                self.sla_alerts[:0] = alerts
+                del self.sla_alerts[SLA_ALERTS_KEPT:]
+                if self.tab_built('tracking'):
+                    for index, alert in enumerate(alerts[:SLA_ALERTS_KEPT]):
+                        self.sla_alerts_list.insert(index, str(alert))
+                    self.sla_alerts_list.delete(SLA_ALERTS_KEPT, tk.END)
+                self.status_var.set(f"{len(alerts)} deliveries became late - see SLA Alerts in Delivery Tracking")
+        except Exception as e:
+            logger.warning("SLA check failed: %s", e)
+        self.root.after(SLA_POLL_MS, self.poll_sla)
+    
+    def on_sla_alert_open(self, event):
+        """Show the delivery of a double-clicked SLA alert"""
+        selection = self.sla_alerts_list.curselection()
+        if not selection or selection[0] >= len(self.sla_alerts):
+            return
+        delivery = self.sla_alerts[selection[0]].delivery
+        self.search_delivery_entry.delete(0, tk.END)
+        self.search_delivery_entry.insert(0, delivery.delivery_id)
+        self.search_delivery()
     
     # Reports Methods
     def truck_utilization_report(self):
         """Generate truck utilization report"""
         try:
-            self.cursor.execute('''
-                SELECT 
-                    t.truck_number,
-                    t.model,
-                    t.status,
-                    COUNT(d.id) as total_deliveries,
-                    COUNT(CASE WHEN d.status = 'Completed' THEN 1 END) as completed_deliveries,
-                    COUNT(CASE WHEN d.status = 'In Progress' THEN 1 END) as active_deliveries
-                FROM trucks t
-                LEFT JOIN deliveries d ON t.id = d.truck_id
-                GROUP BY t.id, t.truck_number, t.model, t.status
-                ORDER BY total_deliveries DESC
-            ''')
-            
-            results = self.cursor.fetchall()
-            
-            report = "TRUCK UTILIZATION REPORT\n"
-            report += "=" * 60 + "\n\n"
-            report += f"{'Truck Number':<15} {'Model':<15} {'Status':<12} {'Total':<8} {'Completed':<10} {'Active':<8}\n"
-            report += "-" * 68 + "\n"
-            
-            for row in results:
-                report += f"{row[0]:<15} {row[1]:<15} {row[2]:<12} {row[3]:<8} {row[4]:<10} {row[5]:<8}\n"
-            
-            self.reports_text.delete(1.0, tk.END)
-            self.reports_text.insert(1.0, report)
+            as_of = self.read_report_as_of()
+            if as_of is False:
+                return
+            self.show_report(lambda: reports.truck_utilization_document(reports.truck_utilization(self.conn, as_of, self.depot.id), as_of))
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to generate report: {str(e)}")
@@ -965,32 +2066,10 @@ Completed Date: {delivery_data[14] or 'Not completed'}
     def driver_performance_report(self):
         """Generate driver performance report"""
         try:
-            self.cursor.execute('''
-                SELECT 
-                    dr.name,
-                    dr.license_number,
-                    dr.status,
-                    COUNT(d.id) as total_deliveries,
-                    COUNT(CASE WHEN d.status = 'Completed' THEN 1 END) as completed_deliveries,
-                    COUNT(CASE WHEN d.status = 'In Progress' THEN 1 END) as active_deliveries
-                FROM drivers dr
-                LEFT JOIN deliveries d ON dr.id = d.driver_id
-                GROUP BY dr.id, dr.name, dr.license_number, dr.status
-                ORDER BY completed_deliveries DESC
-            ''')
-            
-            results = self.cursor.fetchall()
-            
-            report = "DRIVER PERFORMANCE REPORT\n"
-            report += "=" * 70 + "\n\n"
-            report += f"{'Driver Name':<20} {'License':<15} {'Status':<12} {'Total':<8} {'Completed':<10} {'Active':<8}\n"
-            report += "-" * 73 + "\n"
-            
-            for row in results:
-                report += f"{row[0]:<20} {row[1]:<15} {row[2]:<12} {row[3]:<8} {row[4]:<10} {row[5]:<8}\n"
-            
-            self.reports_text.delete(1.0, tk.END)
-            self.reports_text.insert(1.0, report)
+            as_of = self.read_report_as_of()
+            if as_of is False:
+                return
+            self.show_report(lambda: reports.driver_performance_document(reports.driver_performance(self.conn, as_of, self.depot.id), as_of))
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to generate report: {str(e)}")
@@ -998,46 +2077,7 @@ Completed Date: {delivery_data[14] or 'Not completed'}
     def delivery_summary_report(self):
         """Generate delivery summary report"""
         try:
-            self.cursor.execute('''
-                SELECT 
-                    status,
-                    COUNT(*) as count,
-                    AVG(weight) as avg_weight
-                FROM deliveries
-                GROUP BY status
-                ORDER BY count DESC
-            ''')
-            
-            status_results = self.cursor.fetchall()
-            
-            self.cursor.execute('''
-                SELECT 
-                    COUNT(*) as total_deliveries,
-                    SUM(weight) as total_weight,
-                    AVG(weight) as avg_weight
-                FROM deliveries
-            ''')
-            
-            summary = self.cursor.fetchone()
-            
-            report = "DELIVERY SUMMARY REPORT\n"
-            report += "=" * 50 + "\n\n"
-            
-            report += "OVERALL STATISTICS:\n"
-            report += f"Total Deliveries: {summary[0]}\n"
-            report += f"Total Weight: {summary[1]:.2f} tons\n"
-            report += f"Average Weight: {summary[2]:.2f} tons\n\n"
-            
-            report += "STATUS BREAKDOWN:\n"
-            report += f"{'Status':<15} {'Count':<8} {'Avg Weight':<12}\n"
-            report += "-" * 35 + "\n"
-            
-            for row in status_results:
-                avg_weight = row[2] if row[2] else 0
-                report += f"{row[0]:<15} {row[1]:<8} {avg_weight:<12.2f}\n"
-            
-            self.reports_text.delete(1.0, tk.END)
-            self.reports_text.insert(1.0, report)
+            self.show_report(lambda: reports.delivery_summary_document(reports.delivery_summary(self.conn, self.depot.id)))
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to generate report: {str(e)}")
@@ -1046,41 +2086,232 @@ Completed Date: {delivery_data[14] or 'Not completed'}
         """Generate monthly report"""
         try:
             current_month = datetime.now().strftime('%Y-%m')
+            self.show_report(lambda: reports.monthly_document(current_month, reports.monthly_summary(self.conn, current_month, self.depot.id)))
             
-            self.cursor.execute('''
-                SELECT 
-                    strftime('%Y-%m', scheduled_date) as month,
-                    COUNT(*) as total_deliveries,
-                    COUNT(CASE WHEN status = 'Completed' THEN 1 END) as completed,
-                    COUNT(CASE WHEN status = 'Cancelled' THEN 1 END) as cancelled,
-                    SUM(weight) as total_weight
-                FROM deliveries
-                WHERE strftime('%Y-%m', scheduled_date) = ?
-                GROUP BY month
-            ''', (current_month,))
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to generate report: {str(e)}")
+    
+    def late_deliveries_report(self):
+        """Generate overdue and late-completed deliveries per truck and driver"""
+        def build():
+            by_truck, by_driver = sla.late_report(self.conn, depot_id=self.depot.id)
+            counts = [
+                Field('Overdue', 'overdue'),
+                Field('Completed Late', 'completed_late'),
+                Field('Late Rate', lambda row: row.late_rate * 100, '.1f'),
+            ]
+            return Document(f"LATE DELIVERIES - as of {datetime.now():%Y-%m-%d %H:%M}", [
+                Table(None, [Field('Truck Number', 'label', blank='-')] + counts, by_truck, "No late deliveries."),
+                Table(None, [Field('Driver Name', 'label', blank='-')] + counts, by_driver, "No late deliveries."),
+            ])
+        
+        try:
+            self.show_report(build)
             
-            monthly_data = self.cursor.fetchone()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to generate report: {str(e)}")
+    
+    def maintenance_plan_report(self):
+        """Generate maintenance status and proposed service calendar"""
+        def build():
+            return Document("MAINTENANCE PLAN", [
+                Table("TRUCKS DUE FOR SERVICE", [
+                    Field('Truck Number', 'truck_number'),
+                    Field('Status', 'status'),
+                    Field('Last Service', 'last_service', blank='Never'),
+                    Field('Days', 'days_since'),
+                    Field('Deliveries', 'deliveries_since'),
+                    Field('Tonnage', 'tonnage_since', '.1f'),
+                ], maintenance.due_trucks(self.conn, depot_id=self.depot.id), "No trucks are due for service."),
+                Table("PROPOSED SERVICE CALENDAR", [
+                    Field('Date', lambda slot: slot.service_date.isoformat()),
+                    Field('Truck Number', 'truck_number'),
+                    Field('Status', 'status'),
+                    Field('Fleet Deliveries That Day', 'fleet_load'),
+                ], maintenance.propose_calendar(self.conn, depot_id=self.depot.id), "No services needed in the next 30 days."),
+            ])
+        
+        try:
+            self.show_report(build)
             
-            if monthly_data:
-                report = f"MONTHLY REPORT - {current_month}\n"
-                report += "=" * 40 + "\n\n"
-                report += f"Total Deliveries: {monthly_data[1]}\n"
-                report += f"Completed: {monthly_data[2]}\n"
-                report += f"Cancelled: {monthly_data[3]}\n"
-                report += f"In Progress: {monthly_data[1] - monthly_data[2] - monthly_data[3]}\n"
-                report += f"Total Weight: {monthly_data[4]:.2f} tons\n"
-                report += f"Completion Rate: {(monthly_data[2]/monthly_data[1]*100):.1f}%\n"
-            else:
-                report = f"MONTHLY REPORT - {current_month}\n"
-                report += "=" * 40 + "\n\n"
-                report += "No deliveries found for this month.\n"
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to generate report: {str(e)}")
+    
+    def read_report_range(self):
+        """Read the analytics date range, or None after showing an error"""
+        try:
+            start = datetime.strptime(self.analytics_from_entry.get().strip(), '%Y-%m-%d').date()
+            end = datetime.strptime(self.analytics_to_entry.get().strip(), '%Y-%m-%d').date()
+        except ValueError:
+            messagebox.showerror("Error", "Invalid date format. Use YYYY-MM-DD")
+            return None
+        if start > end:
+            messagebox.showerror("Error", "Start date must not be after end date")
+            return None
+        return start, end
+    
+    def read_report_as_of(self):
+        """Read the as-of time for truck and driver details: None for current, False after an error"""
+        text = self.report_as_of_entry.get().strip()
+        if not text:
+            return None
+        for fmt in ('%Y-%m-%d', '%Y-%m-%d %H:%M'):
+            try:
+                datetime.strptime(text, fmt)
+                return text
+            except ValueError:
+                pass
+        messagebox.showerror("Error", "Invalid as-of time. Use YYYY-MM-DD or YYYY-MM-DD HH:MM")
+        return False
+    
+    def fleet_summary_report(self):
+        """Generate per-depot and fleet-wide totals across all partitions"""
+        def build():
+            summaries, total = fleet_summary(self.router)
+            return Document("FLEET-WIDE SUMMARY BY DEPOT", [Table(None, [
+                Field('Depot', lambda summary: f"{summary.depot.code} - {summary.depot.name}" if summary.depot else "ALL DEPOTS"),
+                Field('Trucks', 'trucks'),
+                Field('Drivers', 'drivers'),
+                Field('Deliveries', 'deliveries'),
+                Field('Active', 'active'),
+                Field('Completed', 'completed'),
+                Field('Cancelled', 'cancelled'),
+                Field('Weight (t)', 'total_weight', '.1f'),
+            ], summaries + [total])])
+        
+        try:
+            started = time.perf_counter()
+            self.show_report(build)
+            self.status_var.set(f"Summarised all depots in {time.perf_counter() - started:.2f}s")
             
-            self.reports_text.delete(1.0, tk.END)
-            self.reports_text.insert(1.0, report)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to generate report: {str(e)}")
+    
+    def lane_analytics_report(self):
+        """Generate top pickup -> delivery lanes for the selected date range"""
+        date_range = self.read_report_range()
+        if date_range is None:
+            return
+        start, end = date_range
+        order_by = self.lane_order_combo.get()
+        
+        def build():
+            lanes = analytics.lane_report(self.conn, start, end, order_by=order_by, depot_id=self.depot.id)
+            return Document(f"TOP LANES - {start.isoformat()} to {end.isoformat()} (by {order_by})", [Table(None, [
+                Field('Pickup', 'pickup', max_width=30),
+                Field('Destination', 'destination', max_width=30),
+                Field('Deliveries', 'deliveries'),
+                Field('Tonnage', 'tonnage', '.1f'),
+                Field('Completed %', lambda lane: lane.completion_rate * 100, '.1f'),
+                Field('Cancelled %', lambda lane: lane.cancellation_rate * 100, '.1f'),
+            ], lanes, "No deliveries scheduled in this date range.")])
+        
+        try:
+            self.show_report(build)
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to generate report: {str(e)}")
     
+    def delivery_listing_report(self):
+        """List every delivery in the selected date range, rendered page by page"""
+        date_range = self.read_report_range()
+        if date_range is None:
+            return
+        
+        try:
+            self.show_report(lambda: reports.delivery_listing_document(self.conn, *date_range, self.depot.id))
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to generate report: {str(e)}")
+    
+    def demand_forecast_report(self):
+        """Generate a demand forecast from the last year of deliveries"""
+        dimension = self.forecast_dimension_combo.get()
+        metric = self.forecast_metric_combo.get()
+        horizon = forecasting.DEFAULT_HORIZON_DAYS
+        
+        def build():
+            forecasts = forecasting.forecast(self.conn, dimension, metric, depot_id=self.depot.id)
+            first_day = date.today()
+            title = f"DEMAND FORECAST - {metric} per {dimension}, next {horizon} days from {first_day.isoformat()}"
+            if not forecasts:
+                return Document(title, [Text("No delivery history in the past year.")])
+            
+            fleet = [(first_day + timedelta(days=day), sum(f.daily[day] for f in forecasts)) for day in range(horizon)]
+            sections = [
+                Table("FLEET-WIDE DAILY FORECAST", [
+                    Field('Day', lambda day: day[0].strftime('%a %Y-%m-%d')),
+                    Field('Forecast', lambda day: day[1], '.1f'),
+                ], fleet),
+                Table(None, [
+                    Field('Name', 'label', max_width=45),
+                    Field('Model', 'method'),
+                    Field('Avg/Day (Past Year)', 'history_daily', '.2f'),
+                    Field('Avg/Day (Forecast)', lambda f: f.total / horizon, '.2f'),
+                    Field('Total', 'total', '.1f'),
+                ], forecasts[:50]),
+            ]
+            if len(forecasts) > 50:
+                sections.append(Text(f"... and {len(forecasts) - 50} more"))
+            return Document(title, sections)
+        
+        try:
+            started = time.perf_counter()
+            self.show_report(build)
+            self.status_var.set(f"Forecast {dimension} {metric} in {time.perf_counter() - started:.2f}s")
+            
+        except ImportError as e:
+            messagebox.showerror("Error", str(e))
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to generate forecast: {str(e)}")
+    
+    def show_report(self, build):
+        """Render a report into the results pane one page per event loop tick
+
+        build() returns the report's Document; it is kept so the same report
+        can be run again for export.
+        """
+        document = build()
+        self.report_build = build
+        self.report_stream_id += 1
+        self.reports_text.delete(1.0, tk.END)
+        self.export_report_button.config(state='normal')
+        self.render_report_page(self.report_stream_id, rendering.render_text(document), 0)
+    
+    def render_report_page(self, stream_id, pages, shown):
+        """Append the next rendered page and schedule the one after it"""
+        if stream_id != self.report_stream_id:
+            return
+        
+        try:
+            page = next(pages, None)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to render report: {str(e)}")
+            page = None
+        
+        if page is not None:
+            self.reports_text.insert(tk.END, page)
+            self.report_pages_label.config(text=f"Rendering... ({shown + 1} pages)")
+            self.root.after(1, self.render_report_page, stream_id, pages, shown + 1)
+        else:
+            self.report_pages_label.config(text="")
+    
+    def export_report(self):
+        """Run the shown report again and stream it to a text, HTML or CSV file"""
+        if self.report_build is None:
+            return
+        path = filedialog.asksaveasfilename(defaultextension='.txt',
+                                            filetypes=[("Text", "*.txt"), ("HTML", "*.html"), ("CSV", "*.csv")])
+        if not path:
+            return
+        
+        try:
+            with open(path, 'w', newline='', encoding='utf-8') as output:
+                rendering.write(self.report_build(), output, rendering.format_for(path))
+            self.status_var.set(f"Report exported to {path}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to export report: {str(e)}")
+    
     # Data Refresh Methods
     def refresh_all_data(self):
         """Refresh all data displays"""
@@ -1090,97 +2321,69 @@ Completed Date: {delivery_data[14] or 'Not completed'}
         self.refresh_delivery_tracking()
         self.update_combos()
     
+    def load_delivery_scheduling_data(self):
+        """Initial data load for the delivery scheduling tab"""
+        self.update_combos()
+        self.refresh_delivery_data()
+    
     def refresh_truck_data(self):
         """Refresh truck treeview"""
-        for item in self.truck_tree.get_children():
-            self.truck_tree.delete(item)
+        if not self.tab_built('trucks'):
+            return
         
         try:
-            self.cursor.execute('SELECT * FROM trucks ORDER BY truck_number')
-            trucks = self.cursor.fetchall()
-            
-            for truck in trucks:
-                self.truck_tree.insert('', 'end', values=truck)
-                
+            self.load_tree_page(self.truck_tree, self.truck_query)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to refresh truck data: {str(e)}")
     
     def refresh_driver_data(self):
         """Refresh driver treeview"""
-        for item in self.driver_tree.get_children():
-            self.driver_tree.delete(item)
+        if not self.tab_built('drivers'):
+            return
         
         try:
-            self.cursor.execute('SELECT * FROM drivers ORDER BY name')
-            drivers = self.cursor.fetchall()
-            
-            for driver in drivers:
-                self.driver_tree.insert('', 'end', values=driver)
-                
+            self.load_tree_page(self.driver_tree, self.driver_query)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to refresh driver data: {str(e)}")
     
     def refresh_delivery_data(self):
         """Refresh delivery treeview"""
-        for item in self.delivery_tree.get_children():
-            self.delivery_tree.delete(item)
+        if not self.tab_built('deliveries'):
+            return
         
         try:
-            self.cursor.execute('''
-                SELECT d.id, d.delivery_id, t.truck_number, dr.name, 
-                       d.pickup_location, d.delivery_location, 
-                       d.scheduled_date, d.scheduled_time, d.status
-                FROM deliveries d
-                LEFT JOIN trucks t ON d.truck_id = t.id
-                LEFT JOIN drivers dr ON d.driver_id = dr.id
-                ORDER BY d.scheduled_date DESC, d.scheduled_time DESC
-            ''')
-            deliveries = self.cursor.fetchall()
-            
-            for delivery in deliveries:
-                self.delivery_tree.insert('', 'end', values=delivery)
-                
+            self.load_tree_page(self.delivery_tree, self.delivery_query)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to refresh delivery data: {str(e)}")
     
     def refresh_delivery_tracking(self):
         """Refresh delivery tracking display"""
+        if not self.tab_built('tracking'):
+            return
+        
         try:
-            self.cursor.execute('''
-                SELECT d.*, t.truck_number, dr.name as driver_name
-                FROM deliveries d
-                LEFT JOIN trucks t ON d.truck_id = t.id
-                LEFT JOIN drivers dr ON d.driver_id = dr.id
-                ORDER BY d.scheduled_date DESC, d.scheduled_time DESC
-                LIMIT 10
-            ''')
-            
-            recent_deliveries = self.cursor.fetchall()
-            
-            if recent_deliveries:
-                details_text = "RECENT DELIVERIES:\n\n"
-                for delivery in recent_deliveries:
-                    details_text += self.format_delivery_details(delivery) + "\n" + "="*50 + "\n\n"
-                self.delivery_details_text.delete(1.0, tk.END)
-                self.delivery_details_text.insert(1.0, details_text)
-            else:
-                self.delivery_details_text.delete(1.0, tk.END)
-                self.delivery_details_text.insert(1.0, "No deliveries found.")
-                
+            self.stream_delivery_details("RECENT DELIVERIES:\n\n",
+                                         repository.iter_deliveries(self.conn, limit=10, depot_id=self.depot.id),
+                                         "No deliveries found.")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to refresh tracking data: {str(e)}")
     
     def update_combos(self):
         """Update combo box values"""
+        if not self.tab_built('deliveries'):
+            return
+        
         try:
-            # Update truck combo - include all trucks so existing deliveries can show their assigned truck
-            self.cursor.execute('SELECT id, truck_number FROM trucks ORDER BY truck_number')
+            # Update truck combo - deleted trucks are left out; deliveries still show them when selected
+            self.cursor.execute('SELECT id, truck_number FROM trucks WHERE depot_id = ? AND deleted_at IS NULL '
+                                'ORDER BY truck_number', (self.depot.id,))
             trucks = self.cursor.fetchall()
             truck_values = [f"{truck[0]} - {truck[1]}" for truck in trucks]
             self.delivery_truck_combo['values'] = truck_values
             
-            # Update driver combo - include all drivers so existing deliveries can show their assigned driver
-            self.cursor.execute('SELECT id, name FROM drivers ORDER BY name')
+            # Update driver combo - deleted drivers are left out; deliveries still show them when selected
+            self.cursor.execute('SELECT id, name FROM drivers WHERE depot_id = ? AND deleted_at IS NULL '
+                                'ORDER BY name', (self.depot.id,))
             drivers = self.cursor.fetchall()
             driver_values = [f"{driver[0]} - {driver[1]}" for driver in drivers]
             self.delivery_driver_combo['values'] = driver_values
@@ -1191,12 +2394,15 @@ Completed Date: {delivery_data[14] or 'Not completed'}
     def __del__(self):
         """Close database connection"""
         if hasattr(self, 'conn'):
+            self.uow.flush()
             self.conn.close()
 
 def main():
     """Main function to run the application"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
     root = tk.Tk()
-    app = TruckDeliverySystem(root)
+    # Optional depot code, e.g. "python truck_management_system.py NORTH"
+    app = TruckDeliverySystem(root, sys.argv[1] if len(sys.argv) > 1 else None)
     root.mainloop()
 
 if __name__ == "__main__":
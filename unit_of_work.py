@@ -0,0 +1,89 @@
+"""Explicit transactions, savepoints and group commit over one connection
+
+Write code runs inside ``with uow.transaction():``. The outermost unit
+opens the transaction with BEGIN IMMEDIATE, so the write lock is taken up
+front instead of failing halfway through. Every unit, including nested
+ones, runs inside a savepoint. A unit that raises is rolled back on its
+own and leaves any earlier work in the transaction alone.
+
+With a group-commit window, the commit after the outermost unit is
+deferred for up to window_ms using the given scheduler (e.g. Tk's
+root.after). Units finishing within the window share one commit and
+one fsync. Call flush() before closing the connection.
+
+Caches filled by writes inside a unit can register with on_rollback() to
+be told when that work is undone.
+"""
+from contextlib import contextmanager
+
+
+class UnitOfWork:
+    """Transaction scope for the writes of one connection"""
+
+    def __init__(self, conn, window_ms=0, schedule=None):
+        self.conn = conn
+        self.window_ms = window_ms
+        self._schedule = schedule
+        self._depth = 0
+        self._savepoints = 0
+        self._flush_pending = False
+        self._rollback_listeners = []
+        self.commits = 0
+
+    def on_rollback(self, listener):
+        """Call listener() whenever a unit of work is rolled back"""
+        self._rollback_listeners.append(listener)
+
+    @contextmanager
+    def transaction(self):
+        """Run a block atomically, committing when the outermost block ends"""
+        if not self._depth and not self.conn.in_transaction:
+            self.conn.execute('BEGIN IMMEDIATE')
+        self._depth += 1
+        try:
+            with self.savepoint():
+                yield self.conn
+        except BaseException:
+            self._depth -= 1
+            # Nothing else is waiting on this transaction, so end it
+            if not self._depth and not self._flush_pending:
+                self.conn.rollback()
+            raise
+        self._depth -= 1
+        if not self._depth:
+            self.commit()
+
+    @contextmanager
+    def savepoint(self):
+        """Run a block that is undone on error without aborting the transaction"""
+        self._savepoints += 1
+        name = f'uow_{self._savepoints}'
+        self.conn.execute(f'SAVEPOINT {name}')
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute(f'ROLLBACK TO {name}')
+            self.conn.execute(f'RELEASE {name}')
+            for listener in self._rollback_listeners:
+                listener()
+            raise
+        self.conn.execute(f'RELEASE {name}')
+
+    def commit(self):
+        """Commit now, or at the end of the group-commit window"""
+        if self._depth or not self.conn.in_transaction:
+            return
+        if self.window_ms and self._schedule:
+            if not self._flush_pending:
+                self._flush_pending = True
+                self._schedule(self.window_ms, self.flush)
+            return
+        self.conn.commit()
+        self.commits += 1
+
+    def flush(self):
+        """Commit work held back by the group-commit window"""
+        self._flush_pending = False
+        if not self._depth and self.conn.in_transaction:
+            self.conn.commit()
+            self.commits += 1